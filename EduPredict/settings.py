@@ -248,9 +248,45 @@ LOGGING = {
 # Climate Data Processing Settings
 CLIMATE_DATA_SETTINGS = {
     'MAX_BATCH_SIZE': 10000,
+    'INGEST_API_TOKENS': {},  # Station name -> bearer token for the ingestion API; keep real tokens out of git
     'ANOMALY_THRESHOLD': 2.5,  # Standard deviations
+    'ANOMALY_WINDOW': 50,  # Preceding readings used for rolling mean/std
+    'ANOMALY_MIN_HISTORY': 10,  # Readings needed before a series is scored
+    'STREAMING_ANOMALY_DETECTION': True,  # Score readings as they are ingested
+    'STREAMING_STATE_FLUSH_INTERVAL': 60,  # Seconds between persisting streaming state
     'DATA_RETENTION_DAYS': 3650,  # 10 years
+    'METRICS_RETENTION_DAYS': 90,  # System metrics samples kept in the database
+    'ARCHIVE_DIR': BASE_DIR / 'archive',  # Compressed NumPy archives of expired readings and metrics
+    'RETENTION_DELETE_CHUNK': 5000,  # Rows deleted per transaction when enforcing retention
+    'RASTER_DIR': BASE_DIR / 'rasters',  # Tiled, memory-mapped .npy files of gridded satellite scenes
+    'RASTER_CHUNK_SIZE': 256,  # Tile edge (pixels) of newly stored scenes
+    'RASTER_MAX_WINDOW_CELLS': 250000,  # Larger raster windows are returned subsampled
+    'RASTER_MATCH_TOLERANCE_MINUTES': 30,  # Station readings this close to a scene's time are compared with it
+    'PARTITION_LIVE_MONTHS': 3,  # Months (current included) kept in the live ClimateData table before archiving
+    'CHUNK_SEAL_AFTER_DAYS': 30,  # Whole days older than this are compressed into chunks by compact_climate_data
     'ALERT_CHECK_INTERVAL': 300,  # 5 minutes
+    'ALERT_COALESCE_WINDOW': 3600,  # Seconds within which repeats of an alert are merged
+    'CHART_MIN_POINTS': 100,  # Charts use the coarsest rollup with at least this many buckets
+    'CHART_MAX_POINTS': 2000,  # Upper bound on points returned by chart APIs
+    'STATS_CACHE_TIMEOUT': 300,  # Backstop TTL for cached dashboard statistics (seconds)
+    'API_CACHE_MIN_TTL': 30,  # Shared API response cache TTL for windows ending now (seconds)
+    'API_CACHE_MAX_TTL': 86400,  # TTL cap for windows far in the past; TTL grows with the window's age
+    'REALTIME_POLL_INTERVAL': 2,  # Seconds between checks for new data to push to live streams
+    'REALTIME_STREAM_MAX_SECONDS': 300,  # Live streams are closed (and reconnected by the browser) after this
+    'SPATIAL_MAX_RESULTS': 1000,  # Most data sources returned by one bbox/radius/nearest query
+    'MAP_TILE_CACHE_TIMEOUT': 600,  # Backstop TTL for cached map cluster tiles (seconds)
+    'MAP_LATEST_VALUE_HOURS': 24,  # Hourly rollups older than this are left out of cluster values
+}
+
+# Cache Configuration
+# Dashboard statistics are invalidated through model signals, so use a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) when running
+# several server processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'climatee-default',
+    }
 }
 
 # File Upload Settings
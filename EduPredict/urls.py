@@ -38,6 +38,7 @@ urlpatterns = [
     # Data Management
     path('data/sources/', climate_views.data_sources_view, name='data_sources'),
     path('data/climate/', climate_views.climate_data_view, name='climate_data'),
+    path('data/climate/export/', climate_views.export_climate_data, name='export_climate_data'),
     
     # Alerts and Notifications
     path('alerts/', climate_views.alerts_view, name='alerts'),
@@ -49,7 +50,19 @@ urlpatterns = [
     
     # API Endpoints
     path('api/climate-data-chart/', climate_views.api_climate_data_chart, name='api_climate_data_chart'),
+    path('api/climate-data-chart/batch/', climate_views.api_climate_data_chart_batch, name='api_climate_data_chart_batch'),
+    path('api/climate-data-chart/pyramid/', climate_views.api_climate_data_pyramid, name='api_climate_data_pyramid'),
+    path('api/climate-data-heatmap/', climate_views.api_climate_data_heatmap, name='api_climate_data_heatmap'),
+    path('api/rasters/', climate_views.api_raster_scenes, name='api_raster_scenes'),
+    path('api/rasters/<uuid:scene_id>/window/', climate_views.api_raster_window, name='api_raster_window'),
+    path('api/rasters/<uuid:scene_id>/sample/', climate_views.api_raster_sample, name='api_raster_sample'),
+    path('api/climate-data/ingest/', climate_views.api_ingest_climate_data, name='api_ingest_climate_data'),
     path('api/system-metrics/', climate_views.api_system_metrics, name='api_system_metrics'),
+    path('api/stream/', climate_views.api_live_stream, name='api_live_stream'),
+    path('api/sources/bbox/', climate_views.api_sources_bbox, name='api_sources_bbox'),
+    path('api/sources/within/', climate_views.api_sources_within, name='api_sources_within'),
+    path('api/sources/nearest/', climate_views.api_sources_nearest, name='api_sources_nearest'),
+    path('api/sources/clusters/', climate_views.api_source_clusters, name='api_source_clusters'),
     
     # User Profile
     path('profile/', climate_views.profile_view, name='profile'),
@@ -161,7 +161,8 @@ def create_sample_climate_data(data_sources):
                     unit=unit,
                     timestamp=date + timedelta(hours=random.randint(0, 23), minutes=random.randint(0, 59)),
                     quality_score=random.uniform(0.8, 1.0),
-                    is_anomaly=is_anomaly
+                    is_anomaly=is_anomaly,
+                    processed=True,  # Keep the planted labels instead of scoring on save
                 )
     
     print(f"Created {ClimateData.objects.count()} climate data records")
@@ -1,8 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
-    ClimateUser, DataSource, ClimateData, ClimateAlert, 
-    MLModel, SupportTicket, SystemMetrics, Signup
+    ClimateUser, DataSource, ClimateData, ClimateDataChunk, ClimateDataPartition, ClimateDataRollup,
+    ClimateAlert, AlertRule, MLModel, RasterScene, SupportTicket, SystemMetrics, Signup
 )
 
 # Custom User Admin
@@ -38,19 +38,71 @@ class DataSourceAdmin(admin.ModelAdmin):
 class ClimateDataAdmin(admin.ModelAdmin):
     list_display = ('data_type', 'value', 'unit', 'data_source', 'timestamp', 'is_anomaly', 'quality_score')
     list_filter = ('data_type', 'is_anomaly', 'processed', 'timestamp', 'data_source__source_type')
-    search_fields = ('data_type', 'data_source__name')
+    # data_type and timestamp are stored as integers, so no text search or date drill-down on them
+    search_fields = ('data_source__name',)
     readonly_fields = ('id', 'created_at')
+
+# Climate Data Partition Admin (maintained by the partition_climate_data command)
+@admin.register(ClimateDataPartition)
+class ClimateDataPartitionAdmin(admin.ModelAdmin):
+    list_display = ('month', 'table_name', 'row_count', 'updated_at')
+    readonly_fields = ('month', 'table_name', 'row_count', 'created_at', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+# Climate Data Chunk Admin (written by the compact_climate_data command)
+@admin.register(ClimateDataChunk)
+class ClimateDataChunkAdmin(admin.ModelAdmin):
+    list_display = ('data_type', 'data_source', 'day', 'count', 'unit', 'updated_at')
+    list_filter = ('data_type', 'day')
+    search_fields = ('data_source__name',)
+    # The compressed columns are opaque bytes
+    exclude = ('id_data', 'timestamp_data', 'created_data', 'value_data', 'quality_data', 'flag_data')
+    readonly_fields = ('data_source', 'data_type', 'day', 'unit', 'count', 'start', 'end', 'updated_at')
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+# Raster Scene Admin (scenes are added with the import_raster_scene command)
+@admin.register(RasterScene)
+class RasterSceneAdmin(admin.ModelAdmin):
+    list_display = ('data_type', 'data_source', 'timestamp', 'rows', 'columns', 'south', 'west', 'north', 'east')
+    list_filter = ('data_type', 'timestamp')
+    search_fields = ('data_source__name',)
+    readonly_fields = ('rows', 'columns', 'chunk_size', 'file_path', 'created_at')
     date_hierarchy = 'timestamp'
 
+    def has_add_permission(self, request):
+        return False
+
+# Climate Data Rollup Admin
+@admin.register(ClimateDataRollup)
+class ClimateDataRollupAdmin(admin.ModelAdmin):
+    list_display = ('data_type', 'resolution', 'data_source', 'bucket', 'count', 'mean_value', 'min_value', 'max_value')
+    list_filter = ('resolution', 'data_type')
+    search_fields = ('data_source__name',)
+    readonly_fields = ('updated_at',)
+    date_hierarchy = 'bucket'
+
 # Climate Alert Admin
 @admin.register(ClimateAlert)
 class ClimateAlertAdmin(admin.ModelAdmin):
-    list_display = ('title', 'alert_type', 'severity', 'is_active', 'created_at', 'acknowledged_by')
+    list_display = ('title', 'alert_type', 'severity', 'is_active', 'occurrence_count', 'last_seen_at', 'created_at', 'acknowledged_by')
     list_filter = ('alert_type', 'severity', 'is_active', 'created_at')
     search_fields = ('title', 'description')
     readonly_fields = ('id', 'created_at')
     date_hierarchy = 'created_at'
 
+# Alert Rule Admin
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'data_type', 'data_source', 'rule_type', 'operator', 'threshold', 'severity', 'is_active')
+    list_filter = ('rule_type', 'data_type', 'severity', 'is_active')
+    search_fields = ('name', 'data_source__name')
+    readonly_fields = ('created_at',)
+
 # ML Model Admin
 @admin.register(MLModel)
 class MLModelAdmin(admin.ModelAdmin):
@@ -0,0 +1,263 @@
+"""
+Rule-based alert evaluation.
+
+AlertRule rows are loaded into an in-memory index keyed by
+(data_type, data_source), with source-wide rules under a ``None`` source,
+so each reading is matched only against the rules that can apply to it.
+The evaluator walks ClimateData in insert order from a persisted watermark
+(``created_at``, ``id``), a chunk at a time, and creates the resulting
+ClimateAlert rows in bulk in the same transaction that advances the
+watermark. Work per run is proportional to the readings that arrived since
+the previous run, not to rules x history.
+
+Repeats of an alert with the same (alert_type, data_source, severity) whose
+reading falls within ALERT_COALESCE_WINDOW of an open, unacknowledged alert
+are merged into it: the occurrence counter, first/last-seen times and peak
+value are updated instead of inserting another row. Open alerts are held in
+a dict for the duration of a run, so each candidate costs one lookup.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AlertEvaluatorState, AlertRule, ClimateAlert, ClimateData
+from .stats import ALERT_STATS_KEY, invalidate_stats
+
+logger = logging.getLogger(__name__)
+
+# Readings fetched per round trip
+EVALUATION_CHUNK_SIZE = 5000
+
+# Rows younger than this are left for the next run, so that a batch still
+# committing when the run starts is not skipped by the watermark
+COMMIT_GRACE = timedelta(seconds=5)
+
+# Fields rewritten when an open alert absorbs a repeat
+COALESCED_FIELDS = [
+    'occurrence_count', 'first_seen_at', 'last_seen_at', 'actual_value', 'peak_value', 'updated_at',
+]
+
+
+def get_check_interval():
+    return settings.CLIMATE_DATA_SETTINGS.get('ALERT_CHECK_INTERVAL', 300)
+
+
+def get_coalesce_window():
+    return timedelta(seconds=settings.CLIMATE_DATA_SETTINGS.get('ALERT_COALESCE_WINDOW', 3600))
+
+
+class RuleIndex:
+    """Active rules grouped by (data_type, data_source_id)"""
+
+    def __init__(self, rules):
+        self.rules = defaultdict(list)
+        for rule in rules:
+            self.rules[(rule.data_type, rule.data_source_id)].append(rule)
+        self.data_types = {data_type for data_type, _ in self.rules}
+
+    @classmethod
+    def load(cls):
+        return cls(AlertRule.objects.filter(is_active=True))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def lookup(self, data_type, source_id):
+        return self.rules.get((data_type, source_id), []) + self.rules.get((data_type, None), [])
+
+    def has_rate_rules(self, data_type, source_id):
+        return any(rule.rule_type == 'rate_of_change' for rule in self.lookup(data_type, source_id))
+
+
+def build_alert(rule, source_id, timestamp, measured, value):
+    if rule.rule_type == 'rate_of_change':
+        detail = f"changed at {measured:.2f}/h (now {value:.2f})"
+    else:
+        detail = f"reading {measured:.2f}"
+    return ClimateAlert(
+        alert_type=rule.alert_type,
+        severity=rule.severity,
+        title=rule.name[:200],
+        description=(
+            f"{rule.get_data_type_display()} {detail} is {rule.operator} "
+            f"{rule.threshold:g} at {timestamp.isoformat()}"
+        ),
+        data_source_id=source_id,
+        threshold_value=rule.threshold,
+        actual_value=measured,
+        peak_value=measured,
+        first_seen_at=timestamp,
+        last_seen_at=timestamp,
+        rule=rule,
+    )
+
+
+def exceedance(value, threshold):
+    """Distance past the threshold, used to pick the peak of merged alerts"""
+    return abs(value - (threshold or 0.0))
+
+
+def coalesce_key(alert):
+    return (alert.alert_type, alert.data_source_id, alert.severity)
+
+
+class OpenAlertIndex:
+    """Latest open alert per (alert_type, data_source, severity)"""
+
+    def __init__(self, window):
+        self.window = window
+        self.open = {}
+
+    @classmethod
+    def load(cls, window=None):
+        index = cls(window if window is not None else get_coalesce_window())
+        alerts = ClimateAlert.objects.filter(
+            is_active=True, acknowledged_by__isnull=True, last_seen_at__isnull=False,
+        ).order_by('last_seen_at')
+        for alert in alerts:
+            index.open[coalesce_key(alert)] = alert
+        return index
+
+    def merge(self, candidates):
+        """Fold candidates into open alerts; returns (new alerts, updated alerts)"""
+        created = []
+        updated = {}
+        for candidate in candidates:
+            key = coalesce_key(candidate)
+            current = self.open.get(key)
+            seen = candidate.last_seen_at
+            if current is None or not (
+                current.first_seen_at - self.window <= seen <= current.last_seen_at + self.window
+            ):
+                self.open[key] = candidate
+                created.append(candidate)
+                continue
+
+            current.occurrence_count += 1
+            current.first_seen_at = min(current.first_seen_at, seen)
+            if seen >= current.last_seen_at:
+                current.last_seen_at = seen
+                current.actual_value = candidate.actual_value
+            if current.peak_value is None or (
+                exceedance(candidate.peak_value, current.threshold_value)
+                > exceedance(current.peak_value, current.threshold_value)
+            ):
+                current.peak_value = candidate.peak_value
+            if not current._state.adding:
+                updated[current.pk] = current
+        return created, list(updated.values())
+
+
+class AlertEvaluator:
+    """Matches new readings against the rule index and records alerts"""
+
+    def __init__(self, name='default', chunk_size=EVALUATION_CHUNK_SIZE):
+        self.name = name
+        self.chunk_size = chunk_size
+        # Last (timestamp, value) seen per series, for rate-of-change rules
+        self.previous = {}
+
+    def previous_reading(self, source_id, data_type, before):
+        key = (source_id, data_type)
+        if key not in self.previous:
+            self.previous[key] = ClimateData.objects.filter(
+                data_source_id=source_id, data_type=data_type, timestamp__lt=before,
+            ).order_by('-timestamp').values_list('timestamp', 'value').first()
+        return self.previous[key]
+
+    def evaluate_rows(self, rows, index):
+        """Alerts for a chunk of (id, created_at, source, type, timestamp, value) rows"""
+        alerts = []
+        for _, _, source_id, data_type, timestamp, value in sorted(rows, key=lambda row: row[4]):
+            rules = index.lookup(data_type, source_id)
+            if not rules:
+                continue
+
+            rate = None
+            if index.has_rate_rules(data_type, source_id):
+                previous = self.previous_reading(source_id, data_type, timestamp)
+                if previous is not None and previous[0] < timestamp:
+                    hours = (timestamp - previous[0]).total_seconds() / 3600
+                    rate = (value - previous[1]) / hours
+                if previous is None or previous[0] < timestamp:
+                    self.previous[(source_id, data_type)] = (timestamp, value)
+
+            for rule in rules:
+                measured = rate if rule.rule_type == 'rate_of_change' else value
+                if measured is not None and rule.matches(measured):
+                    alerts.append(build_alert(rule, source_id, timestamp, measured, value))
+        return alerts
+
+    def run(self):
+        """Evaluate everything inserted since the watermark; returns a summary"""
+        started = time.perf_counter()
+        state, _ = AlertEvaluatorState.objects.get_or_create(name=self.name)
+        upper = timezone.now() - COMMIT_GRACE
+        if state.last_created_at is None:
+            # First run: look back a single interval rather than the whole history
+            state.last_created_at = upper - timedelta(seconds=get_check_interval())
+            state.last_id = None
+
+        index = RuleIndex.load()
+        open_alerts = OpenAlertIndex.load()
+        readings = ClimateData.objects.filter(created_at__lte=upper)
+        if index:
+            readings = readings.filter(data_type__in=index.data_types)
+        else:
+            readings = readings.none()
+
+        evaluated = created = coalesced = 0
+        while True:
+            if state.last_id is None:
+                chunk = readings.filter(created_at__gt=state.last_created_at)
+            else:
+                chunk = readings.filter(
+                    Q(created_at__gt=state.last_created_at)
+                    | Q(created_at=state.last_created_at, id__gt=state.last_id)
+                )
+            rows = list(
+                chunk.order_by('created_at', 'id').values_list(
+                    'id', 'created_at', 'data_source_id', 'data_type', 'timestamp', 'value',
+                )[:self.chunk_size]
+            )
+            if not rows:
+                break
+
+            candidates = self.evaluate_rows(rows, index)
+            new_alerts, merged_alerts = open_alerts.merge(candidates)
+            state.last_created_at, state.last_id = rows[-1][1], rows[-1][0]
+            now = timezone.now()
+            for alert in merged_alerts:
+                alert.updated_at = now
+            with transaction.atomic():
+                ClimateAlert.objects.bulk_create(new_alerts)
+                ClimateAlert.objects.bulk_update(merged_alerts, COALESCED_FIELDS)
+                state.save(update_fields=['last_created_at', 'last_id', 'updated_at'])
+            evaluated += len(rows)
+            created += len(new_alerts)
+            coalesced += len(candidates) - len(new_alerts)
+
+        # Everything up to the upper bound has been seen, matching or not
+        state.last_created_at, state.last_id = upper, None
+        state.save(update_fields=['last_created_at', 'last_id', 'updated_at'])
+        if created:
+            invalidate_stats(ALERT_STATS_KEY)
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Alert evaluation checked {evaluated} readings, created {created} alerts "
+            f"and coalesced {coalesced} repeats in {elapsed:.2f}s"
+        )
+        return {
+            'evaluated': evaluated,
+            'alerts': created,
+            'coalesced': coalesced,
+            'watermark': upper,
+            'elapsed_seconds': round(elapsed, 3),
+        }
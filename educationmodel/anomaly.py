@@ -0,0 +1,167 @@
+"""
+Batch anomaly detection for ClimateData.
+
+Unprocessed readings are pulled per (data_source, data_type) series in
+timestamp order, a chunk at a time, into NumPy arrays. Each reading is
+scored against the mean and standard deviation of the preceding
+ANOMALY_WINDOW readings of its series (rolling statistics computed with
+cumulative sums, no per-row Python loop) and flagged when its z-score
+exceeds ANOMALY_THRESHOLD. Results are written back with set-based
+UPDATEs; every chunk commits on its own, so the ``processed`` flag doubles
+as the checkpoint and an interrupted run simply resumes where it stopped.
+"""
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .http_cache import readings_changed
+from .models import ClimateData
+
+logger = logging.getLogger(__name__)
+
+# Ids per UPDATE ... WHERE id IN (...) statement, below SQLite's variable limit
+UPDATE_BATCH_SIZE = 900
+
+
+def get_detection_settings():
+    config = settings.CLIMATE_DATA_SETTINGS
+    return {
+        'threshold': float(config.get('ANOMALY_THRESHOLD', 2.5)),
+        'window': int(config.get('ANOMALY_WINDOW', 50)),
+        'min_history': int(config.get('ANOMALY_MIN_HISTORY', 10)),
+    }
+
+
+def rolling_zscores(values, history, window, min_history):
+    """
+    z-score of each value against the ``window`` values preceding it.
+
+    ``history`` holds the readings just before ``values`` in the same
+    series. Values with fewer than ``min_history`` predecessors get a score
+    of 0; a deviation from a perfectly flat window scores infinity.
+    """
+    series = np.concatenate((history, values))
+    if not len(series):
+        return np.zeros(0)
+
+    # Centre before accumulating to keep the sums of squares well conditioned
+    centred = series - series.mean()
+    sums = np.concatenate(([0.0], np.cumsum(centred)))
+    squares = np.concatenate(([0.0], np.cumsum(centred * centred)))
+
+    positions = np.arange(len(history), len(series))
+    starts = np.maximum(positions - window, 0)
+    counts = positions - starts
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = (sums[positions] - sums[starts]) / counts
+        variances = (squares[positions] - squares[starts]) / counts - means ** 2
+        stds = np.sqrt(np.maximum(variances, 0.0))
+        deviations = np.abs(centred[positions] - means)
+        scores = np.where(stds > 1e-12, deviations / stds, np.where(deviations > 1e-9, np.inf, 0.0))
+
+    scores[counts < min_history] = 0.0
+    return scores
+
+
+def mark_processed(ids, is_anomaly):
+    for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+        ClimateData.objects.filter(id__in=ids[start:start + UPDATE_BATCH_SIZE]).update(
+            is_anomaly=is_anomaly, processed=True,
+        )
+
+
+def detect_series(source_id, data_type, chunk_size, threshold, window, min_history):
+    """Score every unprocessed reading of one series; returns (processed, flagged)"""
+    series = ClimateData.objects.filter(data_source_id=source_id, data_type=data_type)
+    pending = series.filter(processed=False).order_by('timestamp', 'id')
+
+    first = pending.values_list('timestamp', flat=True).first()
+    if first is None:
+        return 0, 0
+
+    # Seed the rolling window with the processed readings right before the backlog
+    history = np.array(
+        list(
+            series.filter(processed=True, timestamp__lt=first)
+            .order_by('-timestamp').values_list('value', flat=True)[:window]
+        )[::-1],
+        dtype=np.float64,
+    )
+
+    processed = flagged = 0
+    last_key = None
+    while True:
+        chunk = pending
+        if last_key is not None:
+            timestamp, pk = last_key
+            chunk = chunk.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+        rows = list(chunk.values_list('id', 'timestamp', 'value')[:chunk_size])
+        if not rows:
+            break
+
+        ids = [row[0] for row in rows]
+        values = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        anomalous = rolling_zscores(values, history, window, min_history) > threshold
+
+        with transaction.atomic():
+            mark_processed([pk for pk, flag in zip(ids, anomalous) if flag], True)
+            mark_processed([pk for pk, flag in zip(ids, anomalous) if not flag], False)
+            readings_changed()
+
+        processed += len(rows)
+        flagged += int(anomalous.sum())
+        history = np.concatenate((history, values))[-window:]
+        last_key = (rows[-1][1], rows[-1][0])
+
+    return processed, flagged
+
+
+def detect_anomalies(chunk_size=None, threshold=None, window=None, min_history=None):
+    """
+    Run detection over every series that has unprocessed readings.
+
+    Returns a summary with per-series and total counts.
+    """
+    options = get_detection_settings()
+    threshold = options['threshold'] if threshold is None else threshold
+    window = options['window'] if window is None else window
+    min_history = options['min_history'] if min_history is None else min_history
+    chunk_size = chunk_size or int(settings.CLIMATE_DATA_SETTINGS.get('MAX_BATCH_SIZE', 10000))
+
+    started = time.perf_counter()
+    series_keys = list(
+        ClimateData.objects.filter(processed=False)
+        .values_list('data_source_id', 'data_type').distinct().order_by()
+    )
+
+    results = []
+    total_processed = total_flagged = 0
+    for source_id, data_type in series_keys:
+        processed, flagged = detect_series(
+            source_id, data_type, chunk_size, threshold, window, min_history,
+        )
+        total_processed += processed
+        total_flagged += flagged
+        results.append({
+            'data_source_id': source_id,
+            'data_type': data_type,
+            'processed': processed,
+            'anomalies': flagged,
+        })
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Anomaly detection processed {total_processed} readings in {len(results)} series, "
+        f"flagged {total_flagged} in {elapsed:.2f}s"
+    )
+    return {
+        'series': results,
+        'processed': total_processed,
+        'anomalies': total_flagged,
+        'elapsed_seconds': round(elapsed, 3),
+    }
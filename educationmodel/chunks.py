@@ -0,0 +1,319 @@
+"""
+Compressed chunks of sealed historical readings.
+
+Once a UTC day is older than CHUNK_SEAL_AFTER_DAYS, ``seal_readings``
+replaces each series' rows for that day with one ClimateDataChunk, where a
+series is a (data_source, data_type) pair. A chunk stores every column as
+its own compressed blob. Integer columns (ids, timestamps, created_at)
+keep the delta of deltas, zigzag-mapped so small negatives stay small.
+Float columns (value, quality_score) keep each value XOR the previous
+one, as in Gorilla. Regular series turn into long runs of zero bytes.
+Instead of a bit-level coder, the 8-byte words are byte-shuffled (all
+first bytes, then all second bytes, ...) and deflated, so decoding is a
+couple of vectorised NumPy passes (``cumsum`` and
+``bitwise_xor.accumulate``) rather than a Python loop per reading.
+
+Readings that arrive for a day after it was sealed stay rows until the
+next run, which merges them into the chunk. A series-day mixing units is
+left as rows. Chart, multi-series, raster comparison and export reads
+add ``sealed_readings`` / ``sealed_export_rows`` to the row queries;
+rollup rebuilds and retention read chunks directly.
+"""
+import logging
+import zlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from itertools import groupby
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .fields import from_epoch_micros, to_epoch_micros
+from .http_cache import readings_changed
+from .models import ClimateData, ClimateDataChunk, DataSource
+from .partitions import count_changed, month_start, readings
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 6
+
+# Row fields read when sealing, in this order
+SEAL_FIELDS = (
+    'id', 'timestamp', 'created_at', 'value', 'quality_score', 'is_anomaly', 'processed', 'unit',
+)
+
+# Decoded column -> (chunk field, kind)
+CHUNK_COLUMNS = {
+    'id': ('id_data', 'integer'),
+    'timestamp': ('timestamp_data', 'integer'),
+    'created_at': ('created_data', 'integer'),
+    'value': ('value_data', 'float'),
+    'quality_score': ('quality_data', 'float'),
+    'is_anomaly': ('flag_data', 'flag'),
+    'processed': ('flag_data', 'flag'),
+}
+
+FLAG_BITS = {'is_anomaly': 1, 'processed': 2}
+
+# Chunks decoded per database round trip
+CHUNK_BATCH_SIZE = 200
+
+
+def get_seal_after():
+    return timedelta(days=settings.CLIMATE_DATA_SETTINGS.get('CHUNK_SEAL_AFTER_DAYS', 30))
+
+
+def day_bounds(day):
+    """Aware ``[start, end)`` datetimes of a UTC day"""
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def shuffle_compress(words):
+    """Deflate fixed-width words after grouping their bytes by position"""
+    words = np.ascontiguousarray(words)
+    planes = words.view(np.uint8).reshape(len(words), words.itemsize).T
+    return zlib.compress(planes.tobytes(), COMPRESSION_LEVEL)
+
+
+def shuffle_decompress(blob, dtype, count):
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(zlib.decompress(blob), dtype=np.uint8).reshape(dtype.itemsize, count)
+    return np.ascontiguousarray(planes.T).view(dtype).ravel()
+
+
+def encode_integers(values):
+    """Delta-of-delta, zigzag and shuffle-compress int64 values"""
+    values = np.asarray(values, dtype='<i8')
+    deltas = np.diff(values, prepend=np.int64(0))
+    second = np.diff(deltas, prepend=np.int64(0))
+    return shuffle_compress(((second << 1) ^ (second >> 63)).view('<u8'))
+
+
+def decode_integers(blob, count):
+    zigzag = shuffle_decompress(blob, '<u8', count)
+    second = (zigzag >> np.uint64(1)).view('<i8') ^ -(zigzag & np.uint64(1)).astype('<i8')
+    return np.cumsum(np.cumsum(second))
+
+
+def encode_floats(values):
+    """XOR each float64's bits with the previous one's and shuffle-compress them"""
+    bits = np.asarray(values, dtype='<f8').view('<u8')
+    previous = np.concatenate([np.zeros(1, dtype='<u8'), bits[:-1]])
+    return shuffle_compress(bits ^ previous)
+
+
+def decode_floats(blob, count):
+    return np.bitwise_xor.accumulate(shuffle_decompress(blob, '<u8', count)).view('<f8')
+
+
+def encode_chunk(chunk, columns):
+    """Store decoded columns (sorted by timestamp) in a chunk's blobs"""
+    timestamps = columns['timestamp']
+    chunk.count = len(timestamps)
+    chunk.start = from_epoch_micros(int(timestamps[0]))
+    chunk.end = from_epoch_micros(int(timestamps[-1]))
+    for name, (field, kind) in CHUNK_COLUMNS.items():
+        if kind == 'integer':
+            setattr(chunk, field, encode_integers(columns[name]))
+        elif kind == 'float':
+            setattr(chunk, field, encode_floats(columns[name]))
+    flags = np.zeros(chunk.count, dtype=np.uint8)
+    for name, bit in FLAG_BITS.items():
+        flags[columns[name]] |= bit
+    chunk.flag_data = zlib.compress(flags.tobytes(), COMPRESSION_LEVEL)
+    return chunk
+
+
+def decode_chunk(chunk, names=tuple(CHUNK_COLUMNS)):
+    """The named columns of a chunk as NumPy arrays; timestamps stay epoch microseconds"""
+    columns = {}
+    flags = None
+    for name in names:
+        field, kind = CHUNK_COLUMNS[name]
+        blob = bytes(getattr(chunk, field))
+        if kind == 'integer':
+            columns[name] = decode_integers(blob, chunk.count)
+        elif kind == 'float':
+            columns[name] = decode_floats(blob, chunk.count)
+        else:
+            if flags is None:
+                flags = np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+            columns[name] = (flags & FLAG_BITS[name]).astype(bool)
+    return columns
+
+
+def rows_to_columns(rows):
+    """Columns from ``values_list`` tuples in SEAL_FIELDS order"""
+    return {
+        'id': np.array([row[0] for row in rows], dtype=np.int64),
+        'timestamp': np.array([to_epoch_micros(row[1]) for row in rows], dtype=np.int64),
+        'created_at': np.array([to_epoch_micros(row[2]) for row in rows], dtype=np.int64),
+        'value': np.array([row[3] for row in rows], dtype=np.float64),
+        'quality_score': np.array([row[4] for row in rows], dtype=np.float64),
+        'is_anomaly': np.array([row[5] for row in rows], dtype=bool),
+        'processed': np.array([row[6] for row in rows], dtype=bool),
+    }
+
+
+def seal_series(queryset, source_id, data_type, day, month=None):
+    """
+    Move one series' rows of a day from ``queryset`` into its chunk.
+
+    ``month`` is the partition the rows live in, if not the live table.
+    Returns the rows sealed.
+    """
+    series = queryset.filter(data_source_id=source_id, data_type=data_type)
+    with transaction.atomic():
+        rows = list(series.order_by('timestamp', 'id').values_list(*SEAL_FIELDS))
+        if not rows:
+            return 0
+        chunk = ClimateDataChunk.objects.filter(data_source_id=source_id, data_type=data_type, day=day).first()
+        units = {row[-1] for row in rows} | ({chunk.unit} if chunk else set())
+        if len(units) > 1:
+            logger.warning(f"Not sealing {data_type} of {source_id} on {day}: mixed units {sorted(units)}")
+            return 0
+
+        columns = rows_to_columns(rows)
+        if chunk is None:
+            chunk = ClimateDataChunk(data_source_id=source_id, data_type=data_type, day=day, unit=units.pop())
+        else:
+            existing = decode_chunk(chunk)
+            columns = {name: np.concatenate([existing[name], columns[name]]) for name in columns}
+            order = np.lexsort((columns['id'], columns['timestamp']))
+            columns = {name: values[order] for name, values in columns.items()}
+        encode_chunk(chunk, columns).save()
+
+        # Rows stored after the read above have higher ids and wait for the next run
+        deleted, _ = series.filter(id__lte=max(row[0] for row in rows)).delete()
+        if month is not None:
+            count_changed(month, -deleted)
+        readings_changed()
+    return deleted
+
+
+def seal_day(day):
+    """Seal every series' readings of one UTC day; returns the rows sealed"""
+    start, end = day_bounds(day)
+    sealed = 0
+    for partition_start, _, queryset in readings().filter(timestamp__gte=start, timestamp__lt=end).partitions:
+        month = None if queryset.model is ClimateData else month_start(partition_start)
+        series = queryset.values_list('data_source_id', 'data_type').distinct().order_by()
+        for source_id, data_type in list(series):
+            sealed += seal_series(queryset, source_id, data_type, day, month)
+    return sealed
+
+
+def seal_readings(cutoff=None):
+    """Seal every whole UTC day before ``cutoff``; returns ``{day: rows sealed}``"""
+    cutoff = cutoff or timezone.now() - get_seal_after()
+    limit = day_bounds(cutoff.astimezone(dt_timezone.utc).date())[0]
+
+    sealed = {}
+    pending = readings().filter(timestamp__lt=limit).order_by('timestamp')[:1]
+    while pending:
+        day = pending[0].timestamp.astimezone(dt_timezone.utc).date()
+        rows = seal_day(day)
+        if rows:
+            sealed[day] = rows
+        # Jump straight to the next day that still has rows
+        pending = readings().filter(
+            timestamp__gte=day_bounds(day)[1], timestamp__lt=limit,
+        ).order_by('timestamp')[:1]
+
+    logger.info(f"Sealed {sum(sealed.values())} climate readings into chunks over {len(sealed)} days")
+    return sealed
+
+
+def chunks_in_window(start, end, *conditions, **filters):
+    """Chunks with readings in ``[start, end]`` (either may be None)"""
+    chunks = ClimateDataChunk.objects.filter(*conditions, **filters)
+    if start is not None:
+        chunks = chunks.filter(day__gte=start.astimezone(dt_timezone.utc).date(), end__gte=start)
+    if end is not None:
+        chunks = chunks.filter(day__lte=end.astimezone(dt_timezone.utc).date(), start__lte=end)
+    return chunks
+
+
+def window_mask(timestamps, start, end):
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start is not None:
+        mask &= timestamps >= to_epoch_micros(start)
+    if end is not None:
+        mask &= timestamps <= to_epoch_micros(end)
+    return mask
+
+
+def sealed_readings(start, end, *conditions, names=('value',), **filters):
+    """
+    Decoded ``names`` columns of sealed readings with ``start <= timestamp <= end``.
+
+    Chunks can be narrowed with Q ``conditions`` and field ``filters``.
+    Like ``archived_readings``, timestamps come back as float epoch seconds
+    and ``data_type``/``data_source_id``/``unit`` as strings.
+    """
+    names = list(dict.fromkeys(['timestamp', *names]))
+    decoded = [name for name in names if name in CHUNK_COLUMNS]
+    parts = {name: [] for name in names}
+
+    for chunk in chunks_in_window(start, end, *conditions, **filters).iterator(chunk_size=CHUNK_BATCH_SIZE):
+        columns = decode_chunk(chunk, decoded)
+        mask = window_mask(columns['timestamp'], start, end)
+        count = int(mask.sum())
+        for name in names:
+            if name in columns:
+                parts[name].append(columns[name][mask])
+            else:
+                parts[name].append(np.full(count, str(getattr(chunk, name))))
+
+    columns = {
+        name: np.concatenate(values) if values else np.empty(0)
+        for name, values in parts.items()
+    }
+    columns['timestamp'] = columns['timestamp'].astype(np.float64) / 1e6
+    return columns
+
+
+def sealed_export_rows(data_type=None, source_id=None, start=None, end=None):
+    """
+    Sealed readings as export tuples (see export.EXPORT_FIELDS), oldest first.
+
+    Filters take the same values as the ClimateData ones; chunks are
+    decoded one day at a time.
+    """
+    to_timestamp = ClimateData._meta.get_field('timestamp').get_prep_value
+    start = to_timestamp(start) if start else None
+    end = to_timestamp(end) if end else None
+    filters = {}
+    if data_type:
+        filters['data_type'] = data_type
+    if source_id:
+        filters['data_source_id'] = source_id
+
+    chunks = chunks_in_window(start, end, **filters).order_by('day')
+    names = dict(DataSource.objects.filter(
+        id__in=chunks.values('data_source_id'),
+    ).values_list('id', 'name'))
+
+    columns_read = ('timestamp', 'value', 'quality_score', 'is_anomaly')
+    batches = groupby(chunks.iterator(chunk_size=CHUNK_BATCH_SIZE), key=lambda chunk: chunk.day)
+    for _, day_chunks in batches:
+        day_chunks = list(day_chunks)
+        parts = {name: [] for name in ('owner', *columns_read)}
+        for index, chunk in enumerate(day_chunks):
+            columns = decode_chunk(chunk, columns_read)
+            mask = window_mask(columns['timestamp'], start, end)
+            parts['owner'].append(np.full(int(mask.sum()), index))
+            for name in columns_read:
+                parts[name].append(columns[name][mask])
+
+        # Interleave the day's series by timestamp
+        order = np.argsort(np.concatenate(parts['timestamp']), kind='stable')
+        merged = [np.concatenate(values)[order].tolist() for values in parts.values()]
+        for owner, timestamp, value, quality_score, is_anomaly in zip(*merged):
+            chunk = day_chunks[owner]
+            yield (
+                from_epoch_micros(timestamp), chunk.data_source_id, names.get(chunk.data_source_id),
+                chunk.data_type, value, chunk.unit, quality_score, is_anomaly,
+            )
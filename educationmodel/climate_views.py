@@ -2,26 +2,56 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import condition, require_http_methods
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
 from django.db.models import Q, Avg, Count, Max, Min
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date
 from django.conf import settings
+import hmac
 import json
 import logging
+import math
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import plotly.graph_objs as go
 import plotly.offline as pyo
 from plotly.utils import PlotlyJSONEncoder
+from asgiref.sync import sync_to_async
 
 from .models import (
-    ClimateUser, UserRole, DataSource, ClimateData, ClimateAlert, 
-    MLModel, SupportTicket, SystemMetrics, Signup
+    ClimateUser, UserRole, DataSource, ClimateData, ClimateDataChunk, ClimateAlert, 
+    MLModel, RasterScene, SupportTicket, SystemMetrics, Signup
 )
+from .binary_series import BINARY_CONTENT_TYPE, encode_series, wants_binary
+from .chunks import sealed_export_rows, sealed_readings
+from .clustering import MAX_ZOOM, cluster_viewport, map_version
+from .downsampling import downsample
+from .export import export_rows, gzip_stream, iter_csv, iter_ndjson
+from .heatmap import grid_heatmap
+from .http_cache import (
+    api_conditions, dashboard_etag, dashboard_last_modified, private_revalidate,
+    readings_version, shared_response_cache,
+)
+from .ingestion import VALID_DATA_TYPES, DEFAULT_UNITS, parse_payload, parse_timestamp, ingest_readings
+from .multiseries import batch_series, parse_series
+from .pagination import decode_since_cursor, encode_since_cursor, keyset_page
+from .partitions import readings, total_readings
+from .pyramid import pyramid_series
+from .rasters import read_window, sample_points, scenes_in_window, station_comparison, window_pixels
+from .realtime import Subscription, event_stream
+from .retention import archived_metrics, archived_readings
+from .rollups import (
+    ROLLUP_RESOLUTIONS, approximate_count, choose_resolution, rollup_series, rollup_summary,
+)
+from .spatial import HALF_CIRCUMFERENCE_KM, nearest_sources, sources_in_bbox, sources_within
+from .stats import alert_stats, data_source_stats, user_stats
 
 logger = logging.getLogger(__name__)
 
@@ -40,10 +70,10 @@ def home_view(request):
     
     # Get some basic stats for the home page
     context = {
-        'total_data_sources': DataSource.objects.filter(is_active=True).count(),
-        'total_climate_data': ClimateData.objects.count(),
-        'active_alerts': ClimateAlert.objects.filter(is_active=True).count(),
-        'recent_data': ClimateData.objects.select_related('data_source').order_by('-timestamp')[:5]
+        'total_data_sources': data_source_stats()['active_sources'],
+        'total_climate_data': total_readings(),
+        'active_alerts': alert_stats()['active_alerts'],
+        'recent_data': readings().select_related('data_source').order_by('-timestamp')[:5]
     }
     return render(request, 'pages/home.html', context)
 
@@ -150,7 +180,10 @@ def forgot_password_view(request):
     return render(request, 'auth/forgot_password.html')
 
 # Dashboard Views
+# Unchanged dashboards are answered with 304 Not Modified
 @login_required
+@condition(etag_func=dashboard_etag, last_modified_func=dashboard_last_modified)
+@private_revalidate
 def admin_dashboard(request):
     """Administrator dashboard with system overview"""
     if not request.user.has_admin_access():
@@ -163,29 +196,17 @@ def admin_dashboard(request):
     # Recent alerts
     recent_alerts = ClimateAlert.objects.filter(is_active=True)[:10]
     
-    # User statistics
-    user_stats = {
-        'total_users': ClimateUser.objects.count(),
-        'active_sessions': ClimateUser.objects.filter(is_active_session=True).count(),
-        'admin_users': ClimateUser.objects.filter(role=UserRole.ADMINISTRATOR).count(),
-        'analyst_users': ClimateUser.objects.filter(role=UserRole.ANALYST).count(),
-    }
-    
-    # Data source statistics
-    data_source_stats = {
-        'total_sources': DataSource.objects.count(),
-        'active_sources': DataSource.objects.filter(is_active=True).count(),
-        'satellite_sources': DataSource.objects.filter(source_type='satellite').count(),
-        'weather_stations': DataSource.objects.filter(source_type='weather_station').count(),
-    }
+    # User and data source statistics (cached, invalidated by signals)
+    users = user_stats()
+    sources = data_source_stats()
     
     # Recent data ingestion
     recent_data = ClimateData.objects.order_by('-created_at')[:100]
     data_ingestion_rate = recent_data.count() if recent_data else 0
     
     context = {
-        'user_stats': user_stats,
-        'data_source_stats': data_source_stats,
+        'user_stats': users,
+        'data_source_stats': sources,
         'recent_alerts': recent_alerts,
         'latest_metrics': latest_metrics,
         'data_ingestion_rate': data_ingestion_rate,
@@ -195,19 +216,17 @@ def admin_dashboard(request):
 
 @login_required
 @user_passes_test(is_analyst_or_admin)
+@condition(etag_func=dashboard_etag, last_modified_func=dashboard_last_modified)
+@private_revalidate
 def analyst_dashboard(request):
     """Climate analyst dashboard with data analysis tools"""
     
-    # Climate data summary
-    data_summary = ClimateData.objects.aggregate(
-        total_records=Count('id'),
-        avg_temperature=Avg('value', filter=Q(data_type='temperature')),
-        max_co2=Max('value', filter=Q(data_type='co2_level')),
-        anomaly_count=Count('id', filter=Q(is_anomaly=True))
-    )
+    # Climate data summary (totals from the daily rollups, anomalies from the index)
+    data_summary = rollup_summary()
+    data_summary['anomaly_count'] = readings().filter(is_anomaly=True).count()
     
     # Recent anomalies
-    recent_anomalies = ClimateData.objects.filter(
+    recent_anomalies = readings().filter(
         is_anomaly=True
     ).order_by('-timestamp')[:20]
     
@@ -229,6 +248,8 @@ def analyst_dashboard(request):
     return render(request, 'dashboards/analyst_dashboard.html', context)
 
 @login_required
+@condition(etag_func=dashboard_etag, last_modified_func=dashboard_last_modified)
+@private_revalidate
 def viewer_dashboard(request):
     """General user dashboard with climate data visualization"""
     
@@ -236,10 +257,16 @@ def viewer_dashboard(request):
     end_date = timezone.now()
     start_date = end_date - timedelta(days=30)
     
-    temperature_data = ClimateData.objects.filter(
+    temperature_data = readings().filter(
         data_type='temperature',
         timestamp__range=[start_date, end_date]
-    ).order_by('timestamp')
+    ).select_related('data_source').order_by('-timestamp')[:10]
+    
+    # Daily means for the trend chart come from the rollups
+    temperature_trend = [
+        {'date': row['bucket'].date().isoformat(), 'mean': round(row['mean'], 2), 'count': row['count']}
+        for row in rollup_series('temperature', start_date, end_date, 'day')
+    ]
     
     # Active alerts (non-critical only for viewers)
     active_alerts = ClimateAlert.objects.filter(
@@ -247,13 +274,16 @@ def viewer_dashboard(request):
         severity__in=['low', 'medium']
     )[:5]
     
-    # Data source locations for map
-    data_sources = DataSource.objects.filter(is_active=True)
+    # A few sources for the summary card; the map loads clusters from api_source_clusters
+    data_sources = DataSource.objects.filter(is_active=True)[:6]
     
     context = {
         'temperature_data': temperature_data,
+        'temperature_trend': temperature_trend,
         'active_alerts': active_alerts,
         'data_sources': data_sources,
+        'active_source_count': data_source_stats()['active_sources'],
+        'live_stream': live_stream_available(request),
     }
     
     return render(request, 'dashboards/viewer_dashboard.html', context)
@@ -277,36 +307,91 @@ def data_sources_view(request):
     
     return render(request, 'data/data_sources.html', context)
 
+def parse_date_filter(raw):
+    """Parse a ``start_date``/``end_date`` filter: a date (midnight UTC) or any timestamp"""
+    if not raw:
+        return None
+    try:
+        day = parse_date(raw.strip())
+    except ValueError:
+        day = None
+    if day is not None:
+        return datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc)
+    try:
+        return parse_timestamp(raw)
+    except ValueError:
+        raise ValueError(f"Invalid date filter: {raw!r}")
+
+def filter_climate_data(request):
+    """
+    Apply the climate data filters from the query string
+    
+    Returns the queryset, the raw filters for the form and the parsed
+    ``(start, end)`` window; raises ValueError for a malformed date.
+    """
+    current_filters = {
+        'data_type': request.GET.get('data_type', ''),
+        'source_id': request.GET.get('source_id', ''),
+        'start_date': request.GET.get('start_date', ''),
+        'end_date': request.GET.get('end_date', ''),
+    }
+    start = parse_date_filter(current_filters['start_date'])
+    end = parse_date_filter(current_filters['end_date'])
+    
+    climate_data = readings()
+    
+    if current_filters['data_type']:
+        climate_data = climate_data.filter(data_type=current_filters['data_type'])
+    if current_filters['source_id']:
+        climate_data = climate_data.filter(data_source_id=current_filters['source_id'])
+    if start:
+        climate_data = climate_data.filter(timestamp__gte=start)
+    if end:
+        climate_data = climate_data.filter(timestamp__lte=end)
+    
+    return climate_data, current_filters, (start, end)
+
 @login_required
 @user_passes_test(is_analyst_or_admin)
 def climate_data_view(request):
     """View and analyze climate data"""
     
-    # Filters
-    data_type = request.GET.get('data_type', '')
-    source_id = request.GET.get('source_id', '')
-    start_date = request.GET.get('start_date', '')
-    end_date = request.GET.get('end_date', '')
-    
-    # Base queryset
-    climate_data = ClimateData.objects.all()
-    
-    # Apply filters
-    if data_type:
-        climate_data = climate_data.filter(data_type=data_type)
-    if source_id:
-        climate_data = climate_data.filter(data_source_id=source_id)
-    if start_date:
-        climate_data = climate_data.filter(timestamp__gte=start_date)
-    if end_date:
-        climate_data = climate_data.filter(timestamp__lte=end_date)
+    try:
+        climate_data, current_filters, (start, end) = filter_climate_data(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    data_type = current_filters['data_type']
+    source_id = current_filters['source_id']
     
-    climate_data = climate_data.order_by('-timestamp')
+    climate_data = climate_data.select_related('data_source')
     
-    # Pagination
-    paginator = Paginator(climate_data, 50)
+    # Legacy page-number links still work, everything else uses keyset cursors
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if page_number:
+        paginator = Paginator(climate_data.order_by('-timestamp'), 50)
+        page_obj = paginator.get_page(page_number)
+        total_records = paginator.count
+    else:
+        page_obj = keyset_page(
+            climate_data, 50,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            last=request.GET.get('last') == '1',
+        )
+        
+        # Exact totals need a full COUNT(*), so default to the rollup estimate
+        count_mode = request.GET.get('count', 'approx')
+        if count_mode == 'exact':
+            total_records = climate_data.count()
+        elif count_mode == 'approx':
+            total_records = approximate_count(
+                data_type=data_type,
+                source_id=source_id,
+                start=start,
+                end=end,
+            )
+        else:
+            total_records = None
     
     # Available filters
     data_types = ClimateData.DATA_TYPES
@@ -314,30 +399,57 @@ def climate_data_view(request):
     
     context = {
         'page_obj': page_obj,
+        'total_records': total_records,
+        'is_cursor_page': not page_number,
         'data_types': data_types,
         'data_sources': data_sources,
-        'current_filters': {
-            'data_type': data_type,
-            'source_id': source_id,
-            'start_date': start_date,
-            'end_date': end_date,
-        }
+        'current_filters': current_filters,
     }
     
     return render(request, 'data/climate_data.html', context)
 
+@login_required
+@user_passes_test(is_analyst_or_admin)
+def export_climate_data(request):
+    """Stream filtered climate data as CSV or NDJSON, optionally gzipped"""
+    try:
+        climate_data, current_filters, (start, end) = filter_climate_data(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    rows = export_rows(climate_data, sealed_export_rows(
+        current_filters['data_type'], current_filters['source_id'], start, end,
+    ))
+    
+    export_format = request.GET.get('format', 'csv')
+    if export_format == 'ndjson':
+        chunks = iter_ndjson(rows)
+        content_type, extension = 'application/x-ndjson', 'ndjson'
+    else:
+        chunks = iter_csv(rows)
+        content_type, extension = 'text/csv', 'csv'
+    
+    filename = f"climate_data_{timezone.now():%Y%m%d_%H%M%S}.{extension}"
+    if request.GET.get('gzip') == '1':
+        chunks = gzip_stream(chunks)
+        content_type, filename = 'application/gzip', f"{filename}.gz"
+    
+    logger.info(f"Climate data export ({extension}) by {request.user.username}: {current_filters}")
+    
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 # Alert Management Views
 @login_required
 def alerts_view(request):
     """View climate alerts based on user role"""
     
     # Filter alerts based on user role
-    if request.user.has_admin_access():
-        alerts = ClimateAlert.objects.all()
-    elif request.user.has_analyst_access():
-        alerts = ClimateAlert.objects.filter(severity__in=['low', 'medium', 'high'])
-    else:
-        alerts = ClimateAlert.objects.filter(severity__in=['low', 'medium'])
+    alerts = ClimateAlert.objects.all()
+    severities = request.user.visible_alert_severities()
+    if severities is not None:
+        alerts = alerts.filter(severity__in=severities)
     
     # Filter by status
     status_filter = request.GET.get('status', 'active')
@@ -420,56 +532,750 @@ def create_support_ticket(request):
     return render(request, 'support/create_ticket.html')
 
 # API Views for AJAX requests
+# Writes younger than this are left for the next delta poll, so a batch still
+# committing when a response is built is not skipped by its cursor
+DELTA_COMMIT_GRACE = timedelta(seconds=1)
+
+def epoch_to_iso(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc).isoformat()
+
+def parse_since(raw):
+    """Return ``(moment, resolution)`` from a delta cursor or a plain timestamp"""
+    try:
+        return decode_since_cursor(raw)
+    except ValueError:
+        pass
+    try:
+        return parse_timestamp(raw), None
+    except ValueError:
+        raise ValueError(f"Invalid since value: {raw!r}")
+
+def chart_window_end(request):
+    """End of a chart window given as ``end``, or None when it ends now"""
+    try:
+        end = parse_timestamp(request.GET['end'])
+    except (KeyError, ValueError):
+        return None
+    return end if end < timezone.now() else None
+
+def chart_version(request):
+    return readings_version([request.GET.get('data_type', 'temperature')])
+
+def chart_batch_version(request):
+    data_types = {spec.partition(':')[0] for spec in request.GET.getlist('series')}
+    return readings_version(data_types & set(VALID_DATA_TYPES))
+
+def metrics_version(request):
+    return SystemMetrics.objects.aggregate(latest=Max('timestamp'))['latest']
+
 @login_required
+@condition(**api_conditions(chart_version, chart_window_end))
+@shared_response_cache(chart_version, chart_window_end)
 def api_climate_data_chart(request):
-    """API endpoint for climate data charts"""
+    """
+    API endpoint for climate data charts
+    
+    The window is the ``days`` before ``end`` (default now). Every response
+    carries a ``cursor``; passing it back as ``since`` returns only what was
+    written after it. Raw deltas hold newly stored readings, rollup deltas
+    hold every bucket that changed, recomputed in full, which replace the
+    client's points with the same timestamp.
+    """
     data_type = request.GET.get('data_type', 'temperature')
-    days = int(request.GET.get('days', 30))
+    try:
+        days = int(request.GET.get('days', 30))
+        if request.GET.get('end'):
+            parse_timestamp(request.GET['end'])
+        # Cap the payload no matter how long the window is
+        max_points = parse_max_points(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    resolution = request.GET.get('resolution', 'auto')
+    
+    since = None
+    if request.GET.get('since'):
+        try:
+            since, since_resolution = parse_since(request.GET['since'])
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        # Keep serving the resolution the client already holds
+        resolution = since_resolution or resolution
+    
+    now = timezone.now()
+    end_date = chart_window_end(request) or now
+    start_date = end_date - timedelta(days=days)
+    watermark = now - DELTA_COMMIT_GRACE
+    
+    # Serve long windows from the coarsest rollup that still has enough buckets
+    if resolution == 'auto':
+        resolution = choose_resolution(end_date - start_date)
+    elif resolution not in ROLLUP_RESOLUTIONS:
+        resolution = None
+    
+    unit = (
+        ClimateData.objects.filter(data_type=data_type).values_list('unit', flat=True).first()
+        or ClimateDataChunk.objects.filter(data_type=data_type).values_list('unit', flat=True).first()
+        or ''
+    )
     
-    end_date = timezone.now()
+    if resolution:
+        buckets = rollup_series(data_type, start_date, end_date, resolution, changed_since=since)
+        series = downsample(
+            [b['bucket'].timestamp() for b in buckets],
+            [b['mean'] for b in buckets],
+            max_points,
+            low=[b['min'] for b in buckets],
+            high=[b['max'] for b in buckets],
+            counts=[b['count'] for b in buckets],
+        )
+        original_points = len(buckets)
+    else:
+        data = readings().filter(
+            data_type=data_type,
+            timestamp__range=[start_date, end_date],
+            created_at__lte=watermark,
+        )
+        if since is not None:
+            data = data.filter(created_at__gt=since)
+        data = data.order_by('timestamp').values_list('timestamp', 'value')
+        
+        rows = list(data)
+        x = np.fromiter((timestamp.timestamp() for timestamp, _ in rows), dtype=np.float64, count=len(rows))
+        y = np.fromiter((value for _, value in rows), dtype=np.float64, count=len(rows))
+        
+        # Readings past DATA_RETENTION_DAYS are served from the cold archive,
+        # and sealed days from their compressed chunks
+        if since is None:
+            archived = archived_readings(start_date, end_date, data_types=[data_type])
+            sealed = sealed_readings(start_date, end_date, data_type=data_type)
+            if len(archived['timestamp']) or len(sealed['timestamp']):
+                x = np.concatenate([archived['timestamp'], sealed['timestamp'], x])
+                y = np.concatenate([archived['value'], sealed['value'], y])
+                order = np.argsort(x, kind='stable')
+                x, y = x[order], y[order]
+        
+        series = downsample(x, y, max_points)
+        original_points = len(x)
+    
+    meta = {
+        'data_type': data_type,
+        'unit': unit,
+        'resolution': resolution or 'raw',
+        'original_points': original_points,
+        'returned_points': len(series['x']),
+        'delta': since is not None,
+        'cursor': encode_since_cursor(watermark, resolution or 'raw'),
+    }
+    extras = []
+    if series['low'] is not None:
+        extras = [
+            ('min_values', series['low']),
+            ('max_values', series['high']),
+            ('counts', series['counts']),
+        ]
+    
+    # Typed-array payload for clients that ask for it (format=binary or Accept)
+    if wants_binary(request):
+        response = HttpResponse(
+            encode_series(series['x'], series['y'], meta, extras), content_type=BINARY_CONTENT_TYPE,
+        )
+    else:
+        # Prepare data for chart
+        chart_data = {
+            'timestamps': [epoch_to_iso(t) for t in series['x'].tolist()],
+            'values': series['y'].tolist(),
+            **meta,
+        }
+        for name, column in extras:
+            chart_data[name] = np.asarray(column).tolist()
+        response = JsonResponse(chart_data)
+    
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+def nan_to_none(values):
+    return [None if value != value else value for value in values.tolist()]
+
+@login_required
+@condition(**api_conditions(chart_batch_version, chart_window_end))
+@shared_response_cache(chart_batch_version, chart_window_end)
+def api_climate_data_chart_batch(request):
+    """
+    Several chart series over one shared window in a single query
+    
+    ``series`` is repeated, each ``data_type`` or ``data_type:source_id``.
+    The window is the ``days`` before ``end`` (default now). All arrays in
+    the response are aligned with ``timestamps``; gaps are null.
+    """
+    try:
+        series = parse_series(request.GET.getlist('series'), VALID_DATA_TYPES)
+        days = int(request.GET.get('days', 30))
+        if request.GET.get('end'):
+            parse_timestamp(request.GET['end'])
+        max_points = parse_max_points(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    resolution = request.GET.get('resolution', 'auto')
+    
+    end_date = chart_window_end(request) or timezone.now()
     start_date = end_date - timedelta(days=days)
     
-    data = ClimateData.objects.filter(
-        data_type=data_type,
-        timestamp__range=[start_date, end_date]
-    ).order_by('timestamp')
+    if resolution == 'auto':
+        resolution = choose_resolution(end_date - start_date)
+    elif resolution not in ROLLUP_RESOLUTIONS:
+        resolution = None
+    
+    result = batch_series(series, start_date, end_date, resolution, max_points)
+    
+    return JsonResponse({
+        'timestamps': [epoch_to_iso(t) for t in result['axis'].tolist()],
+        'resolution': resolution or 'raw',
+        'series': [
+            {
+                'data_type': data_type,
+                'source_id': str(source_id) if source_id else None,
+                'unit': DEFAULT_UNITS.get(data_type, ''),
+                'values': nan_to_none(result['mean'][index]),
+                'min_values': nan_to_none(result['low'][index]),
+                'max_values': nan_to_none(result['high'][index]),
+                'counts': result['count'][index].astype(int).tolist(),
+            }
+            for index, (data_type, source_id) in enumerate(series)
+        ],
+    })
+
+@login_required
+@condition(**api_conditions(chart_version, chart_window_end))
+@shared_response_cache(chart_version, chart_window_end)
+def api_climate_data_pyramid(request):
+    """
+    Chart buckets of one ``data_type`` sized for a ``width``-pixel chart
+    
+    The window runs from ``start`` to ``end`` (default: the 30 days before
+    now). It is served from the pyramid level with at most ``width``
+    buckets in the window, so any pan or zoom reads a few stored tiles.
+    Windows under CHART_MIN_POINTS hours are binned from raw readings
+    (``level`` is then "raw"). Empty buckets are left out.
+    """
+    data_type = request.GET.get('data_type', 'temperature')
+    chart_max_points = settings.CLIMATE_DATA_SETTINGS.get('CHART_MAX_POINTS', 2000)
+    try:
+        if data_type not in VALID_DATA_TYPES:
+            raise ValueError(f"Unknown data_type: {data_type!r}")
+        if 'width' in request.GET:
+            width = int(parse_float_param(request, 'width', 1, chart_max_points))
+        else:
+            width = min(1000, chart_max_points)
+        end_date = parse_timestamp(request.GET['end']) if request.GET.get('end') else timezone.now()
+        start_date = parse_timestamp(request.GET['start']) if request.GET.get('start') else end_date - timedelta(days=30)
+        if start_date >= end_date:
+            raise ValueError("start must be before end")
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    series = pyramid_series(data_type, start_date, end_date, width)
+    meta = {
+        'data_type': data_type,
+        'unit': DEFAULT_UNITS.get(data_type, ''),
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'level': 'raw' if series['level'] is None else series['level'],
+        'bucket_seconds': series['bucket_seconds'],
+        'returned_points': len(series['x']),
+    }
+    extras = [('min_values', series['min']), ('max_values', series['max']), ('counts', series['count'])]
     
-    # Prepare data for chart
-    timestamps = [d.timestamp.isoformat() for d in data]
-    values = [d.value for d in data]
+    if wants_binary(request):
+        response = HttpResponse(
+            encode_series(series['x'], series['mean'], meta, extras), content_type=BINARY_CONTENT_TYPE,
+        )
+    else:
+        chart_data = {
+            'timestamps': [epoch_to_iso(t) for t in series['x'].tolist()],
+            'values': np.round(series['mean'], 4).tolist(),
+            **meta,
+        }
+        for name, column in extras:
+            chart_data[name] = column.tolist()
+        response = JsonResponse(chart_data)
     
-    chart_data = {
-        'timestamps': timestamps,
-        'values': values,
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+@login_required
+@user_passes_test(is_analyst_or_admin)
+@condition(**api_conditions(chart_version, chart_window_end))
+@shared_response_cache(chart_version, chart_window_end)
+def api_climate_data_heatmap(request):
+    """
+    Readings of one ``data_type`` binned on a lat/lon grid by source location
+    
+    The window is the ``hours`` before ``end`` (default now); ``cell`` is
+    the grid step in degrees. Only non-empty cells are returned, as aligned
+    arrays keyed by each cell's south-west corner.
+    """
+    data_type = request.GET.get('data_type', 'temperature')
+    try:
+        if data_type not in VALID_DATA_TYPES:
+            raise ValueError(f"Unknown data_type: {data_type!r}")
+        hours = parse_float_param(request, 'hours', 1, 24 * 366 * 100) if 'hours' in request.GET else 24
+        cell = parse_float_param(request, 'cell', 0.1, 90) if 'cell' in request.GET else 5.0
+        if request.GET.get('end'):
+            parse_timestamp(request.GET['end'])
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    end_date = chart_window_end(request) or timezone.now()
+    start_date = end_date - timedelta(hours=hours)
+    grid = grid_heatmap(data_type, start_date, end_date, cell)
+    
+    return JsonResponse({
         'data_type': data_type,
-        'unit': data[0].unit if data else ''
+        'unit': DEFAULT_UNITS.get(data_type, ''),
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'resolution': grid['resolution'],
+        'cell_degrees': cell,
+        'lat': np.round(grid['lat'], 6).tolist(),
+        'lon': np.round(grid['lon'], 6).tolist(),
+        'mean': np.round(grid['mean'], 4).tolist(),
+        'min': grid['min'].tolist(),
+        'max': grid['max'].tolist(),
+        'count': grid['count'].tolist(),
+        'sources': grid['sources'].tolist(),
+    })
+
+def scene_to_json(scene):
+    return {
+        'id': str(scene.id),
+        'data_source': str(scene.data_source_id),
+        'data_type': scene.data_type,
+        'unit': scene.unit,
+        'timestamp': scene.timestamp.isoformat(),
+        'bounds': [scene.south, scene.west, scene.north, scene.east],
+        'shape': [scene.rows, scene.columns],
     }
+
+def parse_bbox(request, default=None):
+    """``(south, west, north, east)`` from the query, or ``default`` when none is given"""
+    if not any(name in request.GET for name in ('south', 'west', 'north', 'east')):
+        return default
+    south = parse_float_param(request, 'south', -90.0, 90.0)
+    north = parse_float_param(request, 'north', -90.0, 90.0)
+    west = parse_float_param(request, 'west', -180.0, 180.0)
+    east = parse_float_param(request, 'east', -180.0, 180.0)
+    if south > north or west > east:
+        raise ValueError("south/west must not be greater than north/east")
+    return south, west, north, east
+
+def grid_to_json(values):
+    """Nested lists with no-data pixels as null"""
+    return np.where(np.isnan(values), None, np.round(values.astype(np.float64), 4)).tolist()
+
+@login_required
+def api_raster_scenes(request):
+    """Gridded scenes of a ``data_type`` taken in the ``hours`` before ``end``, optionally overlapping a bbox"""
+    data_type = request.GET.get('data_type', 'temperature')
+    try:
+        if data_type not in VALID_DATA_TYPES:
+            raise ValueError(f"Unknown data_type: {data_type!r}")
+        hours = parse_float_param(request, 'hours', 1, 24 * 366 * 100) if 'hours' in request.GET else 24
+        bbox = parse_bbox(request)
+        end_date = parse_timestamp(request.GET['end']) if request.GET.get('end') else timezone.now()
+        source = None
+        if request.GET.get('source'):
+            try:
+                source = DataSource.objects.filter(id=request.GET['source']).first()
+            except ValidationError:
+                pass
+            if source is None:
+                raise ValueError(f"Unknown source: {request.GET['source']!r}")
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    scenes = scenes_in_window(data_type, end_date - timedelta(hours=hours), end_date, bbox, source)
+    return JsonResponse({'scenes': [scene_to_json(scene) for scene in scenes]})
+
+@login_required
+def api_raster_window(request, scene_id):
+    """
+    Pixels of one scene inside a bbox (default: the whole scene)
+    
+    Windows over RASTER_MAX_WINDOW_CELLS pixels are subsampled to every
+    ``step``-th row and column; ``step`` may also be given explicitly.
+    """
+    scene = get_object_or_404(RasterScene, id=scene_id)
+    try:
+        bbox = parse_bbox(request, (scene.south, scene.west, scene.north, scene.east))
+        step = max(1, int(request.GET.get('step', 1)))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    window = window_pixels(scene, bbox)
+    if window is None:
+        return JsonResponse({'success': False, 'error': 'The bbox does not overlap the scene'}, status=400)
+    max_cells = settings.CLIMATE_DATA_SETTINGS.get('RASTER_MAX_WINDOW_CELLS', 250000)
+    cells = (window[1] - window[0]) * (window[3] - window[2])
+    step = max(step, math.ceil(math.sqrt(cells / max_cells)))
+    
+    values, bounds = read_window(scene, bbox, step)
+    return JsonResponse({
+        'scene': scene_to_json(scene),
+        'bounds': list(bounds),
+        'step': step,
+        'shape': list(values.shape),
+        'values': grid_to_json(values),
+    })
+
+@login_required
+def api_raster_sample(request, scene_id):
+    """
+    Scene values at points given as repeated ``lat``/``lon`` pairs
+    
+    Without points, every station inside the scene is listed with its
+    reading closest to the scene time (within
+    RASTER_MATCH_TOLERANCE_MINUTES) next to the grid value at its location.
+    """
+    scene = get_object_or_404(RasterScene.objects.select_related('data_source'), id=scene_id)
+    try:
+        lats = [float(value) for value in request.GET.getlist('lat')]
+        lons = [float(value) for value in request.GET.getlist('lon')]
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'lat and lon must be numbers'}, status=400)
+    if len(lats) != len(lons):
+        return JsonResponse({'success': False, 'error': 'lat and lon must be given in pairs'}, status=400)
+    
+    if lats:
+        values = sample_points(scene, lats, lons)
+        return JsonResponse({
+            'scene': scene_to_json(scene),
+            'points': [
+                {'lat': lat, 'lon': lon, 'value': None if np.isnan(value) else round(float(value), 4)}
+                for lat, lon, value in zip(lats, lons, values)
+            ],
+        })
+    
+    tolerance = timedelta(minutes=settings.CLIMATE_DATA_SETTINGS.get('RASTER_MATCH_TOLERANCE_MINUTES', 30))
+    return JsonResponse({
+        'scene': scene_to_json(scene),
+        'stations': [
+            {
+                'source': source_to_json(match['source']),
+                'timestamp': match['timestamp'].isoformat(),
+                'reading': match['reading'],
+                'grid_value': None if match['grid_value'] is None else round(match['grid_value'], 4),
+                'difference': None if match['grid_value'] is None else round(match['grid_value'] - match['reading'], 4),
+            }
+            for match in station_comparison(scene, tolerance)
+        ],
+    })
+
+def ingest_token_name(request):
+    """Name of the INGEST_API_TOKENS entry matching the request's bearer token, if any"""
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    for name, expected in settings.CLIMATE_DATA_SETTINGS.get('INGEST_API_TOKENS', {}).items():
+        if expected and hmac.compare_digest(token.encode(), expected.encode()):
+            return name
+    return None
+
+def ingest_payload(request, uploader):
+    """Store the readings in a JSON array or NDJSON request body"""
+    try:
+        readings = parse_payload(request.body, request.content_type or '')
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    summary = ingest_readings(readings, batch_size=request.GET.get('batch_size'))
+    
+    logger.info(
+        f"Bulk ingest by {uploader}: {summary['accepted']} accepted, "
+        f"{summary['rejected']} rejected at {summary['rows_per_second']} rows/s"
+    )
     
-    return JsonResponse(chart_data)
+    return JsonResponse({'success': True, **summary})
+
+@csrf_protect
+@login_required
+@user_passes_test(is_analyst_or_admin)
+def browser_ingest(request):
+    return ingest_payload(request, request.user.username)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_ingest_climate_data(request):
+    """
+    Bulk ingestion of climate readings sent as a JSON array or NDJSON
+    
+    Stations send ``Authorization: Bearer <token>`` with one of the
+    INGEST_API_TOKENS and need neither a session nor a CSRF token. Without
+    that header the caller must be a logged-in analyst or admin posting
+    the CSRF token, as for uploads from the browser.
+    """
+    if 'HTTP_AUTHORIZATION' in request.META:
+        name = ingest_token_name(request)
+        if name is None:
+            logger.warning(f"Rejected bulk ingest with an unknown token from {request.META.get('REMOTE_ADDR')}")
+            return JsonResponse({'success': False, 'error': 'Invalid ingestion token'}, status=401)
+        return ingest_payload(request, f"token {name}")
+    return browser_ingest(request)
 
 @login_required
 @user_passes_test(is_admin)
+@condition(**api_conditions(metrics_version))
+@shared_response_cache(metrics_version)
 def api_system_metrics(request):
-    """API endpoint for system metrics"""
+    """API endpoint for system metrics; ``since`` (a previous cursor) returns only newer samples"""
     hours = int(request.GET.get('hours', 24))
     
     end_time = timezone.now()
     start_time = end_time - timedelta(hours=hours)
+    watermark = end_time - DELTA_COMMIT_GRACE
     
     metrics = SystemMetrics.objects.filter(
-        timestamp__range=[start_time, end_time]
-    ).order_by('timestamp')
+        timestamp__range=[start_time, watermark]
+    )
+    since = None
+    if request.GET.get('since'):
+        try:
+            since, _ = parse_since(request.GET['since'])
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        metrics = metrics.filter(timestamp__gt=since)
+    metrics = metrics.order_by('timestamp')
+    
+    # Samples past METRICS_RETENTION_DAYS come from the cold archive
+    if since is None:
+        archived = archived_metrics(start_time, watermark)
+    else:
+        archived = {name: np.empty(0) for name in ('timestamp', 'cpu_usage', 'memory_usage', 'disk_usage', 'active_users')}
     
     data = {
-        'timestamps': [m.timestamp.isoformat() for m in metrics],
-        'cpu_usage': [m.cpu_usage for m in metrics],
-        'memory_usage': [m.memory_usage for m in metrics],
-        'disk_usage': [m.disk_usage for m in metrics],
-        'active_users': [m.active_users for m in metrics],
+        'timestamps': [epoch_to_iso(t) for t in archived['timestamp'].tolist()] + [m.timestamp.isoformat() for m in metrics],
+        'cpu_usage': archived['cpu_usage'].tolist() + [m.cpu_usage for m in metrics],
+        'memory_usage': archived['memory_usage'].tolist() + [m.memory_usage for m in metrics],
+        'disk_usage': archived['disk_usage'].tolist() + [m.disk_usage for m in metrics],
+        'active_users': archived['active_users'].astype(int).tolist() + [m.active_users for m in metrics],
+        'delta': since is not None,
+        'cursor': encode_since_cursor(watermark, 'metrics'),
     }
     
     return JsonResponse(data)
 
+def parse_float_param(request, name, low, high):
+    """A required float query parameter within ``[low, high]``, raising ValueError otherwise"""
+    try:
+        value = float(request.GET[name])
+    except KeyError:
+        raise ValueError(f"Missing parameter: {name}")
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {request.GET[name]!r}")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+def parse_max_points(request):
+    """``max_points`` clamped to ``[3, CHART_MAX_POINTS]`` (default the cap), raising ValueError if not a number"""
+    chart_max_points = settings.CLIMATE_DATA_SETTINGS.get('CHART_MAX_POINTS', 2000)
+    if not request.GET.get('max_points'):
+        return chart_max_points
+    try:
+        value = float(request.GET['max_points'])
+    except ValueError:
+        value = math.nan
+    if math.isnan(value):
+        raise ValueError(f"Invalid max_points: {request.GET['max_points']!r}")
+    return int(max(3, min(value, chart_max_points)))
+
+def spatial_limit(request, default=None, name='limit'):
+    """A result count from ``name``, clamped to SPATIAL_MAX_RESULTS"""
+    max_results = settings.CLIMATE_DATA_SETTINGS.get('SPATIAL_MAX_RESULTS', 1000)
+    return max(1, min(int(request.GET.get(name, default or max_results)), max_results))
+
+def spatial_queryset(request):
+    """Sources a map query may return: active ones unless ``include_inactive=1``, optionally one ``source_type``"""
+    sources = DataSource.objects.all()
+    if request.GET.get('include_inactive') != '1':
+        sources = sources.filter(is_active=True)
+    source_type = request.GET.get('source_type')
+    if source_type:
+        if source_type not in dict(DataSource.SOURCE_TYPES):
+            raise ValueError(f"Unknown source_type: {source_type!r}")
+        sources = sources.filter(source_type=source_type)
+    return sources
+
+def source_to_json(source, distance=None):
+    data = {
+        'id': str(source.id),
+        'name': source.name,
+        'source_type': source.source_type,
+        'lat': source.location_lat,
+        'lon': source.location_lon,
+        'altitude': source.altitude,
+        'is_active': source.is_active,
+    }
+    if distance is not None:
+        data['distance_km'] = round(distance, 3)
+    return data
+
+@login_required
+def api_sources_bbox(request):
+    """
+    Data sources inside a map viewport
+    
+    ``south``/``north`` bound the latitude and ``west``/``east`` the
+    longitude; ``west > east`` is a box across the antimeridian. At most
+    ``limit`` sources are returned and ``truncated`` says whether more exist.
+    """
+    try:
+        south = parse_float_param(request, 'south', -90.0, 90.0)
+        north = parse_float_param(request, 'north', -90.0, 90.0)
+        west = parse_float_param(request, 'west', -180.0, 180.0)
+        east = parse_float_param(request, 'east', -180.0, 180.0)
+        if south > north:
+            raise ValueError("south must not be greater than north")
+        limit = spatial_limit(request)
+        sources = spatial_queryset(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    found = list(sources_in_bbox(south, west, north, east, queryset=sources).order_by('geohash')[:limit + 1])
+    return JsonResponse({
+        'sources': [source_to_json(source) for source in found[:limit]],
+        'count': min(len(found), limit),
+        'truncated': len(found) > limit,
+    })
+
+@login_required
+def api_sources_within(request):
+    """Data sources within ``radius_km`` of ``lat``/``lon``, nearest first"""
+    try:
+        lat = parse_float_param(request, 'lat', -90.0, 90.0)
+        lon = parse_float_param(request, 'lon', -180.0, 180.0)
+        radius = parse_float_param(request, 'radius_km', 0.0, HALF_CIRCUMFERENCE_KM)
+        limit = spatial_limit(request)
+        sources = spatial_queryset(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    matches = sources_within(lat, lon, radius, queryset=sources)
+    return JsonResponse({
+        'sources': [source_to_json(source, distance) for source, distance in matches[:limit]],
+        'count': min(len(matches), limit),
+        'truncated': len(matches) > limit,
+    })
+
+@login_required
+def api_sources_nearest(request):
+    """
+    The ``k`` data sources nearest to ``lat``/``lon``
+    
+    ``alert_id`` may be given instead of a location to find the sources
+    around an alert's data source.
+    """
+    try:
+        if request.GET.get('alert_id'):
+            alerts = ClimateAlert.objects.select_related('data_source').exclude(data_source=None)
+            severities = request.user.visible_alert_severities()
+            if severities is not None:
+                alerts = alerts.filter(severity__in=severities)
+            try:
+                alert = alerts.filter(id=request.GET['alert_id']).first()
+            except ValidationError:
+                alert = None
+            if alert is None:
+                raise ValueError(f"Unknown alert_id: {request.GET['alert_id']!r}")
+            lat, lon = alert.data_source.location_lat, alert.data_source.location_lon
+        else:
+            lat = parse_float_param(request, 'lat', -90.0, 90.0)
+            lon = parse_float_param(request, 'lon', -180.0, 180.0)
+        k = spatial_limit(request, 10, 'k')
+        sources = spatial_queryset(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'lat': lat,
+        'lon': lon,
+        'sources': [source_to_json(source, distance) for source, distance in nearest_sources(lat, lon, k, queryset=sources)],
+    })
+
+def source_clusters_version(request):
+    data_type = request.GET.get('data_type')
+    return map_version(data_type if data_type in VALID_DATA_TYPES else None)
+
+@login_required
+@condition(**api_conditions(source_clusters_version))
+def api_source_clusters(request):
+    """
+    Clustered data source markers for a map viewport at a ``zoom`` level
+    
+    Takes the same viewport and filters as ``api_sources_bbox``. Clusters
+    cover whole tiles around the viewport; with ``data_type`` each one
+    carries the mean of its sources' latest hourly values.
+    """
+    try:
+        south = parse_float_param(request, 'south', -90.0, 90.0)
+        north = parse_float_param(request, 'north', -90.0, 90.0)
+        west = parse_float_param(request, 'west', -180.0, 180.0)
+        east = parse_float_param(request, 'east', -180.0, 180.0)
+        zoom = int(parse_float_param(request, 'zoom', 0, MAX_ZOOM))
+        if south > north:
+            raise ValueError("south must not be greater than north")
+        data_type = request.GET.get('data_type') or None
+        if data_type and data_type not in VALID_DATA_TYPES:
+            raise ValueError(f"Unknown data_type: {data_type!r}")
+        sources = spatial_queryset(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    filters = f"{request.GET.get('source_type', '')}:{request.GET.get('include_inactive') == '1'}"
+    result = cluster_viewport(sources, south, west, north, east, zoom, data_type, filters)
+    return JsonResponse({
+        'zoom': zoom,
+        'precision': result['precision'],
+        'tiles': result['tiles'],
+        'clusters': result['clusters'],
+        'total': sum(cluster['count'] for cluster in result['clusters']),
+    })
+
+def live_stream_available(request):
+    """Whether the request is served over ASGI, which live streams need"""
+    return isinstance(request, ASGIRequest)
+
+async def api_live_stream(request):
+    """
+    Server-Sent Events stream of new readings and alert changes
+    
+    Only served over ASGI: under WSGI the stream would hold a worker for
+    REALTIME_STREAM_MAX_SECONDS and reach the browser all at once.
+    """
+    if not live_stream_available(request):
+        return JsonResponse({'success': False, 'error': 'Live streams need an ASGI server'}, status=501)
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return JsonResponse({'success': False, 'error': 'Authentication required'}, status=401)
+    
+    # Viewers and analysts never receive alerts above their clearance
+    severities = user.visible_alert_severities()
+    requested = [s for s in request.GET.getlist('severity') if s]
+    if requested:
+        severities = [s for s in requested if severities is None or s in severities]
+    
+    subscription = Subscription(
+        data_types=[t for t in request.GET.getlist('data_type') if t],
+        source_ids=[s for s in request.GET.getlist('source') if s],
+        severities=severities,
+        readings=request.GET.get('readings', '1') != '0',
+        alerts=request.GET.get('alerts', '1') != '0',
+    )
+    
+    response = StreamingHttpResponse(event_stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # Utility Views
 def about_view(request):
     """About EarthScape Climate Agency"""
@@ -541,13 +1347,14 @@ def user_management_view(request):
     page_obj = paginator.get_page(page_number)
     
     # Role statistics
+    users = user_stats()
     role_stats = {
-        'total_users': ClimateUser.objects.count(),
-        'admin_count': ClimateUser.objects.filter(role=UserRole.ADMINISTRATOR).count(),
-        'analyst_count': ClimateUser.objects.filter(role=UserRole.ANALYST).count(),
-        'viewer_count': ClimateUser.objects.filter(role=UserRole.VIEWER).count(),
-        'active_users': ClimateUser.objects.filter(is_active=True).count(),
-        'inactive_users': ClimateUser.objects.filter(is_active=False).count(),
+        'total_users': users['total_users'],
+        'admin_count': users['admin_users'],
+        'analyst_count': users['analyst_users'],
+        'viewer_count': users['viewer_users'],
+        'active_users': users['active_users'],
+        'inactive_users': users['inactive_users'],
     }
     
     context = {
@@ -685,13 +1492,14 @@ def system_credentials_view(request):
     legacy_users = Signup.objects.all().order_by('name')
     
     # System statistics
+    users = user_stats()
     system_stats = {
-        'total_climate_users': climate_users.count(),
+        'total_climate_users': users['total_users'],
         'total_legacy_users': legacy_users.count(),
-        'active_climate_users': climate_users.filter(is_active=True).count(),
-        'admin_users': climate_users.filter(role=UserRole.ADMINISTRATOR).count(),
-        'analyst_users': climate_users.filter(role=UserRole.ANALYST).count(),
-        'viewer_users': climate_users.filter(role=UserRole.VIEWER).count(),
+        'active_climate_users': users['active_users'],
+        'admin_users': users['admin_users'],
+        'analyst_users': users['analyst_users'],
+        'viewer_users': users['viewer_users'],
     }
     
     context = {
@@ -0,0 +1,152 @@
+"""
+Zoom-aware marker clustering for the data source map.
+
+A zoom level maps to a cluster precision: a geohash length whose cells
+are about an eighth of a web map tile wide. Sources are grouped by that
+geohash prefix in the database. Clusters are computed per tile, where a
+tile is a geohash cell one character shorter, so it holds up to 32
+clusters. Each tile is cached under a key that carries the data version,
+and neighbouring viewports at the same zoom share most of their tiles.
+A viewport needing more than MAX_TILES tiles is clustered one precision
+coarser.
+
+With a ``data_type``, each cluster also carries the mean of its sources'
+latest hourly rollups from the last MAP_LATEST_VALUE_HOURS hours.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Min
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from .http_cache import readings_version
+from .models import ClimateDataRollup
+from .spatial import GEOHASH_PRECISION, box_cells, grid_spans, span_count, split_antimeridian
+
+TILE_CACHE_PREFIX = 'climate:map:tile'
+SOURCES_VERSION_KEY = 'climate:map:sources'
+
+# Fields whose changes can move a source between clusters or filters
+MAP_SOURCE_FIELDS = frozenset({'location_lat', 'location_lon', 'geohash', 'is_active', 'source_type'})
+
+MAX_ZOOM = 22
+
+# Upper bound on tiles computed (or read from the cache) per request
+MAX_TILES = 64
+
+
+def get_tile_timeout():
+    return settings.CLIMATE_DATA_SETTINGS.get('MAP_TILE_CACHE_TIMEOUT', 600)
+
+
+def get_latest_window():
+    return timedelta(hours=settings.CLIMATE_DATA_SETTINGS.get('MAP_LATEST_VALUE_HOURS', 24))
+
+
+def cluster_precision(zoom):
+    """Geohash length whose cells are about an eighth of a map tile wide at ``zoom``"""
+    # A zoom-z map tile spans 360 / 2**z degrees of longitude; a geohash of
+    # length p splits longitude into 2**ceil(5p / 2) cells
+    return max(1, min(GEOHASH_PRECISION, round(2 * (zoom + 3) / 5)))
+
+
+def sources_version():
+    """When the map's data sources last changed, as seen by this cache"""
+    return cache.get_or_set(SOURCES_VERSION_KEY, timezone.now, None)
+
+
+def map_version(data_type=None):
+    """Version of everything a clustered map shows: its sources and, with a data type, their readings"""
+    versions = [sources_version()]
+    if data_type:
+        versions.append(readings_version([data_type]))
+    return max(filter(None, versions))
+
+
+def viewport_tiles(south, west, north, east, precision):
+    """``(cluster precision, tiles)`` for a viewport, coarsened until it needs at most MAX_TILES tiles"""
+    while True:
+        tile_precision = max(1, precision - 1)
+        boxes = [(south, low, north, high) for low, high in split_antimeridian(west, east)]
+        if precision == 1 or sum(span_count(*grid_spans(*box, tile_precision)) for box in boxes) <= MAX_TILES:
+            tiles = sorted({tile for box in boxes for tile in box_cells(*box, tile_precision)})
+            return precision, tiles
+        precision -= 1
+
+
+def latest_values(sources, data_type):
+    """``{source_id: (geohash, bucket, mean)}`` from each source's latest recent hourly rollup"""
+    latest = {}
+    rollups = ClimateDataRollup.objects.filter(
+        resolution='hour',
+        data_type=data_type,
+        bucket__gte=timezone.now() - get_latest_window(),
+        data_source__in=sources,
+    ).order_by('bucket').values_list('data_source_id', 'data_source__geohash', 'bucket', 'mean_value')
+    for source_id, geohash, bucket, mean in rollups:
+        latest[source_id] = (geohash, bucket, mean)
+    return latest
+
+
+def compute_tile(sources, tile, precision, data_type=None):
+    """Clusters of the sources inside one tile"""
+    in_tile = sources.filter(geohash__gte=tile, geohash__lt=tile + '~')
+    rows = in_tile.annotate(cell=Substr('geohash', 1, precision)).values('cell').annotate(
+        count=Count('id'),
+        lat=Avg('location_lat'),
+        lon=Avg('location_lon'),
+        first_id=Min('id'),
+    ).order_by('cell')
+
+    values = {}
+    if data_type:
+        for geohash, bucket, mean in latest_values(in_tile, data_type).values():
+            values.setdefault(geohash[:precision], []).append((bucket, mean))
+
+    clusters = []
+    for row in rows:
+        reported = values.get(row['cell'], [])
+        clusters.append({
+            'geohash': row['cell'],
+            'count': row['count'],
+            'lat': round(row['lat'], 6),
+            'lon': round(row['lon'], 6),
+            # Single-source clusters are plain markers
+            'source_id': str(row['first_id']) if row['count'] == 1 else None,
+            'value': round(sum(mean for _, mean in reported) / len(reported), 4) if reported else None,
+            'latest': max(bucket for bucket, _ in reported).isoformat() if reported else None,
+            'reporting': len(reported),
+        })
+    return clusters
+
+
+def tile_cache_key(tile, precision, data_type, filters, version):
+    return f"{TILE_CACHE_PREFIX}:{tile}:{precision}:{data_type or ''}:{filters}:{version.timestamp()}"
+
+
+def cluster_viewport(sources, south, west, north, east, zoom, data_type=None, filters=''):
+    """
+    Clusters for every tile touching a viewport.
+
+    ``sources`` is the filtered DataSource queryset and ``filters`` a string
+    identifying those filters in the tile cache keys.
+    """
+    precision, tiles = viewport_tiles(south, west, north, east, cluster_precision(zoom))
+    version = map_version(data_type)
+    keys = {tile: tile_cache_key(tile, precision, data_type, filters, version) for tile in tiles}
+    cached = cache.get_many(keys.values())
+
+    clusters = []
+    missing = {}
+    for tile, key in keys.items():
+        if key in cached:
+            clusters += cached[key]
+        else:
+            missing[key] = compute_tile(sources, tile, precision, data_type)
+            clusters += missing[key]
+    if missing:
+        cache.set_many(missing, get_tile_timeout())
+
+    return {'precision': precision, 'tiles': tiles, 'clusters': clusters, 'cached_tiles': len(cached)}
@@ -0,0 +1,85 @@
+"""
+Server-side downsampling of time series for charts.
+
+Lines are reduced with largest-triangle-three-buckets (LTTB), which keeps
+the visual shape of a series; bands get a min/max envelope computed over
+the very same buckets so every returned array lines up with the selected
+timestamps. All per-point work is vectorized with NumPy; the only Python
+loop runs once per output point.
+"""
+import numpy as np
+
+
+def bucket_starts(n, threshold):
+    """
+    Start index of every LTTB bucket for ``n`` points reduced to ``threshold``.
+
+    The first and last points form buckets of their own; the interior is
+    split into ``threshold - 2`` buckets of near-equal size.
+    """
+    every = (n - 2) / (threshold - 2)
+    interior = (np.arange(threshold - 2) * every).astype(np.int64) + 1
+    return np.concatenate(([0], interior, [n - 1]))
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of the points kept by LTTB, always including both ends"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    starts = bucket_starts(n, threshold)
+    sizes = np.diff(np.append(starts, n))
+    mean_x = np.add.reduceat(x, starts) / sizes
+    mean_y = np.add.reduceat(y, starts) / sizes
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for bucket in range(1, threshold - 1):
+        lo, hi = starts[bucket], starts[bucket + 1]
+        # Triangle between the last kept point, each candidate and the next bucket's mean
+        area = np.abs(
+            (x[a] - mean_x[bucket + 1]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (mean_y[bucket + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[bucket] = a
+    return selected
+
+
+def downsample(x, y, max_points, low=None, high=None, counts=None):
+    """
+    Reduce a series to at most ``max_points`` points.
+
+    ``x``/``y`` give the line; ``low``/``high`` optionally give an existing
+    band (defaults to ``y`` itself) and ``counts`` the number of raw readings
+    behind each point. Returns a dict of aligned arrays with keys ``x``,
+    ``y``, ``low``, ``high``, ``counts`` (the last three may be None when the
+    series was short enough to return unchanged).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+
+    if n <= max_points or max_points < 3:
+        return {'x': x, 'y': y, 'low': low, 'high': high, 'counts': counts}
+
+    starts = bucket_starts(n, max_points)
+    keep = lttb_indices(x, y, max_points)
+
+    low = y if low is None else np.asarray(low, dtype=np.float64)
+    high = y if high is None else np.asarray(high, dtype=np.float64)
+    if counts is None:
+        counts = np.diff(np.append(starts, n))
+    else:
+        counts = np.add.reduceat(np.asarray(counts, dtype=np.int64), starts)
+
+    return {
+        'x': x[keep],
+        'y': y[keep],
+        'low': np.minimum.reduceat(low, starts),
+        'high': np.maximum.reduceat(high, starts),
+        'counts': counts,
+    }
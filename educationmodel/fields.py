@@ -0,0 +1,133 @@
+"""
+Compact column types for high-volume tables.
+
+Each field stores a small integer in the database but keeps the Python
+value the rest of the code already works with. Model attributes, filter
+arguments and ``values_list`` results stay strings and aware datetimes,
+while rows and their indexes shrink to fixed-width integers.
+
+- ``EpochDateTimeField``: aware datetimes as microseconds since the epoch.
+- ``ChoiceCodeField``: string choices as their 1-based position in
+  ``choices``, so new choices must only ever be appended.
+- ``UnitField``: unit symbols as ids of MeasurementUnit rows, created on
+  first use and cached per process.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.db import models
+from django.utils.functional import cached_property
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def to_epoch_micros(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch_micros(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class EpochDateTimeField(models.DateTimeField):
+    """DateTimeField stored as a 64-bit integer of epoch microseconds (UTC)"""
+
+    def get_internal_type(self):
+        # Integer storage and no backend datetime converters
+        return 'BigIntegerField'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        return None if value is None else to_epoch_micros(value)
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else from_epoch_micros(value)
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return from_epoch_micros(value)
+        return super().to_python(value)
+
+
+class IntegerCodeField(models.PositiveSmallIntegerField):
+    """Base for fields whose Python values are strings stored as integer codes"""
+
+    @cached_property
+    def validators(self):
+        # Values are strings in Python, so the integer range validators do not apply
+        return [*self.default_validators, *self._validators]
+
+    def encode(self, value, create=False):
+        raise NotImplementedError
+
+    def decode(self, code):
+        raise NotImplementedError
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, int):
+            return value
+        # Unknown strings match nothing
+        return self.encode(str(value)) or 0
+
+    def get_db_prep_save(self, value, connection):
+        if value is None or isinstance(value, int):
+            return value
+        return self.encode(str(value), create=True)
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else self.decode(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return self.decode(int(value))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+class ChoiceCodeField(IntegerCodeField):
+    """String choices stored as their 1-based position in ``choices``"""
+
+    @cached_property
+    def codes(self):
+        return {value: code for code, (value, _) in enumerate(self.choices, start=1)}
+
+    @cached_property
+    def values(self):
+        return {code: value for value, code in self.codes.items()}
+
+    def encode(self, value, create=False):
+        return self.codes.get(value)
+
+    def decode(self, code):
+        return self.values.get(code)
+
+
+class UnitField(IntegerCodeField):
+    """Unit symbol stored as the id of its MeasurementUnit row"""
+
+    # Shared by every UnitField in the process: symbol -> id and id -> symbol
+    ids = {}
+    symbols = {}
+
+    def load(self):
+        unit_model = apps.get_model('educationmodel', 'MeasurementUnit')
+        for pk, symbol in unit_model.objects.values_list('pk', 'symbol'):
+            self.ids[symbol] = pk
+            self.symbols[pk] = symbol
+
+    def encode(self, value, create=False):
+        if value not in self.ids:
+            self.load()
+        if value not in self.ids and create:
+            unit_model = apps.get_model('educationmodel', 'MeasurementUnit')
+            unit, _ = unit_model.objects.get_or_create(symbol=value)
+            self.ids[value], self.symbols[unit.pk] = unit.pk, value
+        return self.ids.get(value)
+
+    def decode(self, code):
+        if code not in self.symbols:
+            self.load()
+        return self.symbols.get(code, '')
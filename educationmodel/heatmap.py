@@ -0,0 +1,84 @@
+"""
+Gridded spatial aggregation of readings for heatmaps.
+
+Readings are never loaded row by row. The database sums each source's
+hourly (or, for long windows, daily) rollups over the window in one
+grouped query, so the result is one row per source. NumPy then bins
+those rows into lat/lon cells by their source's location and merges the
+counts, weighted sums and extremes per cell with ``bincount`` and
+``minimum.at``/``maximum.at``. Rollups are kept for the whole history,
+so windows past the retention period work too.
+
+The window is widened to whole rollup buckets at its start.
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import F, Max, Min, Sum
+
+from .models import ClimateDataRollup
+from .rollups import bucket_start
+
+# Windows at least this long are summed from daily rollups instead of hourly ones
+DAILY_ROLLUP_MIN_WINDOW = timedelta(days=7)
+
+
+def heatmap_resolution(start, end):
+    return 'day' if end - start >= DAILY_ROLLUP_MIN_WINDOW else 'hour'
+
+
+def source_totals(data_type, start, end, resolution):
+    """Per-source ``(lat, lon, count, weighted_sum, min, max)`` columns over a window"""
+    rows = ClimateDataRollup.objects.filter(
+        resolution=resolution,
+        data_type=data_type,
+        bucket__gte=bucket_start(start, resolution),
+        bucket__lte=end,
+    ).values('data_source_id').annotate(
+        total=Sum('count'),
+        weighted=Sum(F('mean_value') * F('count')),
+        low=Min('min_value'),
+        high=Max('max_value'),
+    ).values_list(
+        'data_source__location_lat', 'data_source__location_lon', 'total', 'weighted', 'low', 'high',
+    ).order_by()
+
+    columns = np.array(list(rows), dtype=np.float64).reshape(-1, 6)
+    return columns[columns[:, 2] > 0].T
+
+
+def grid_heatmap(data_type, start, end, cell_degrees):
+    """
+    Statistics of one data type per lat/lon cell of ``cell_degrees``.
+
+    Only non-empty cells are returned, as aligned arrays: the south-west
+    corner of each cell (``lat``, ``lon``), reading ``count``, ``mean``,
+    ``min``, ``max`` and the number of reporting ``sources``.
+    """
+    resolution = heatmap_resolution(start, end)
+    lat, lon, count, weighted, low, high = source_totals(data_type, start, end, resolution)
+
+    rows = math.ceil(180 / cell_degrees)
+    columns = math.ceil(360 / cell_degrees)
+    row = np.clip(np.floor((lat + 90) / cell_degrees).astype(np.int64), 0, rows - 1)
+    column = np.clip(np.floor((lon + 180) / cell_degrees).astype(np.int64), 0, columns - 1)
+    cells, inverse = np.unique(row * columns + column, return_inverse=True)
+
+    cell_count = np.bincount(inverse, weights=count, minlength=len(cells))
+    cell_weighted = np.bincount(inverse, weights=weighted, minlength=len(cells))
+    cell_low = np.full(len(cells), np.inf)
+    cell_high = np.full(len(cells), -np.inf)
+    np.minimum.at(cell_low, inverse, low)
+    np.maximum.at(cell_high, inverse, high)
+
+    return {
+        'resolution': resolution,
+        'lat': cells // columns * cell_degrees - 90,
+        'lon': cells % columns * cell_degrees - 180,
+        'count': cell_count.astype(np.int64),
+        'mean': cell_weighted / cell_count if len(cells) else cell_weighted,
+        'min': cell_low,
+        'max': cell_high,
+        'sources': np.bincount(inverse, minlength=len(cells)),
+    }
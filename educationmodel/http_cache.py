@@ -0,0 +1,216 @@
+"""
+Conditional GET and shared response caching for read-only views.
+
+Every cacheable view gets a cheap data version: the newest ``created_at``
+of the readings it shows, found with one index lookup. That version feeds
+the ETag/Last-Modified validators, through Django's ``condition``
+decorator, so a client holding the current copy gets a 304 before the
+view runs. It also feeds the key under which the rendered API response is
+shared between users. New data yields a new key. Bulk jobs that change
+stored readings without new rows (anomaly flags, sealing, retention) call
+``readings_changed``, which moves a cache-held timestamp that is part of
+the version too; other edits that bypass ``created_at`` are bounded by
+the TTL. The TTL grows with the age of the window's end, since
+windows deep in the past rarely change.
+
+API responses are shared between users; dashboard pages are personal, so
+they only get conditional GET, with the user, session and CSRF cookie
+folded into the ETag.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+from .binary_series import wants_binary
+from .models import ClimateAlert, ClimateData, ClimateDataPartition, MLModel, SystemMetrics
+from .stats import alert_stats, data_source_stats, user_stats
+
+RESPONSE_CACHE_PREFIX = 'climate:response'
+READINGS_CHANGED_KEY = 'climate:readings:changed'
+
+# Windows that end "now" slide forward; their keys and ETags change this often (seconds)
+WINDOW_QUANTUM = 60
+
+# Rows younger than this are not yet part of the version (see DELTA_COMMIT_GRACE)
+VERSION_GRACE = timedelta(seconds=1)
+
+
+def get_ttl_bounds():
+    config = settings.CLIMATE_DATA_SETTINGS
+    return config.get('API_CACHE_MIN_TTL', 30), config.get('API_CACHE_MAX_TTL', 86400)
+
+
+def window_ttl(end):
+    """Cache lifetime for a window ending at ``end`` (None = now): its age in seconds, clamped"""
+    minimum, maximum = get_ttl_bounds()
+    age = (timezone.now() - end).total_seconds() if end else 0
+    return int(min(max(age, minimum), maximum))
+
+
+def request_window_end(request, window_end_func):
+    return window_end_func(request) if window_end_func else None
+
+
+def readings_changed():
+    """Move the readings version once the current transaction commits"""
+    transaction.on_commit(lambda: cache.set(READINGS_CHANGED_KEY, timezone.now(), None))
+
+
+def readings_version(data_types=None):
+    """
+    Newest committed ClimateData.created_at, optionally for some data types,
+    or the last change to an archived partition or by a bulk job if that is later
+    """
+    readings = ClimateData.objects.filter(created_at__lte=timezone.now() - VERSION_GRACE)
+    if data_types:
+        readings = readings.filter(data_type__in=data_types)
+    return max(
+        filter(None, [
+            readings.aggregate(latest=Max('created_at'))['latest'],
+            ClimateDataPartition.objects.aggregate(latest=Max('updated_at'))['latest'],
+            cache.get(READINGS_CHANGED_KEY),
+        ]),
+        default=None,
+    )
+
+
+def request_version(request, version_func):
+    """Data version for this request, computed once and shared by ETag and cache"""
+    if not hasattr(request, '_climate_data_version'):
+        request._climate_data_version = version_func(request)
+    return request._climate_data_version
+
+
+def normalized_query(request):
+    return sorted((key, sorted(values)) for key, values in request.GET.lists())
+
+
+def response_cache_key(request, version, window_end=None):
+    # A fixed window is fully described by the query; a sliding one also by the time
+    slot = None if window_end else int(timezone.now().timestamp() // WINDOW_QUANTUM)
+    raw = repr((
+        request.path,
+        normalized_query(request),
+        wants_binary(request),
+        version.isoformat() if version else None,
+        slot,
+    ))
+    return f"{RESPONSE_CACHE_PREFIX}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def is_delta_request(request):
+    return bool(request.GET.get('since'))
+
+
+def api_conditions(version_func, window_end_func=None):
+    """ETag and Last-Modified functions for a shared read-only API"""
+
+    def etag(request, *args, **kwargs):
+        if is_delta_request(request):
+            return None
+        version = request_version(request, version_func)
+        window_end = request_window_end(request, window_end_func)
+        return response_cache_key(request, version, window_end).rsplit(':', 1)[1]
+
+    def last_modified(request, *args, **kwargs):
+        if is_delta_request(request):
+            return None
+        return request_version(request, version_func)
+
+    return {'etag_func': etag, 'last_modified_func': last_modified}
+
+
+def shared_response_cache(version_func, window_end_func=None):
+    """
+    Serve GET responses from the shared cache, keyed on path, normalized
+    query parameters, requested format and data version.
+
+    Delta (``since``) requests are always computed.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or is_delta_request(request):
+                return view(request, *args, **kwargs)
+
+            version = request_version(request, version_func)
+            window_end = request_window_end(request, window_end_func)
+            key = response_cache_key(request, version, window_end)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cache.set(key, (response.content, response['Content-Type']), window_ttl(window_end))
+
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ['Accept'])
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def has_pending_messages(request):
+    """True when a flash message is waiting to be shown on the next page"""
+    return bool(request.COOKIES.get('messages') or request.session.get('_messages'))
+
+
+def dashboard_version(request):
+    return max(
+        filter(None, [
+            readings_version(),
+            ClimateAlert.objects.aggregate(latest=Max('updated_at'))['latest'],
+            SystemMetrics.objects.aggregate(latest=Max('timestamp'))['latest'],
+            MLModel.objects.aggregate(latest=Max('last_updated'))['latest'],
+        ]),
+        default=None,
+    )
+
+
+def dashboard_etag(request, *args, **kwargs):
+    if not request.user.is_authenticated or has_pending_messages(request):
+        return None
+    version = request_version(request, dashboard_version)
+    raw = repr((
+        request.path,
+        request.user.pk,
+        request.user.role,
+        request.session.session_key,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        version.isoformat() if version else None,
+        sorted(user_stats().items()),
+        sorted(data_source_stats().items()),
+        sorted(alert_stats().items()),
+    ))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def dashboard_last_modified(request, *args, **kwargs):
+    if not request.user.is_authenticated or has_pending_messages(request):
+        return None
+    return request_version(request, dashboard_version)
+
+
+def private_revalidate(view):
+    """Make browsers revalidate a personal page on every visit"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    return wrapper
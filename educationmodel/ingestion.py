@@ -0,0 +1,305 @@
+"""
+Bulk ingestion helpers for climate readings.
+
+Readings arrive as plain dictionaries (decoded from a JSON array, NDJSON
+lines or CSV rows), are validated into unsaved ClimateData instances and
+written with batched inserts, one transaction per chunk.
+"""
+import json
+import logging
+import math
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ClimateData, DataSource
+from .partitions import ensure_partition, split_archived, store_archived
+from .signals import readings_ingested
+from .streaming_anomaly import score_readings
+
+logger = logging.getLogger(__name__)
+
+VALID_DATA_TYPES = frozenset(code for code, _ in ClimateData.DATA_TYPES)
+
+# Units assumed when a reading does not carry one
+DEFAULT_UNITS = {
+    'temperature': '°C',
+    'humidity': '%',
+    'pressure': 'hPa',
+    'wind_speed': 'm/s',
+    'wind_direction': '°',
+    'precipitation': 'mm',
+    'co2_level': 'ppm',
+    'ozone_level': 'DU',
+    'sea_level': 'mm',
+    'ice_coverage': '%',
+}
+
+# Number of validation errors reported back per batch
+MAX_ERRORS_PER_BATCH = 20
+
+
+class ReadingValidationError(ValueError):
+    """Raised when a single reading cannot be turned into a ClimateData row"""
+
+
+def get_max_batch_size():
+    """Upper bound for rows written in one transaction"""
+    return int(settings.CLIMATE_DATA_SETTINGS.get('MAX_BATCH_SIZE', 10000))
+
+
+def clamp_batch_size(requested=None):
+    """Return a usable batch size, never above MAX_BATCH_SIZE"""
+    limit = get_max_batch_size()
+    try:
+        requested = int(requested) if requested else limit
+    except (TypeError, ValueError):
+        requested = limit
+    return max(1, min(requested, limit))
+
+
+def chunked(iterable, size):
+    """Yield lists of at most ``size`` items without materialising the input"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_ndjson(lines):
+    """Decode newline-delimited JSON, skipping blank lines"""
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e.msg}")
+
+
+def parse_payload(body, content_type=''):
+    """Decode a request body holding a JSON array or NDJSON readings"""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    if not body.strip():
+        raise ValueError("Request body is empty")
+
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        return list(iter_ndjson(body.splitlines()))
+
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError:
+        # Not a single JSON document, fall back to one reading per line
+        return list(iter_ndjson(body.splitlines()))
+
+    if isinstance(payload, dict):
+        payload = payload.get('readings', [payload])
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of readings")
+    return payload
+
+
+class DataSourceResolver:
+    """In-memory lookup of data sources by UUID or by name"""
+
+    def __init__(self):
+        self.by_id = {}
+        self.by_name = {}
+        for source_id, name in DataSource.objects.values_list('id', 'name'):
+            self.by_id[str(source_id)] = source_id
+            self.by_name.setdefault(name, source_id)
+
+    def resolve(self, ref):
+        if ref is None or ref == '':
+            return None
+        ref = str(ref).strip()
+        if ref in self.by_id:
+            return self.by_id[ref]
+        try:
+            # Accept UUIDs written without dashes or in upper case
+            normalised = str(uuid.UUID(ref))
+        except ValueError:
+            return self.by_name.get(ref)
+        return self.by_id.get(normalised)
+
+
+def from_epoch_seconds(raw, seconds):
+    try:
+        return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        # NaN, or outside what datetime (or the platform's time functions) can hold
+        raise ReadingValidationError(f"Timestamp out of range: {raw!r}")
+
+
+def parse_timestamp(raw):
+    """
+    Parse an ISO-8601 string or epoch seconds into an aware datetime,
+    raising ReadingValidationError for anything else
+    """
+    if isinstance(raw, datetime):
+        value = raw
+    elif isinstance(raw, (int, float)) and not isinstance(raw, bool):
+        return from_epoch_seconds(raw, raw)
+    elif isinstance(raw, str) and raw.strip():
+        raw = raw.strip()
+        try:
+            seconds = float(raw)
+        except ValueError:
+            seconds = None
+        if seconds is not None:
+            return from_epoch_seconds(raw, seconds)
+        try:
+            value = parse_datetime(raw.replace(' ', 'T', 1))
+        except ValueError:
+            # Well formed but impossible, such as month 13
+            value = None
+        if value is None:
+            raise ReadingValidationError(f"Invalid timestamp: {raw!r}")
+    else:
+        raise ReadingValidationError("Missing timestamp")
+
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    try:
+        # Everything downstream buckets by UTC, so the UTC time must exist
+        value.astimezone(dt_timezone.utc)
+    except OverflowError:
+        raise ReadingValidationError(f"Timestamp out of range: {raw!r}")
+    return value
+
+
+def parse_float(raw, field):
+    try:
+        value = float(raw)
+    except (TypeError, ValueError, OverflowError):
+        raise ReadingValidationError(f"Invalid {field}: {raw!r}")
+    if not math.isfinite(value):
+        raise ReadingValidationError(f"Invalid {field}: {raw!r}")
+    return value
+
+
+def clean_reading(raw):
+    """
+    Validate the fields of one raw reading without touching the database.
+
+    The data source reference is returned unresolved so this can run in
+    worker processes; ``reading_from_fields`` finishes the job.
+    """
+    if not isinstance(raw, dict):
+        raise ReadingValidationError("Reading must be an object")
+
+    data_type = raw.get('data_type')
+    if not isinstance(data_type, str) or data_type not in VALID_DATA_TYPES:
+        raise ReadingValidationError(f"Unknown data_type: {data_type!r}")
+
+    quality_score = raw.get('quality_score')
+    quality_score = 1.0 if quality_score in (None, '') else parse_float(quality_score, 'quality_score')
+    if not 0.0 <= quality_score <= 1.0:
+        raise ReadingValidationError("quality_score must be between 0.0 and 1.0")
+
+    return {
+        'source_ref': raw.get('data_source', raw.get('source_id', raw.get('source'))),
+        'data_type': data_type,
+        'value': parse_float(raw.get('value'), 'value'),
+        'unit': str(raw.get('unit') or DEFAULT_UNITS.get(data_type, ''))[:50],
+        'timestamp': parse_timestamp(raw.get('timestamp')),
+        'quality_score': quality_score,
+    }
+
+
+def reading_from_fields(fields, resolver):
+    """Resolve the data source of cleaned fields and build a ClimateData"""
+    source_id = resolver.resolve(fields['source_ref'])
+    if source_id is None:
+        raise ReadingValidationError(f"Unknown data source: {fields['source_ref']!r}")
+
+    return ClimateData(
+        data_source_id=source_id,
+        data_type=fields['data_type'],
+        value=fields['value'],
+        unit=fields['unit'],
+        timestamp=fields['timestamp'],
+        quality_score=fields['quality_score'],
+    )
+
+
+def build_reading(raw, resolver):
+    """Validate one raw reading and return an unsaved ClimateData"""
+    return reading_from_fields(clean_reading(raw), resolver)
+
+
+def validate_readings(raw_readings, resolver, offset=0):
+    """Split raw readings into valid ClimateData objects and error messages"""
+    objects = []
+    errors = []
+    for index, raw in enumerate(raw_readings, start=offset):
+        try:
+            objects.append(build_reading(raw, resolver))
+        except ReadingValidationError as e:
+            errors.append({'index': index, 'error': str(e)})
+    return objects, errors
+
+
+def write_batch(objects):
+    """Insert one chunk of validated readings in a single transaction"""
+    score_readings(objects)
+    # Readings from already archived months go straight to their partition
+    live, archived = split_archived(objects)
+    for month in archived:
+        ensure_partition(month)
+    with transaction.atomic():
+        created = ClimateData.objects.bulk_create(live) + store_archived(archived)
+        readings_ingested.send(sender=ClimateData, readings=created)
+    return created
+
+
+def ingest_readings(raw_readings, batch_size=None, resolver=None):
+    """
+    Validate and insert readings in chunks of at most MAX_BATCH_SIZE rows.
+
+    Returns a summary with per-batch accepted/rejected counts and the
+    achieved throughput in rows per second.
+    """
+    batch_size = clamp_batch_size(batch_size)
+    resolver = resolver or DataSourceResolver()
+
+    batches = []
+    accepted = rejected = 0
+    started = time.perf_counter()
+
+    for number, chunk in enumerate(chunked(raw_readings, batch_size), start=1):
+        objects, errors = validate_readings(chunk, resolver, offset=(number - 1) * batch_size)
+        if objects:
+            write_batch(objects)
+        accepted += len(objects)
+        rejected += len(errors)
+        batches.append({
+            'batch': number,
+            'accepted': len(objects),
+            'rejected': len(errors),
+            'errors': errors[:MAX_ERRORS_PER_BATCH],
+        })
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Ingested {accepted} climate readings ({rejected} rejected) in {elapsed:.3f}s")
+
+    return {
+        'batch_size': batch_size,
+        'batches': batches,
+        'accepted': accepted,
+        'rejected': rejected,
+        'elapsed_seconds': round(elapsed, 4),
+        'rows_per_second': round(accepted / elapsed, 1) if elapsed > 0 else float(accepted),
+    }
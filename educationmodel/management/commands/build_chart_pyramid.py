@@ -0,0 +1,39 @@
+"""
+Rebuild the min/max chart pyramid from the hourly rollups.
+
+Tiles are otherwise built the first time a chart needs them. Building the
+whole pyramid up front keeps the first zoom out to many years fast. Run
+it after deploying, or after large backfills.
+
+Example:
+    python manage.py build_chart_pyramid --data-type temperature
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from educationmodel.ingestion import VALID_DATA_TYPES
+from educationmodel.pyramid import build_pyramid
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the multi-level min/max chart pyramid from hourly rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data-type', action='append', choices=sorted(VALID_DATA_TYPES),
+            help='Data type to rebuild (repeatable; default: all)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stored = 0
+        for data_type in options['data_type'] or sorted(VALID_DATA_TYPES):
+            tiles = build_pyramid(data_type)
+            if tiles:
+                self.stdout.write(f"Stored {tiles} {data_type} tiles")
+            stored += tiles
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stored} pyramid tiles in {time.perf_counter() - started:.1f}s"
+        ))
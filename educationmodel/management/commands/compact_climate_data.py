@@ -0,0 +1,43 @@
+"""
+Seal old ClimateData rows into compressed per-day chunks.
+
+Every whole UTC day older than CHUNK_SEAL_AFTER_DAYS is compacted into one
+ClimateDataChunk per data source and data type, and its rows are deleted.
+Late readings for days already sealed are merged into their chunks. Run it
+daily from cron.
+
+Example:
+    python manage.py compact_climate_data --older-than-days 60
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from educationmodel.chunks import get_seal_after, seal_readings
+
+
+class Command(BaseCommand):
+    help = 'Compress climate readings older than N days into per-day chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            help='Seal days older than this (default: CHUNK_SEAL_AFTER_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        days = options['older_than_days']
+        if days is not None and days < 1:
+            raise CommandError("--older-than-days must be at least 1")
+        age = timedelta(days=days) if days is not None else get_seal_after()
+
+        started = time.perf_counter()
+        sealed = seal_readings(timezone.now() - age)
+        for day, rows in sealed.items():
+            self.stdout.write(f"Sealed {rows} readings from {day:%Y-%m-%d}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sealed {sum(sealed.values())} readings in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,39 @@
+"""
+Flag anomalous ClimateData readings with a rolling z-score.
+
+Processes every reading with ``processed=False``; safe to interrupt and
+re-run, since each committed chunk is marked processed.
+
+Example:
+    python manage.py detect_anomalies --threshold 3
+"""
+from django.core.management.base import BaseCommand
+
+from educationmodel.anomaly import detect_anomalies
+
+
+class Command(BaseCommand):
+    help = 'Flag anomalous unprocessed climate readings using a rolling z-score'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Readings loaded per chunk (default: MAX_BATCH_SIZE)')
+        parser.add_argument('--threshold', type=float, help='z-score threshold (default: ANOMALY_THRESHOLD)')
+        parser.add_argument('--window', type=int, help='Rolling window length (default: ANOMALY_WINDOW)')
+
+    def handle(self, *args, **options):
+        summary = detect_anomalies(
+            chunk_size=options['chunk_size'],
+            threshold=options['threshold'],
+            window=options['window'],
+        )
+
+        if options['verbosity'] > 1:
+            for series in summary['series']:
+                self.stdout.write(
+                    f"  {series['data_source_id']} {series['data_type']}: "
+                    f"{series['processed']} processed, {series['anomalies']} anomalies"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {summary['processed']} readings in {len(summary['series'])} series, "
+            f"flagged {summary['anomalies']} anomalies in {summary['elapsed_seconds']}s"
+        ))
@@ -0,0 +1,44 @@
+"""
+Enforce DATA_RETENTION_DAYS and METRICS_RETENTION_DAYS.
+
+Expired climate readings and system metrics are written to compressed
+NumPy archives under ARCHIVE_DIR, then deleted in chunks of
+RETENTION_DELETE_CHUNK rows (whole partition tables for fully expired
+months). Safe to re-run after an interruption; run it daily from cron.
+
+Example:
+    python manage.py enforce_retention --chunk-size 2000
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from educationmodel.retention import enforce_climate_retention, enforce_metrics_retention
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete climate readings and system metrics past their retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows deleted per transaction (default: RETENTION_DELETE_CHUNK)')
+        parser.add_argument('--skip-metrics', action='store_true', help='Leave system metrics alone')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size is not None and chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        started = time.perf_counter()
+        summary = enforce_climate_retention(chunk_size=chunk_size)
+        self.stdout.write(
+            f"Readings: {summary['archived']} archived, {summary['deleted']} deleted, "
+            f"{summary['dropped_partitions']} partitions dropped"
+        )
+
+        if not options['skip_metrics']:
+            summary = enforce_metrics_retention(chunk_size=chunk_size)
+            self.stdout.write(f"System metrics: {summary['archived']} archived, {summary['deleted']} deleted")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Retention enforced in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,40 @@
+"""
+Evaluate alert rules against newly inserted climate readings.
+
+Runs every ALERT_CHECK_INTERVAL seconds until interrupted; each pass only
+reads the rows inserted since the previous one. Use --once from cron.
+
+Example:
+    python manage.py evaluate_alerts --once
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from educationmodel.alerting import AlertEvaluator, get_check_interval
+
+
+class Command(BaseCommand):
+    help = 'Evaluate alert rules against new climate readings every ALERT_CHECK_INTERVAL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single evaluation pass and exit')
+        parser.add_argument('--interval', type=int, help='Seconds between passes (default: ALERT_CHECK_INTERVAL)')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or get_check_interval()
+        evaluator = AlertEvaluator()
+
+        while True:
+            started = time.monotonic()
+            summary = evaluator.run()
+            self.stdout.write(self.style.SUCCESS(
+                f"Checked {summary['evaluated']} readings, created {summary['alerts']} alerts, "
+                f"coalesced {summary['coalesced']} repeats in {summary['elapsed_seconds']}s"
+            ))
+            if options['once']:
+                break
+            try:
+                time.sleep(max(interval - (time.monotonic() - started), 0))
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,203 @@
+"""
+Stream climate readings from large CSV or NDJSON files into ClimateData.
+
+The file is read line by line as bytes, parsed and validated in a process
+pool, and written by this process alone in chunks of at most
+MAX_BATCH_SIZE rows. Only a bounded number of chunks is in flight at any
+time, so memory stays flat regardless of file size. After every committed
+chunk the byte offset is reported (and optionally checkpointed) so a
+crashed import can be resumed with ``--offset`` or ``--checkpoint``.
+
+Example:
+    python manage.py import_climate_data history.csv --checkpoint history.offset
+"""
+import csv
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from educationmodel.ingestion import (
+    DataSourceResolver, ReadingValidationError, clamp_batch_size,
+    reading_from_fields, write_batch,
+)
+
+# Errors echoed per chunk at verbosity 1; everything is shown at verbosity 2+
+ERRORS_SHOWN_PER_CHUNK = 5
+
+
+def init_worker():
+    django.setup()
+
+
+def parse_chunk(fmt, header, start_offset, lines):
+    """
+    Parse and validate one chunk of raw lines in a worker process.
+
+    Returns ``(cleaned_fields, errors)`` where errors carry the byte offset
+    of the offending line.
+    """
+    from educationmodel.ingestion import clean_reading
+
+    cleaned = []
+    errors = []
+    offset = start_offset
+    for line in lines:
+        line_offset = offset
+        offset += len(line)
+        text = line.decode('utf-8-sig' if line_offset == 0 else 'utf-8', errors='replace').strip()
+        if not text:
+            continue
+        try:
+            if fmt == 'ndjson':
+                raw = json.loads(text)
+            else:
+                values = next(csv.reader(io.StringIO(text)))
+                raw = dict(zip(header, values))
+            cleaned.append(clean_reading(raw))
+        except (ValueError, OverflowError, RecursionError, StopIteration) as e:
+            # json.JSONDecodeError and ReadingValidationError are ValueErrors;
+            # RecursionError comes from absurdly nested JSON
+            errors.append((line_offset, str(e) or 'Empty row'))
+    return cleaned, errors
+
+
+def read_chunks(handle, size):
+    """Yield ``(start_offset, end_offset, lines)`` for consecutive line chunks"""
+    start = handle.tell()
+    lines = []
+    end = start
+    for line in handle:
+        lines.append(line)
+        end += len(line)
+        if len(lines) >= size:
+            yield start, end, lines
+            start, lines = end, []
+    if lines:
+        yield start, end, lines
+
+
+class Command(BaseCommand):
+    help = 'Stream climate readings from a CSV or NDJSON file into ClimateData'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import')
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help='Input format (default: guessed from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Rows per insert transaction (capped by MAX_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Parser processes; 1 parses in this process (default: all cores)',
+        )
+        parser.add_argument(
+            '--offset', type=int,
+            help='Byte offset to resume from after an interrupted import',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File storing the last committed byte offset; resumes from it if present',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        batch_size = clamp_batch_size(options['batch_size'])
+        workers = max(1, options['workers'])
+        checkpoint = options['checkpoint']
+
+        offset = options['offset']
+        if offset is None and checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                offset = int(f.read().strip() or 0)
+        offset = offset or 0
+
+        resolver = DataSourceResolver()
+        accepted = rejected = 0
+        started = time.perf_counter()
+
+        with open(path, 'rb') as handle:
+            header = None
+            if fmt == 'csv':
+                header_line = handle.readline()
+                header = next(csv.reader([header_line.decode('utf-8-sig')]), [])
+                header = [name.strip() for name in header]
+                offset = max(offset, len(header_line))
+            handle.seek(offset)
+
+            self.stdout.write(
+                f"Importing {path} as {fmt} from byte {offset} "
+                f"with {workers} parser(s), {batch_size} rows per batch"
+            )
+
+            chunks = read_chunks(handle, batch_size)
+            for end_offset, cleaned, errors in self.parse_chunks(chunks, fmt, header, workers):
+                objects = []
+                for fields in cleaned:
+                    try:
+                        objects.append(reading_from_fields(fields, resolver))
+                    except ReadingValidationError as e:
+                        errors.append((None, str(e)))
+                if objects:
+                    write_batch(objects)
+
+                accepted += len(objects)
+                rejected += len(errors)
+                if checkpoint:
+                    with open(checkpoint, 'w') as f:
+                        f.write(str(end_offset))
+
+                self.report_errors(errors, options['verbosity'])
+                elapsed = time.perf_counter() - started
+                rate = accepted / elapsed if elapsed > 0 else 0.0
+                self.stdout.write(
+                    f"{accepted} rows imported, {rejected} rejected, "
+                    f"offset {end_offset}, {rate:,.0f} rows/s"
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {accepted} readings ({rejected} rejected) in {elapsed:.1f}s"
+        ))
+
+    def parse_chunks(self, chunks, fmt, header, workers):
+        """Yield ``(end_offset, cleaned, errors)`` in file order"""
+        if workers == 1:
+            for start, end, lines in chunks:
+                cleaned, errors = parse_chunk(fmt, header, start, lines)
+                yield end, cleaned, errors
+            return
+
+        # Keep a bounded window of chunks in flight so memory stays flat
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            for start, end, lines in chunks:
+                pending.append((end, pool.submit(parse_chunk, fmt, header, start, lines)))
+                if len(pending) >= workers * 2:
+                    end_offset, future = pending.popleft()
+                    yield (end_offset, *future.result())
+            while pending:
+                end_offset, future = pending.popleft()
+                yield (end_offset, *future.result())
+
+    def report_errors(self, errors, verbosity):
+        if not errors or verbosity < 1:
+            return
+        shown = errors if verbosity > 1 else errors[:ERRORS_SHOWN_PER_CHUNK]
+        for line_offset, message in shown:
+            location = f"byte {line_offset}" if line_offset is not None else "row"
+            self.stderr.write(f"  {location}: {message}")
+        if len(shown) < len(errors):
+            self.stderr.write(f"  ... {len(errors) - len(shown)} more")
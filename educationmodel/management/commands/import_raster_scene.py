@@ -0,0 +1,67 @@
+"""
+Store a gridded field (e.g. a resampled satellite scene) as a raster scene.
+
+The input is a 2-D ``.npy`` array on a regular lat/lon grid with row 0 at
+the north edge. It is opened memory-mapped and re-tiled into RASTER_DIR
+tile by tile, so scenes larger than memory can be imported.
+
+Example:
+    python manage.py import_raster_scene goes_sst.npy --source "GOES-East" \\
+        --data-type temperature --timestamp 2024-06-01T12:00:00Z --bounds -30 -100 30 -20
+"""
+import time
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from educationmodel.ingestion import DEFAULT_UNITS, VALID_DATA_TYPES, parse_timestamp
+from educationmodel.models import DataSource
+from educationmodel.rasters import store_scene
+
+
+class Command(BaseCommand):
+    help = 'Store a 2-D .npy lat/lon grid as a memory-mapped raster scene'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='2-D .npy array, row 0 at the north edge')
+        parser.add_argument('--source', required=True, help='Data source id or name')
+        parser.add_argument('--data-type', required=True, choices=sorted(VALID_DATA_TYPES))
+        parser.add_argument('--timestamp', required=True, help='Acquisition time (ISO 8601)')
+        parser.add_argument(
+            '--bounds', required=True, nargs=4, type=float, metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'),
+            help='Extent of the grid in degrees',
+        )
+        parser.add_argument('--unit', help='Unit of the values (default: the data type\'s usual unit)')
+
+    def handle(self, *args, **options):
+        try:
+            timestamp = parse_timestamp(options['timestamp'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        try:
+            source = DataSource.objects.filter(id=options['source']).first()
+        except ValidationError:
+            source = None
+        if source is None:
+            sources = list(DataSource.objects.filter(name=options["source"])[:2])
+            if len(sources) != 1:
+                raise CommandError(f"No single data source matches {options['source']!r}")
+            source = sources[0]
+
+        try:
+            array = np.load(options['path'], mmap_mode='r')
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        started = time.perf_counter()
+        unit = options['unit'] if options['unit'] is not None else DEFAULT_UNITS.get(options['data_type'], '')
+        try:
+            scene = store_scene(source, options['data_type'], timestamp, array, tuple(options['bounds']), unit)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {scene.rows}x{scene.columns} scene {scene.id} in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,38 @@
+"""
+Move closed months of ClimateData into monthly partition tables.
+
+Keeps the last PARTITION_LIVE_MONTHS months (current one included) in the
+live table and archives everything older, one month per transaction. Run
+it daily or monthly from cron.
+
+Example:
+    python manage.py partition_climate_data
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from educationmodel.partitions import archive_closed_months, get_live_months
+
+
+class Command(BaseCommand):
+    help = 'Archive closed months of climate readings into monthly partition tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--live-months', type=int,
+            help='Months kept in the live table, current one included (default: PARTITION_LIVE_MONTHS)',
+        )
+
+    def handle(self, *args, **options):
+        live_months = options['live_months'] or get_live_months()
+        if live_months < 1:
+            raise CommandError("--live-months must be at least 1")
+
+        started = time.perf_counter()
+        for month, rows in archive_closed_months(live_months).items():
+            self.stdout.write(f"Archived {rows} readings from {month:%Y-%m}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Partitioning finished in {time.perf_counter() - started:.1f}s"
+        ))
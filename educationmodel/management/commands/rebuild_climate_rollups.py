@@ -0,0 +1,46 @@
+"""
+Recompute hourly/daily ClimateData rollups from raw readings and sealed chunks.
+
+Use after backfills that bypassed ingestion, or after raw rows were edited
+or deleted. Days before the DATA_RETENTION_DAYS cutoff are never rebuilt,
+since their readings may already be archived: the range starts no earlier
+than the first whole UTC day after the cutoff, and without --start that is
+where it starts.
+
+Example:
+    python manage.py rebuild_climate_rollups --start 2024-01-01 --end 2024-03-31
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from educationmodel.ingestion import ReadingValidationError, parse_timestamp
+from educationmodel.rollups import ROLLUP_RESOLUTIONS, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute hourly and daily ClimateData rollups from raw readings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (ISO date, UTC; default and floor: first day inside DATA_RETENTION_DAYS)')
+        parser.add_argument('--end', help='Last day to rebuild, inclusive (ISO date, UTC)')
+        parser.add_argument(
+            '--resolution', choices=list(ROLLUP_RESOLUTIONS), action='append',
+            help='Resolution to rebuild; repeat for several (default: all)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_timestamp(options['start']) if options['start'] else None
+            end = parse_timestamp(options['end']) if options['end'] else None
+        except ReadingValidationError as e:
+            raise CommandError(str(e))
+
+        resolutions = tuple(options['resolution'] or ROLLUP_RESOLUTIONS)
+        started = time.perf_counter()
+        written = rebuild_rollups(start=start, end=end, resolutions=resolutions)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} rollup rows ({', '.join(resolutions)}) "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -10,6 +10,12 @@ import uuid
 
 class Migration(migrations.Migration):
 
+    # AUTH_USER_MODEL is created here, not in 0001, so admin's log table
+    # (which Django only makes depend on 0001) must wait for it
+    run_before = [
+        ('admin', '0001_initial'),
+    ]
+
     dependencies = [
         ('auth', '0012_alter_user_first_name_max_length'),
         ('educationmodel', '0001_initial'),
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:56
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, F, Max, Min, Sum
+from django.db.models.functions import Trunc
+import django.db.models.deletion
+
+
+def populate_rollups(apps, schema_editor):
+    ClimateData = apps.get_model('educationmodel', 'ClimateData')
+    ClimateDataRollup = apps.get_model('educationmodel', 'ClimateDataRollup')
+
+    for resolution in ('hour', 'day'):
+        rows = ClimateData.objects.annotate(
+            bucket=Trunc('timestamp', resolution, tzinfo=dt_timezone.utc),
+        ).values('data_source_id', 'data_type', 'bucket').annotate(
+            count=Count('id'),
+            min_value=Min('value'),
+            max_value=Max('value'),
+            mean_value=Avg('value'),
+            sum_squares=Sum(F('value') * F('value')),
+        ).order_by()
+        ClimateDataRollup.objects.bulk_create(
+            (ClimateDataRollup(resolution=resolution, **row) for row in rows.iterator()),
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0002_climateuser_datasource_systemmetrics_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateDataRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_type', models.CharField(choices=[('temperature', 'Temperature'), ('humidity', 'Humidity'), ('pressure', 'Atmospheric Pressure'), ('wind_speed', 'Wind Speed'), ('wind_direction', 'Wind Direction'), ('precipitation', 'Precipitation'), ('co2_level', 'CO2 Concentration'), ('ozone_level', 'Ozone Level'), ('sea_level', 'Sea Level'), ('ice_coverage', 'Ice Coverage')], max_length=20)),
+                ('resolution', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('min_value', models.FloatField()),
+                ('max_value', models.FloatField()),
+                ('mean_value', models.FloatField()),
+                ('sum_squares', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('data_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='educationmodel.datasource')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolution', 'data_type', 'bucket'], name='educationmo_resolut_e42720_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='climatedatarollup',
+            constraint=models.UniqueConstraint(fields=('resolution', 'data_source', 'data_type', 'bucket'), name='unique_rollup_bucket'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0003_climatedatarollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='climatedata',
+            index=models.Index(fields=['processed', 'data_source', 'data_type', 'timestamp'], name='educationmo_process_4f0a9f_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0004_climatedata_processed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalySeriesState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_type', models.CharField(choices=[('temperature', 'Temperature'), ('humidity', 'Humidity'), ('pressure', 'Atmospheric Pressure'), ('wind_speed', 'Wind Speed'), ('wind_direction', 'Wind Direction'), ('precipitation', 'Precipitation'), ('co2_level', 'CO2 Concentration'), ('ozone_level', 'Ozone Level'), ('sea_level', 'Sea Level'), ('ice_coverage', 'Ice Coverage')], max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('mean', models.FloatField(default=0.0)),
+                ('m2', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('data_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='educationmodel.datasource')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='anomalyseriesstate',
+            constraint=models.UniqueConstraint(fields=('data_source', 'data_type'), name='unique_anomaly_series_state'),
+        ),
+    ]
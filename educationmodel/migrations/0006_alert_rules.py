@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0005_anomalyseriesstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertEvaluatorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='default', max_length=50, unique=True)),
+                ('last_created_at', models.DateTimeField(blank=True, null=True)),
+                ('last_id', models.UUIDField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('data_type', models.CharField(choices=[('temperature', 'Temperature'), ('humidity', 'Humidity'), ('pressure', 'Atmospheric Pressure'), ('wind_speed', 'Wind Speed'), ('wind_direction', 'Wind Direction'), ('precipitation', 'Precipitation'), ('co2_level', 'CO2 Concentration'), ('ozone_level', 'Ozone Level'), ('sea_level', 'Sea Level'), ('ice_coverage', 'Ice Coverage')], max_length=20)),
+                ('rule_type', models.CharField(choices=[('threshold', 'Threshold'), ('rate_of_change', 'Rate of Change (per hour)')], default='threshold', max_length=20)),
+                ('operator', models.CharField(choices=[('above', 'Above'), ('below', 'Below')], default='above', max_length=10)),
+                ('threshold', models.FloatField()),
+                ('alert_type', models.CharField(choices=[('temperature_anomaly', 'Temperature Anomaly'), ('extreme_weather', 'Extreme Weather Event'), ('air_quality', 'Air Quality Alert'), ('sea_level_rise', 'Sea Level Rise'), ('system_failure', 'System/Sensor Failure')], max_length=30)),
+                ('severity', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('critical', 'Critical')], default='medium', max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='climatedata',
+            index=models.Index(fields=['created_at', 'id'], name='educationmo_created_f5a229_idx'),
+        ),
+        migrations.AddField(
+            model_name='alertrule',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='alertrule',
+            name='data_source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='educationmodel.datasource'),
+        ),
+        migrations.AddField(
+            model_name='climatealert',
+            name='rule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alerts', to='educationmodel.alertrule'),
+        ),
+    ]
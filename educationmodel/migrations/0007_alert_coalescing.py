@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0006_alert_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='climatealert',
+            name='first_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='climatealert',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='climatealert',
+            name='occurrence_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='climatealert',
+            name='peak_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='climatealert',
+            index=models.Index(fields=['is_active', 'last_seen_at'], name='educationmo_is_acti_f4fc29_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0007_alert_coalescing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='climatealert',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='climatealert',
+            index=models.Index(fields=['updated_at'], name='educationmo_updated_94baea_idx'),
+        ),
+    ]
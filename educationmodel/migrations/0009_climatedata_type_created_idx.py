@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0008_alert_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='climatedata',
+            index=models.Index(fields=['data_type', 'created_at'], name='educationmo_data_ty_4bfe87_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0009_climatedata_type_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateDataPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('table_name', models.CharField(max_length=63, unique=True)),
+                ('row_count', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+    ]
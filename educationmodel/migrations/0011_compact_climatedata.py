@@ -0,0 +1,199 @@
+"""
+Rebuild ClimateData with the compact schema.
+
+Rows are copied in insert order into a new table with an integer key,
+coded data_type, MeasurementUnit ids and epoch-microsecond timestamps,
+which then replaces the old one. Archived monthly partitions are folded
+back into the live table (their old tables are dropped); run
+``manage.py partition_climate_data`` afterwards to re-partition them in the
+new format. The alert evaluator's watermark is carried over to the new ids.
+
+Migrating back to 0010 copies every reading into a table with the old
+schema, decoding data_type and unit to text and giving rows new UUIDs.
+Partitions are not recreated: everything comes back in the live table.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+import educationmodel.fields
+
+DATA_TYPES = [
+    ('temperature', 'Temperature'),
+    ('humidity', 'Humidity'),
+    ('pressure', 'Atmospheric Pressure'),
+    ('wind_speed', 'Wind Speed'),
+    ('wind_direction', 'Wind Direction'),
+    ('precipitation', 'Precipitation'),
+    ('co2_level', 'CO2 Concentration'),
+    ('ozone_level', 'Ozone Level'),
+    ('sea_level', 'Sea Level'),
+    ('ice_coverage', 'Ice Coverage'),
+]
+
+OLD_TABLE = 'educationmodel_climatedata'
+NEW_TABLE = 'educationmodel_climatedatacompact'
+COPY_CHUNK_SIZE = 5000
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def epoch_micros(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+def check_data_types(cursor, quote, tables, codes):
+    unknown = set()
+    for table in tables:
+        cursor.execute(f"SELECT DISTINCT data_type FROM {quote(table)}")
+        unknown.update(data_type for data_type, in cursor.fetchall() if data_type not in codes)
+    if unknown:
+        raise ValueError(
+            f"Readings have unknown data_type values {sorted(unknown)}; "
+            f"fix or delete them before migrating (valid: {sorted(codes)})"
+        )
+
+
+def copy_readings(apps, schema_editor):
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    MeasurementUnit = apps.get_model('educationmodel', 'MeasurementUnit')
+    ClimateDataPartition = apps.get_model('educationmodel', 'ClimateDataPartition')
+
+    codes = {value: code for code, (value, _) in enumerate(DATA_TYPES, start=1)}
+    units = {}
+    columns = 'data_source_id, data_type, value, unit, timestamp, quality_score, is_anomaly, processed, created_at'
+    partitions = list(ClimateDataPartition.objects.order_by('month').values_list('table_name', flat=True))
+
+    with connection.cursor() as reader, connection.cursor() as writer:
+        # Checked up front so a bad row cannot stop the copy halfway
+        check_data_types(reader, quote, partitions + [OLD_TABLE], codes)
+        for table in partitions + [OLD_TABLE]:
+            reader.execute(f"SELECT {columns} FROM {quote(table)} ORDER BY created_at")
+            while rows := reader.fetchmany(COPY_CHUNK_SIZE):
+                converted = []
+                for source_id, data_type, value, unit, timestamp, quality, anomaly, processed, created_at in rows:
+                    if unit not in units:
+                        units[unit] = MeasurementUnit.objects.get_or_create(symbol=unit)[0].pk
+                    converted.append((
+                        source_id, codes[data_type], value, units[unit], epoch_micros(timestamp),
+                        quality, anomaly, processed, epoch_micros(created_at),
+                    ))
+                writer.executemany(
+                    f"INSERT INTO {quote(NEW_TABLE)} ({columns}) VALUES ({', '.join(['%s'] * 9)})", converted,
+                )
+
+        for table in partitions:
+            writer.execute(f"DROP TABLE {quote(table)}")
+    ClimateDataPartition.objects.all().delete()
+
+
+def restore_readings(apps, schema_editor):
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    ClimateData = apps.get_model('educationmodel', 'ClimateData')
+    MeasurementUnit = apps.get_model('educationmodel', 'MeasurementUnit')
+    AlertEvaluatorState = apps.get_model('educationmodel', 'AlertEvaluatorState')
+
+    data_types = {code: value for code, (value, _) in enumerate(DATA_TYPES, start=1)}
+    units = dict(MeasurementUnit.objects.values_list('pk', 'symbol'))
+    names = [
+        'id', 'data_source_id', 'data_type', 'value', 'unit', 'timestamp',
+        'quality_score', 'is_anomaly', 'processed', 'created_at',
+    ]
+    fields = [ClimateData._meta.get_field(name) for name in names]
+    columns = ', '.join(quote(field.column) for field in fields)
+
+    with connection.cursor() as reader, connection.cursor() as writer:
+        reader.execute(f"SELECT {', '.join(names[1:])} FROM {quote(NEW_TABLE)} ORDER BY created_at, id")
+        while rows := reader.fetchmany(COPY_CHUNK_SIZE):
+            converted = []
+            for source_id, code, value, unit, timestamp, quality, anomaly, processed, created_at in rows:
+                row = (
+                    uuid.uuid4(), source_id, data_types[code], value, units[unit], from_epoch_micros(timestamp),
+                    quality, anomaly, processed, from_epoch_micros(created_at),
+                )
+                converted.append([field.get_db_prep_value(item, connection) for field, item in zip(fields, row)])
+            writer.executemany(
+                f"INSERT INTO {quote(OLD_TABLE)} ({columns}) VALUES ({', '.join(['%s'] * len(names))})", converted,
+            )
+
+    # Same rule as carry_watermark: the last row created at the watermark time
+    for state in AlertEvaluatorState.objects.exclude(last_created_at=None):
+        state.last_id = ClimateData.objects.filter(created_at=state.last_created_at).aggregate(last=Max('id'))['last']
+        state.save(update_fields=['last_id'])
+
+
+def carry_watermark(apps, schema_editor):
+    AlertEvaluatorState = apps.get_model('educationmodel', 'AlertEvaluatorState')
+    with schema_editor.connection.cursor() as cursor:
+        for state in AlertEvaluatorState.objects.exclude(last_created_at=None):
+            cursor.execute(
+                f"SELECT MAX(id) FROM {OLD_TABLE} WHERE created_at = %s", [epoch_micros(state.last_created_at)],
+            )
+            state.last_id = cursor.fetchone()[0]
+            state.save(update_fields=['last_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0010_climatedatapartition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurementUnit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClimateDataCompact',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('data_type', educationmodel.fields.ChoiceCodeField(choices=DATA_TYPES)),
+                ('value', models.FloatField()),
+                ('unit', educationmodel.fields.UnitField()),
+                ('timestamp', educationmodel.fields.EpochDateTimeField()),
+                ('quality_score', models.FloatField(default=1.0)),
+                ('is_anomaly', models.BooleanField(default=False)),
+                ('processed', models.BooleanField(default=False)),
+                ('created_at', educationmodel.fields.EpochDateTimeField(auto_now_add=True)),
+                ('data_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='educationmodel.datasource')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['data_source', 'timestamp'], name='climatedata_source_ts_idx'),
+                    models.Index(fields=['data_type', 'timestamp'], name='climatedata_type_ts_idx'),
+                    models.Index(fields=['is_anomaly'], name='climatedata_anomaly_idx'),
+                    models.Index(fields=['processed', 'data_source', 'data_type', 'timestamp'], name='climatedata_processed_idx'),
+                    models.Index(fields=['created_at', 'id'], name='climatedata_created_idx'),
+                    models.Index(fields=['data_type', 'created_at'], name='climatedata_type_created_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(copy_readings, restore_readings),
+        migrations.DeleteModel(name='ClimateData'),
+        migrations.RenameModel(old_name='ClimateDataCompact', new_name='ClimateData'),
+        migrations.RemoveField(model_name='alertevaluatorstate', name='last_id'),
+        migrations.AddField(
+            model_name='alertevaluatorstate',
+            name='last_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(carry_watermark, migrations.RunPython.noop),
+    ]
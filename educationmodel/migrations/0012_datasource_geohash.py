@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(lat, lon, precision=12):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, code, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, value = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        code <<= 1
+        if value >= middle:
+            code |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[code])
+            bits, code = 0, 0
+    return ''.join(chars)
+
+
+def fill_geohashes(apps, schema_editor):
+    DataSource = apps.get_model('educationmodel', 'DataSource')
+    sources = list(DataSource.objects.only('location_lat', 'location_lon'))
+    for source in sources:
+        source.geohash = encode_geohash(source.location_lat, source.location_lon)
+    DataSource.objects.bulk_update(sources, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0011_compact_climatedata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0012_datasource_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RasterScene',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('data_type', models.CharField(choices=[('temperature', 'Temperature'), ('humidity', 'Humidity'), ('pressure', 'Atmospheric Pressure'), ('wind_speed', 'Wind Speed'), ('wind_direction', 'Wind Direction'), ('precipitation', 'Precipitation'), ('co2_level', 'CO2 Concentration'), ('ozone_level', 'Ozone Level'), ('sea_level', 'Sea Level'), ('ice_coverage', 'Ice Coverage')], max_length=20)),
+                ('unit', models.CharField(blank=True, max_length=50)),
+                ('timestamp', models.DateTimeField()),
+                ('south', models.FloatField()),
+                ('west', models.FloatField()),
+                ('north', models.FloatField()),
+                ('east', models.FloatField()),
+                ('rows', models.PositiveIntegerField()),
+                ('columns', models.PositiveIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('file_path', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('data_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='educationmodel.datasource')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['data_type', 'timestamp'], name='educationmo_data_ty_55fcad_idx'), models.Index(fields=['data_source', 'timestamp'], name='educationmo_data_so_7aa7b3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('educationmodel', '0013_rasterscene'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateDataChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_type', models.CharField(choices=[('temperature', 'Temperature'), ('humidity', 'Humidity'), ('pressure', 'Atmospheric Pressure'), ('wind_speed', 'Wind Speed'), ('wind_direction', 'Wind Direction'), ('precipitation', 'Precipitation'), ('co2_level', 'CO2 Concentration'), ('ozone_level', 'Ozone Level'), ('sea_level', 'Sea Level'), ('ice_coverage', 'Ice Coverage')], max_length=20)),
+                ('day', models.DateField()),
+                ('unit', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField()),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('id_data', models.BinaryField()),
+                ('timestamp_data', models.BinaryField()),
+                ('created_data', models.BinaryField()),
+                ('value_data', models.BinaryField()),
+                ('quality_data', models.BinaryField()),
+                ('flag_data', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('data_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='educationmodel.datasource')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['data_type', 'day'], name='educationmo_data_ty_477781_idx'), models.Index(fields=['day'], name='educationmo_day_2fcc30_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='climatedatachunk',
+            constraint=models.UniqueConstraint(fields=('data_source', 'data_type', 'day'), name='unique_chunk_day'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 import uuid
 
+from .fields import ChoiceCodeField, EpochDateTimeField, UnitField
+
 # User Roles
 class UserRole(models.TextChoices):
     ADMINISTRATOR = 'admin', 'Administrator'
@@ -42,7 +44,17 @@ class ClimateUser(AbstractUser):
     def has_analyst_access(self):
         return self.role in [UserRole.ADMINISTRATOR, UserRole.ANALYST]
 
+    def visible_alert_severities(self):
+        """Alert severities this user may see, or None for all of them"""
+        if self.has_admin_access():
+            return None
+        if self.has_analyst_access():
+            return ['low', 'medium', 'high']
+        return ['low', 'medium']
+
 # Climate Data Sources
+# geohash is kept in step with the location by a pre_save signal and backs
+# the spatial lookups in educationmodel.spatial
 class DataSource(models.Model):
     SOURCE_TYPES = [
         ('satellite', 'Satellite Imagery'),
@@ -57,6 +69,7 @@ class DataSource(models.Model):
     source_type = models.CharField(max_length=20, choices=SOURCE_TYPES)
     location_lat = models.FloatField()
     location_lon = models.FloatField()
+    geohash = models.CharField(max_length=12, blank=True, editable=False, db_index=True)
     altitude = models.FloatField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     installation_date = models.DateTimeField()
@@ -66,7 +79,17 @@ class DataSource(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_source_type_display()})"
 
+# Units of measurement, stored once and referenced by ClimateData.unit
+class MeasurementUnit(models.Model):
+    symbol = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.symbol
+
 # Climate Data Records
+# Stored compactly: integer key, data_type as a small code (append new
+# DATA_TYPES at the end only), unit via MeasurementUnit and timestamps as
+# epoch microseconds. Attributes and filters still take strings/datetimes.
 class ClimateData(models.Model):
     DATA_TYPES = [
         ('temperature', 'Temperature'),
@@ -81,26 +104,175 @@ class ClimateData(models.Model):
         ('ice_coverage', 'Ice Coverage'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.BigAutoField(primary_key=True)
     data_source = models.ForeignKey(DataSource, on_delete=models.CASCADE)
-    data_type = models.CharField(max_length=20, choices=DATA_TYPES)
+    data_type = ChoiceCodeField(choices=DATA_TYPES)
     value = models.FloatField()
-    unit = models.CharField(max_length=50)
-    timestamp = models.DateTimeField()
+    unit = UnitField()
+    timestamp = EpochDateTimeField()
     quality_score = models.FloatField(default=1.0)  # 0.0 to 1.0
     is_anomaly = models.BooleanField(default=False)
     processed = models.BooleanField(default=False)
+    created_at = EpochDateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_source', 'timestamp'], name='climatedata_source_ts_idx'),
+            models.Index(fields=['data_type', 'timestamp'], name='climatedata_type_ts_idx'),
+            models.Index(fields=['is_anomaly'], name='climatedata_anomaly_idx'),
+            models.Index(fields=['processed', 'data_source', 'data_type', 'timestamp'], name='climatedata_processed_idx'),
+            models.Index(fields=['created_at', 'id'], name='climatedata_created_idx'),
+            models.Index(fields=['data_type', 'created_at'], name='climatedata_type_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.data_type}: {self.value} {self.unit} at {self.timestamp}"
+
+# Monthly ClimateData partition tables moved out of the live table
+class ClimateDataPartition(models.Model):
+    month = models.DateField(unique=True)  # First day of the month (UTC)
+    table_name = models.CharField(max_length=63, unique=True)
+    row_count = models.BigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['month']
+
+    def __str__(self):
+        return f"{self.table_name} ({self.row_count} readings)"
+
+# One UTC day of sealed ClimateData readings for a source and data type,
+# stored as compressed columns; see educationmodel.chunks
+class ClimateDataChunk(models.Model):
+    data_source = models.ForeignKey(DataSource, on_delete=models.CASCADE)
+    data_type = models.CharField(max_length=20, choices=ClimateData.DATA_TYPES)
+    day = models.DateField()  # UTC day of the readings
+    unit = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField()
+    start = models.DateTimeField()  # First reading timestamp
+    end = models.DateTimeField()  # Last reading timestamp
+    id_data = models.BinaryField()
+    timestamp_data = models.BinaryField()
+    created_data = models.BinaryField()
+    value_data = models.BinaryField()
+    quality_data = models.BinaryField()
+    flag_data = models.BinaryField()  # is_anomaly and processed bits
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['data_source', 'data_type', 'day'], name='unique_chunk_day'),
+        ]
+        indexes = [
+            models.Index(fields=['data_type', 'day']),
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.data_type} of {self.data_source_id} on {self.day} ({self.count} readings)"
+
+# Pre-aggregated ClimateData statistics per source, type and time bucket
+class ClimateDataRollup(models.Model):
+    RESOLUTIONS = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    data_source = models.ForeignKey(DataSource, on_delete=models.CASCADE)
+    data_type = models.CharField(max_length=20, choices=ClimateData.DATA_TYPES)
+    resolution = models.CharField(max_length=4, choices=RESOLUTIONS)
+    bucket = models.DateTimeField()  # Start of the hour/day (UTC)
+    count = models.IntegerField(default=0)
+    min_value = models.FloatField()
+    max_value = models.FloatField()
+    mean_value = models.FloatField()
+    sum_squares = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['resolution', 'data_source', 'data_type', 'bucket'],
+                name='unique_rollup_bucket',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'data_type', 'bucket']),
+        ]
+
+    @property
+    def std_dev(self):
+        if not self.count:
+            return 0.0
+        variance = self.sum_squares / self.count - self.mean_value ** 2
+        return max(variance, 0.0) ** 0.5
+
+    def __str__(self):
+        return f"{self.data_type} {self.resolution} rollup at {self.bucket}"
+
+# A block of min/max pyramid buckets for one data type and zoom level;
+# see educationmodel.pyramid
+class ChartPyramidTile(models.Model):
+    data_type = models.CharField(max_length=20, choices=ClimateData.DATA_TYPES)
+    level = models.PositiveSmallIntegerField()  # Buckets span 2**level hours
+    index = models.BigIntegerField()  # Tile number counted from the epoch
+    data = models.BinaryField()  # float64 count, min, max and sum rows
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['data_type', 'level', 'index'], name='unique_pyramid_tile'),
+        ]
+
+    def __str__(self):
+        return f"{self.data_type} pyramid tile {self.index} at level {self.level}"
+
+# Running statistics per series for streaming anomaly scoring (Welford)
+class AnomalySeriesState(models.Model):
+    data_source = models.ForeignKey(DataSource, on_delete=models.CASCADE)
+    data_type = models.CharField(max_length=20, choices=ClimateData.DATA_TYPES)
+    count = models.BigIntegerField(default=0)
+    mean = models.FloatField(default=0.0)
+    m2 = models.FloatField(default=0.0)  # Sum of squared deviations from the mean
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['data_source', 'data_type'], name='unique_anomaly_series_state'),
+        ]
+
+    def __str__(self):
+        return f"{self.data_type} state for {self.data_source_id} (n={self.count})"
+
+# One gridded field (e.g. a satellite scene) stored as a tiled, memory-mapped
+# .npy file under RASTER_DIR; see educationmodel.rasters. Pixels form a
+# regular lat/lon grid over the extent, row 0 at the north edge.
+class RasterScene(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    data_source = models.ForeignKey(DataSource, on_delete=models.CASCADE)
+    data_type = models.CharField(max_length=20, choices=ClimateData.DATA_TYPES)
+    unit = models.CharField(max_length=50, blank=True)
+    timestamp = models.DateTimeField()  # Acquisition time
+    south = models.FloatField()
+    west = models.FloatField()
+    north = models.FloatField()
+    east = models.FloatField()
+    rows = models.PositiveIntegerField()
+    columns = models.PositiveIntegerField()
+    chunk_size = models.PositiveIntegerField()  # Tile edge in pixels
+    file_path = models.CharField(max_length=255, unique=True)  # Relative to RASTER_DIR
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['data_source', 'timestamp']),
             models.Index(fields=['data_type', 'timestamp']),
-            models.Index(fields=['is_anomaly']),
+            models.Index(fields=['data_source', 'timestamp']),
         ]
 
     def __str__(self):
-        return f"{self.data_type}: {self.value} {self.unit} at {self.timestamp}"
+        return f"{self.get_data_type_display()} scene from {self.data_source.name} at {self.timestamp}"
 
 # Climate Alerts and Notifications
 class ClimateAlert(models.Model):
@@ -130,15 +302,68 @@ class ClimateAlert(models.Model):
     is_active = models.BooleanField(default=True)
     acknowledged_by = models.ForeignKey(ClimateUser, on_delete=models.SET_NULL, null=True, blank=True)
     acknowledged_at = models.DateTimeField(null=True, blank=True)
+    rule = models.ForeignKey('AlertRule', on_delete=models.SET_NULL, null=True, blank=True, related_name='alerts')
+    # Repeats of the same alert within ALERT_COALESCE_WINDOW are merged into one row
+    occurrence_count = models.PositiveIntegerField(default=1)
+    first_seen_at = models.DateTimeField(null=True, blank=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    peak_value = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'last_seen_at']),
+            models.Index(fields=['updated_at']),
+        ]
 
     def __str__(self):
         return f"{self.get_severity_display()} Alert: {self.title}"
 
+# Threshold / rate-of-change rules checked against new readings
+class AlertRule(models.Model):
+    RULE_TYPES = [
+        ('threshold', 'Threshold'),
+        ('rate_of_change', 'Rate of Change (per hour)'),
+    ]
+
+    OPERATORS = [
+        ('above', 'Above'),
+        ('below', 'Below'),
+    ]
+
+    name = models.CharField(max_length=200)
+    data_type = models.CharField(max_length=20, choices=ClimateData.DATA_TYPES)
+    data_source = models.ForeignKey(DataSource, on_delete=models.CASCADE, null=True, blank=True)  # Empty = every source
+    rule_type = models.CharField(max_length=20, choices=RULE_TYPES, default='threshold')
+    operator = models.CharField(max_length=10, choices=OPERATORS, default='above')
+    threshold = models.FloatField()
+    alert_type = models.CharField(max_length=30, choices=ClimateAlert.ALERT_TYPES)
+    severity = models.CharField(max_length=10, choices=ClimateAlert.SEVERITY_LEVELS, default='medium')
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(ClimateUser, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def matches(self, measured):
+        if self.operator == 'above':
+            return measured > self.threshold
+        return measured < self.threshold
+
+    def __str__(self):
+        return f"{self.name} ({self.data_type} {self.get_rule_type_display()} {self.operator} {self.threshold})"
+
+# Position of the alert evaluator in the ClimateData insert stream
+class AlertEvaluatorState(models.Model):
+    name = models.CharField(max_length=50, unique=True, default='default')
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_id = models.BigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Alert evaluator '{self.name}' at {self.last_created_at}"
+
 # Machine Learning Models Registry
 class MLModel(models.Model):
     MODEL_TYPES = [
@@ -0,0 +1,195 @@
+"""
+Several chart series fetched together on one shared time axis.
+
+Each requested series is a data_type, optionally limited to one data
+source. All series are read together: with a single query over the
+rollups for hour or day resolution, or otherwise over raw readings, one
+query per overlapping partition plus any sealed chunks and cold archive
+files. Rows stream through, and each row is routed to every series it
+belongs to. A reading from source S counts towards both "temperature at
+S" and "temperature".
+The rows are then reduced with NumPy onto a common axis. That axis is the
+distinct timestamps when there are at most ``max_points`` of them, and
+otherwise ``max_points`` equal-width bins across the window. Every returned
+array therefore lines up index for index.
+"""
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from django.db.models import Q
+
+from .chunks import sealed_readings
+from .models import ClimateDataRollup
+from .partitions import readings
+from .retention import archived_readings, source_uuids
+from .rollups import bucket_start
+
+# Rows fetched per database round trip
+BATCH_CHUNK_SIZE = 5000
+
+# Series accepted in one request
+MAX_BATCH_SERIES = 12
+
+
+def parse_series(specs, valid_types):
+    """Turn ``data_type`` / ``data_type:source_id`` strings into (data_type, source_id) pairs"""
+    series = []
+    for spec in specs:
+        data_type, _, source = spec.partition(':')
+        if data_type not in valid_types:
+            raise ValueError(f"Unknown data_type: {data_type!r}")
+        try:
+            source_id = uuid.UUID(source) if source else None
+        except ValueError:
+            raise ValueError(f"Invalid source id: {source!r}")
+        if (data_type, source_id) not in series:
+            series.append((data_type, source_id))
+    if not series:
+        raise ValueError("At least one series is required")
+    if len(series) > MAX_BATCH_SERIES:
+        raise ValueError(f"At most {MAX_BATCH_SERIES} series per request")
+    return series
+
+
+def series_filter(series):
+    condition = Q()
+    for data_type, source_id in series:
+        if source_id is None:
+            condition |= Q(data_type=data_type)
+        else:
+            condition |= Q(data_type=data_type, data_source_id=source_id)
+    return condition
+
+
+def route_rows(series, rows):
+    """
+    Expand (data_type, source_id, seconds, total, count, low, high) rows into
+    flat per-series arrays.
+    """
+    routes = defaultdict(list)
+    for index, (data_type, source_id) in enumerate(series):
+        routes[(data_type, source_id)].append(index)
+
+    targets = {}
+    indices, seconds, totals, counts, lows, highs = [], [], [], [], [], []
+    for data_type, source_id, at, total, count, low, high in rows:
+        key = (data_type, source_id)
+        if key not in targets:
+            targets[key] = routes.get(key, []) + routes.get((data_type, None), [])
+        for index in targets[key]:
+            indices.append(index)
+            seconds.append(at)
+            totals.append(total)
+            counts.append(count)
+            lows.append(low)
+            highs.append(high)
+
+    return (
+        np.array(indices, dtype=np.int64),
+        np.array(seconds, dtype=np.float64),
+        np.array(totals, dtype=np.float64),
+        np.array(counts, dtype=np.float64),
+        np.array(lows, dtype=np.float64),
+        np.array(highs, dtype=np.float64),
+    )
+
+
+def fetch_rollup_rows(series, start, end, resolution):
+    rows = ClimateDataRollup.objects.filter(
+        series_filter(series),
+        resolution=resolution,
+        bucket__gte=bucket_start(start, resolution),
+        bucket__lte=end,
+    ).values_list(
+        'data_type', 'data_source_id', 'bucket', 'mean_value', 'count', 'min_value', 'max_value',
+    ).iterator(chunk_size=BATCH_CHUNK_SIZE)
+    for data_type, source_id, bucket, mean, count, low, high in rows:
+        yield data_type, source_id, bucket.timestamp(), mean * count, count, low, high
+
+
+def fetch_archived_rows(series, start, end):
+    """Raw rows of the series that retention has moved to the cold archive"""
+    archived = archived_readings(
+        start, end, data_types={data_type for data_type, _ in series}, names=('data_type', 'data_source_id', 'value'),
+    )
+    rows = zip(
+        archived['data_type'].tolist(), source_uuids(archived['data_source_id']),
+        archived['timestamp'].tolist(), archived['value'].tolist(),
+    )
+    for data_type, source_id, seconds, value in rows:
+        yield data_type, source_id, seconds, value, 1, value, value
+
+
+def fetch_sealed_rows(series, start, end):
+    """Raw rows of the series from sealed chunks"""
+    sealed = sealed_readings(start, end, series_filter(series), names=('data_type', 'data_source_id', 'value'))
+    rows = zip(
+        sealed['data_type'].tolist(), source_uuids(sealed['data_source_id']),
+        sealed['timestamp'].tolist(), sealed['value'].tolist(),
+    )
+    for data_type, source_id, seconds, value in rows:
+        yield data_type, source_id, seconds, value, 1, value, value
+
+
+def fetch_raw_rows(series, start, end):
+    yield from fetch_archived_rows(series, start, end)
+    yield from fetch_sealed_rows(series, start, end)
+    rows = readings().filter(
+        series_filter(series),
+        timestamp__range=[start, end],
+    ).values_list(
+        'data_type', 'data_source_id', 'timestamp', 'value',
+    ).iterator(chunk_size=BATCH_CHUNK_SIZE)
+    for data_type, source_id, timestamp, value in rows:
+        yield data_type, source_id, timestamp.timestamp(), value, 1, value, value
+
+
+def align(series_count, indices, seconds, totals, counts, lows, highs, start, end, max_points):
+    """Reduce routed rows onto a shared axis; returns (axis, mean, low, high, count) arrays"""
+    distinct = np.unique(seconds)
+    if len(distinct) <= max_points:
+        axis = distinct
+        positions = np.searchsorted(axis, seconds)
+    else:
+        width = (end - start) / max_points
+        axis = start + np.arange(max_points) * width
+        positions = np.clip(((seconds - start) // width).astype(np.int64), 0, max_points - 1)
+
+    size = series_count * len(axis)
+    flat = indices * len(axis) + positions
+    total = np.bincount(flat, weights=totals, minlength=size)
+    count = np.bincount(flat, weights=counts, minlength=size)
+    low = np.full(size, np.inf)
+    high = np.full(size, -np.inf)
+    np.minimum.at(low, flat, lows)
+    np.maximum.at(high, flat, highs)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+    low[count == 0] = np.nan
+    high[count == 0] = np.nan
+
+    shape = (series_count, len(axis))
+    return axis, mean.reshape(shape), low.reshape(shape), high.reshape(shape), count.reshape(shape)
+
+
+def batch_series(series, start, end, resolution, max_points):
+    """
+    Aligned statistics for several (data_type, source_id) series.
+
+    ``resolution`` is 'hour', 'day' or None for raw readings. Returns a dict
+    with the shared ``axis`` (epoch seconds) and ``mean``/``low``/``high``/
+    ``count`` matrices of shape (len(series), len(axis)), NaN where a series
+    has no data.
+    """
+    if resolution:
+        rows = fetch_rollup_rows(series, start, end, resolution)
+    else:
+        rows = fetch_raw_rows(series, start, end)
+
+    routed = route_rows(series, rows)
+    axis, mean, low, high, count = align(
+        len(series), *routed, start.timestamp(), end.timestamp(), max_points,
+    )
+    return {'axis': axis, 'mean': mean, 'low': low, 'high': high, 'count': count}
@@ -0,0 +1,116 @@
+"""
+Keyset (cursor) pagination for time-ordered querysets.
+
+Pages are ordered newest first on (timestamp, id) and addressed by an
+opaque cursor holding the boundary row's key, so fetching any page is a
+single indexed range scan of ``per_page + 1`` rows. There is no COUNT(*)
+and no OFFSET, which keeps deep pages and "Last" as cheap as the first.
+
+Delta ("since") cursors used by the polling APIs hold the write time up to
+which a client is current, plus the series resolution it was served.
+"""
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(row):
+    raw = f"{row.timestamp.isoformat()}|{row.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, id)`` from a cursor, raising ValueError if invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.split('|')
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    timestamp = parse_datetime(timestamp)
+    if timestamp is None:
+        raise ValueError("Invalid cursor")
+    return timestamp, pk
+
+
+def encode_since_cursor(moment, resolution='raw'):
+    raw = f"{resolution}|{moment.isoformat()}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_since_cursor(cursor):
+    """Return ``(moment, resolution)`` from a delta cursor, raising ValueError if invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        resolution, moment = raw.split('|')
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    moment = parse_datetime(moment)
+    if moment is None:
+        raise ValueError("Invalid cursor")
+    return moment, resolution
+
+
+class KeysetPage:
+    """One page of rows plus the cursors needed to move around"""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.has_next_page else ''
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.has_previous_page else ''
+
+
+def keyset_page(queryset, per_page, after=None, before=None, last=False):
+    """
+    Fetch one page of ``queryset`` ordered by (-timestamp, -id).
+
+    ``after`` returns the page following that cursor, ``before`` the page
+    preceding it and ``last`` the oldest page. Invalid cursors fall back to
+    the first page.
+    """
+    try:
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+    except ValueError:
+        after = before = None
+
+    if before or last:
+        # Walk backwards in ascending order, then flip for display
+        if before:
+            timestamp, pk = before
+            queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+        rows = list(queryset.order_by('timestamp', 'id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, has_next=bool(before), has_previous=has_more)
+
+    if after:
+        timestamp, pk = after
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+    rows = list(queryset.order_by('-timestamp', '-id')[:per_page + 1])
+    has_more = len(rows) > per_page
+    return KeysetPage(rows[:per_page], has_next=has_more, has_previous=bool(after))
@@ -0,0 +1,374 @@
+"""
+Monthly time partitioning of ClimateData.
+
+Recent readings live in the ClimateData table itself, the live partition.
+Once a month falls outside PARTITION_LIVE_MONTHS, ``archive_month`` moves
+its rows into a table of its own (educationmodel_climatedata_YYYYMM),
+recorded in ClimateDataPartition. Everything before the end of the newest
+archived month (the archive horizon) is therefore in monthly tables and
+everything after it in the live table, so partitions never overlap in time.
+
+Reads go through ``readings()``, a queryset-like router over all
+partitions. Filters on ``timestamp`` drop the partitions that cannot match
+before any SQL runs. Results ordered by timestamp come out partition by
+partition, and a slice stops at the first partition that fills it.
+Ingestion sends readings older than the horizon straight to their
+partition. Alerting, streaming scoring and the live feed follow inserts
+into the live table, so they only ever see current data. Retention
+(see retention.py) removes fully expired months by dropping whole
+partition tables.
+
+Partitions are plain tables in the main database rather than attached
+SQLite files, so archived rows stay reachable through the ORM, share its
+transactions and join with DataSource.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import F, Max, Min, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ClimateData, ClimateDataChunk, ClimateDataPartition
+
+logger = logging.getLogger(__name__)
+
+PARTITION_TABLE_PREFIX = f"{ClimateData._meta.db_table}_"
+
+# Indexes built on every partition; archives are read by time range only
+PARTITION_INDEXES = {
+    'source': ['data_source', 'timestamp'],
+    'type': ['data_type', 'timestamp'],
+    'anomaly': ['is_anomaly'],
+}
+
+# Partition models built so far in this process, by table name
+_partition_models = {}
+
+
+def get_live_months():
+    return settings.CLIMATE_DATA_SETTINGS.get('PARTITION_LIVE_MONTHS', 3)
+
+
+def month_start(moment):
+    """First day of the UTC month containing an aware datetime"""
+    moment = moment.astimezone(dt_timezone.utc)
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Aware ``[start, end)`` datetimes of a month"""
+    start = datetime.combine(month, time.min, tzinfo=dt_timezone.utc)
+    end = datetime.combine(add_months(month, 1), time.min, tzinfo=dt_timezone.utc)
+    return start, end
+
+
+def partition_table(month):
+    return f"{PARTITION_TABLE_PREFIX}{month:%Y%m}"
+
+
+def partition_model(month):
+    """Unmanaged model over one month's partition table, built once per process"""
+    table = partition_table(month)
+    if table not in _partition_models:
+        suffix = f"{month:%Y%m}"
+        attrs = {
+            '__module__': __name__,
+            '__str__': ClimateData.__str__,
+            'DATA_TYPES': ClimateData.DATA_TYPES,
+        }
+        for field in ClimateData._meta.local_fields:
+            name, _, args, kwargs = field.deconstruct()
+            if field.is_relation:
+                # No reverse accessor or cascade per partition;
+                # delete_source_readings clears archived rows instead
+                kwargs.update(related_name='+', on_delete=models.DO_NOTHING, db_constraint=False)
+            attrs[name] = field.__class__(*args, **kwargs)
+        attrs['Meta'] = type('Meta', (), {
+            'app_label': ClimateData._meta.app_label,
+            'db_table': table,
+            'managed': False,
+            'default_permissions': (),
+            'indexes': [
+                models.Index(fields=fields, name=f"climatedata_{suffix}_{label}")
+                for label, fields in PARTITION_INDEXES.items()
+            ],
+        })
+        _partition_models[table] = type(f"ClimateData{suffix}", (models.Model,), attrs)
+    return _partition_models[table]
+
+
+def ensure_partition(month):
+    """
+    Create a month's partition table and registry row if missing.
+
+    SQLite cannot change its schema inside a transaction, so call this
+    outside ``transaction.atomic``.
+    """
+    model = partition_model(month)
+    if model._meta.db_table not in connection.introspection.table_names():
+        with connection.schema_editor() as editor:
+            editor.create_model(model)
+        logger.info(f"Created climate data partition {model._meta.db_table}")
+    ClimateDataPartition.objects.get_or_create(
+        month=month, defaults={'table_name': model._meta.db_table},
+    )
+    return model
+
+
+def count_changed(month, delta):
+    ClimateDataPartition.objects.filter(month=month).update(
+        row_count=F('row_count') + delta, updated_at=timezone.now(),
+    )
+
+
+def archive_horizon():
+    """Start of the live partition, or None while nothing is archived"""
+    newest = ClimateDataPartition.objects.aggregate(newest=Max('month'))['newest']
+    return month_bounds(newest)[1] if newest else None
+
+
+def as_bound(value, end=False):
+    """An aware datetime no tighter than a ``timestamp`` lookup value, or None if unknown"""
+    if isinstance(value, datetime):
+        moment, exact = value, timezone.is_aware(value)
+    elif isinstance(value, date):
+        moment, exact = datetime.combine(value, time.min), False
+    elif isinstance(value, str):
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = datetime.combine(day, time.min) if day else None
+        exact = moment is not None and timezone.is_aware(moment)
+    else:
+        return None
+    if moment is None:
+        return None
+    if not exact:
+        # Naive values are read in the current time zone; allow a day either side
+        moment = moment.replace(tzinfo=dt_timezone.utc) + timedelta(days=1 if end else -1)
+    return moment
+
+
+def timestamp_bounds(lookups):
+    """``(start, end)`` implied by timestamp lookups in filter() keyword arguments"""
+    starts, ends = [], []
+    for lookup, value in lookups.items():
+        if lookup == 'timestamp__range':
+            starts.append(as_bound(value[0]))
+            ends.append(as_bound(value[1], end=True))
+        elif lookup in ('timestamp__gte', 'timestamp__gt'):
+            starts.append(as_bound(value))
+        elif lookup in ('timestamp__lte', 'timestamp__lt'):
+            ends.append(as_bound(value, end=True))
+        elif lookup == 'timestamp':
+            starts.append(as_bound(value))
+            ends.append(as_bound(value, end=True))
+    starts = [start for start in starts if start is not None]
+    ends = [end for end in ends if end is not None]
+    return max(starts, default=None), min(ends, default=None)
+
+
+class PartitionedReadings:
+    """
+    Queryset-like view over archived partitions and the live table.
+
+    Supports the part of the QuerySet API the views use: chained filter,
+    exclude, select_related, values_list and order_by, plus iteration,
+    iterator(), slicing, count() and exists(). Ordering must lead with
+    ``timestamp`` so that partitions can be read one after another.
+    """
+
+    def __init__(self, partitions, descending=False):
+        # (start, end, queryset) oldest first; the live table has no bounds
+        self.partitions = partitions
+        self.descending = descending
+
+    def _chain(self, method, *args, **kwargs):
+        return PartitionedReadings(
+            [(start, end, getattr(queryset, method)(*args, **kwargs)) for start, end, queryset in self.partitions],
+            self.descending,
+        )
+
+    def filter(self, *args, **kwargs):
+        low, high = timestamp_bounds(kwargs)
+        kept = PartitionedReadings([
+            (start, end, queryset) for start, end, queryset in self.partitions
+            if (low is None or end is None or low < end) and (high is None or start is None or start <= high)
+        ], self.descending)
+        return kept._chain('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._chain('exclude', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self._chain('select_related', *fields)
+
+    def values_list(self, *fields, **kwargs):
+        return self._chain('values_list', *fields, **kwargs)
+
+    def order_by(self, *fields):
+        if not fields or fields[0].lstrip('-') != 'timestamp':
+            raise ValueError("Partitioned readings can only be ordered by timestamp first")
+        ordered = self._chain('order_by', *fields)
+        ordered.descending = fields[0].startswith('-')
+        return ordered
+
+    @property
+    def ordered(self):
+        return all(queryset.ordered for queryset in self.querysets)
+
+    @property
+    def querysets(self):
+        """Per-partition querysets in result order"""
+        querysets = [queryset for _, _, queryset in self.partitions]
+        return querysets[::-1] if self.descending else querysets
+
+    def __iter__(self):
+        return chain.from_iterable(self.querysets)
+
+    def iterator(self, chunk_size=2000):
+        return chain.from_iterable(queryset.iterator(chunk_size=chunk_size) for queryset in self.querysets)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step:
+            raise TypeError("Partitioned readings only support slicing")
+        skip = key.start or 0
+        wanted = None if key.stop is None else max(key.stop - skip, 0)
+        rows = []
+        for queryset in self.querysets:
+            if wanted is not None and len(rows) >= wanted:
+                break
+            if skip:
+                size = queryset.count()
+                if skip >= size:
+                    skip -= size
+                    continue
+            stop = None if wanted is None else skip + wanted - len(rows)
+            rows.extend(queryset[skip:stop])
+            skip = 0
+        return rows
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+
+def readings():
+    """Every ClimateData reading, live and archived, behind one router"""
+    partitions = []
+    for partition in ClimateDataPartition.objects.all():
+        start, end = month_bounds(partition.month)
+        partitions.append((start, end, partition_model(partition.month).objects.all()))
+    partitions.append((None, None, ClimateData.objects.all()))
+    return PartitionedReadings(partitions)
+
+
+def total_readings():
+    """Reading count from the live table, the archive registry and sealed chunks"""
+    archived = ClimateDataPartition.objects.aggregate(total=Sum('row_count'))['total'] or 0
+    sealed = ClimateDataChunk.objects.aggregate(total=Sum('count'))['total'] or 0
+    return ClimateData.objects.count() + archived + sealed
+
+
+def split_archived(objects):
+    """Split unsaved readings into live ones and ``{month: readings}`` for archived months"""
+    horizon = archive_horizon()
+    live, archived = [], defaultdict(list)
+    for reading in objects:
+        if horizon is not None and reading.timestamp < horizon:
+            archived[month_start(reading.timestamp)].append(reading)
+        else:
+            live.append(reading)
+    return live, archived
+
+
+def move_rows(month, queryset):
+    """Move live rows into a month's existing partition; call inside a transaction"""
+    model = partition_model(month)
+    fields = ClimateData._meta.concrete_fields
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    select, params = queryset.values_list(*[field.attname for field in fields]).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) {select}", params)
+        moved = cursor.rowcount
+    queryset.delete()
+    count_changed(month, moved)
+    return moved
+
+
+def store_archived(archived):
+    """
+    Insert ``{month: readings}`` into existing partitions; returns the stored rows.
+
+    Rows pass through the live table inside the caller's transaction so
+    their ids come from its sequence and stay unique across partitions.
+    """
+    stored = []
+    for month, objects in archived.items():
+        created = ClimateData.objects.bulk_create(objects)
+        move_rows(month, ClimateData.objects.filter(id__in=[reading.id for reading in created]))
+        stored += created
+    return stored
+
+
+def archive_month(month):
+    """Move one month of readings from the live table into its partition; returns rows moved"""
+    start, end = month_bounds(month)
+    live = ClimateData.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if not live.exists():
+        return 0
+
+    model = ensure_partition(month)
+    with transaction.atomic():
+        moved = move_rows(month, live)
+
+    logger.info(f"Archived {moved} climate readings into {model._meta.db_table}")
+    return moved
+
+
+def archive_closed_months(live_months=None):
+    """Archive every month before the last ``live_months``; returns ``{month: rows moved}``"""
+    live_months = live_months or get_live_months()
+    boundary = add_months(month_start(timezone.now()), 1 - live_months)
+    oldest = ClimateData.objects.filter(
+        timestamp__lt=month_bounds(boundary)[0],
+    ).aggregate(oldest=Min('timestamp'))['oldest']
+
+    moved = {}
+    month = month_start(oldest) if oldest else boundary
+    while month < boundary:
+        rows = archive_month(month)
+        if rows:
+            moved[month] = rows
+        month = add_months(month, 1)
+    return moved
+
+
+def drop_partition(month):
+    """Drop a month's partition table and its registry row; returns the rows dropped"""
+    partition = ClimateDataPartition.objects.get(month=month)
+    with connection.schema_editor() as editor:
+        editor.delete_model(partition_model(month))
+    partition.delete()
+    logger.info(f"Dropped climate data partition {partition.table_name} ({partition.row_count} readings)")
+    return partition.row_count
+
+
+def delete_source_readings(source_id):
+    """Remove a data source's archived readings (live ones cascade through the FK)"""
+    for partition in ClimateDataPartition.objects.all():
+        deleted, _ = partition_model(partition.month).objects.filter(data_source_id=source_id).delete()
+        if deleted:
+            count_changed(partition.month, -deleted)
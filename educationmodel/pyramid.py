@@ -0,0 +1,303 @@
+"""
+Multi-resolution min/max pyramid for zoomable charts.
+
+Level 0 has one bucket per hour for each data type, merged over all
+sources from the hourly rollups. Each level above halves the resolution,
+so a level-k bucket spans 2**k hours and holds the count, min, max and
+sum of its readings. Buckets are stored TILE_BUCKETS at a time as
+ChartPyramidTile rows numbered from the epoch. A level-k tile is made by
+folding the buckets of its two children at level k - 1 pairwise.
+
+``pyramid_series`` serves a window from the finest level with at most
+``width`` buckets in it, which is at most a few tiles whatever the
+window: ten years costs the same as ten days. Windows shorter than
+CHART_MIN_POINTS hours are binned from raw readings instead.
+
+Tiles are built on first use, or for the whole history by the
+build_chart_pyramid command, and then stored. New readings delete every
+tile whose span holds them, through the ``readings_ingested`` signal, and
+``rebuild_rollups`` clears the range it rebuilt. A freshly built tile is
+not stored while readings inside its span are still arriving, so a build
+racing ingestion cannot leave an outdated tile behind.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .chunks import sealed_readings
+from .fields import EPOCH
+from .models import ChartPyramidTile, ClimateData, ClimateDataRollup
+from .partitions import readings
+from .retention import archived_readings
+
+TILE_BUCKETS = 256
+BASE_BUCKET = timedelta(hours=1)
+
+# Level-16 buckets span about 7.5 years; tiles above would overflow datetime
+MAX_LEVEL = 16
+
+# Rows of a tile's data array
+COUNT, LOW, HIGH, TOTAL = range(4)
+
+# Readings created this recently may not have reached the rollups yet
+BUILD_GRACE = timedelta(seconds=5)
+
+
+def get_min_points():
+    return settings.CLIMATE_DATA_SETTINGS.get('CHART_MIN_POINTS', 100)
+
+
+def bucket_width(level):
+    return BASE_BUCKET * 2 ** level
+
+
+def tile_span(level):
+    return bucket_width(level) * TILE_BUCKETS
+
+
+def tile_start(level, index):
+    return EPOCH + tile_span(level) * index
+
+
+def tile_index(moment, level):
+    return (moment - EPOCH) // tile_span(level)
+
+
+def empty_tile(buckets=TILE_BUCKETS):
+    tile = np.zeros((4, buckets))
+    tile[LOW] = np.inf
+    tile[HIGH] = -np.inf
+    return tile
+
+
+# Times whose tiles, on every level, start and end within datetime's range
+FIRST_TIME = tile_start(MAX_LEVEL, tile_index(datetime.min.replace(tzinfo=dt_timezone.utc), MAX_LEVEL) + 1)
+LAST_TIME = tile_start(MAX_LEVEL, tile_index(datetime.max.replace(tzinfo=dt_timezone.utc), MAX_LEVEL)) - BASE_BUCKET
+
+
+def choose_level(window, width):
+    """Finest level with at most ``width`` buckets in ``window``, or None for raw readings"""
+    if window < BASE_BUCKET * get_min_points():
+        return None
+    return min(MAX_LEVEL, max(0, math.ceil(math.log2(window / BASE_BUCKET / width))))
+
+
+def hourly_rollups(data_type, start, end):
+    """``(bucket, count, min, max, sum)`` per hour in ``[start, end)``, merged over sources"""
+    return ClimateDataRollup.objects.filter(
+        resolution='hour', data_type=data_type, bucket__gte=start, bucket__lt=end,
+    ).values('bucket').annotate(
+        total_count=Sum('count'),
+        low=Min('min_value'),
+        high=Max('max_value'),
+        total=Sum(F('mean_value') * F('count')),
+    ).values_list('bucket', 'total_count', 'low', 'high', 'total').order_by('bucket')
+
+
+def base_tiles(data_type, start, end):
+    """``{index: tile}`` of the non-empty level-0 tiles in ``[start, end)``"""
+    tiles = {}
+    for bucket, count, low, high, total in hourly_rollups(data_type, start, end).iterator():
+        index = tile_index(bucket, 0)
+        if index not in tiles:
+            tiles[index] = empty_tile()
+        tiles[index][:, (bucket - tile_start(0, index)) // BASE_BUCKET] = count, low, high, total
+    return tiles
+
+
+def merge_children(left, right):
+    """A parent tile from its two child tiles"""
+    pairs = np.concatenate([left, right], axis=1).reshape(4, TILE_BUCKETS, 2)
+    return np.stack([
+        pairs[COUNT].sum(axis=1),
+        pairs[LOW].min(axis=1),
+        pairs[HIGH].max(axis=1),
+        pairs[TOTAL].sum(axis=1),
+    ])
+
+
+def has_rollups(data_type, level, index):
+    start = tile_start(level, index)
+    return ClimateDataRollup.objects.filter(
+        resolution='hour', data_type=data_type, bucket__gte=start, bucket__lt=start + tile_span(level),
+    ).exists()
+
+
+def load_tiles(data_type, level, indices, built):
+    """
+    ``{index: tile}`` for tiles of one level; missing ones are built from
+    their children and also recorded in ``built`` under ``(level, index)``
+    """
+    stored = ChartPyramidTile.objects.filter(
+        data_type=data_type, level=level, index__in=indices,
+    ).values_list('index', 'data')
+    tiles = {index: np.frombuffer(bytes(data), dtype=np.float64).reshape(4, TILE_BUCKETS) for index, data in stored}
+
+    for index in indices:
+        if index in tiles:
+            continue
+        if not has_rollups(data_type, level, index):
+            # Empty stretches are cheap to recognise, so they are not stored
+            tiles[index] = empty_tile()
+            continue
+        if level == 0:
+            start = tile_start(0, index)
+            tile = base_tiles(data_type, start, start + tile_span(0)).get(index, empty_tile())
+        else:
+            children = load_tiles(data_type, level - 1, [2 * index, 2 * index + 1], built)
+            tile = merge_children(children[2 * index], children[2 * index + 1])
+        tiles[index] = built[(level, index)] = tile
+    return tiles
+
+
+def save_tiles(data_type, built, started):
+    """
+    Store ``{(level, index): tile}`` built from data read after ``started``;
+    returns the number stored
+    """
+    # Spans that readings created since the build began may still change
+    recent = ClimateData.objects.filter(
+        data_type=data_type, created_at__gte=started - BUILD_GRACE,
+    ).aggregate(first=Min('timestamp'), last=Max('timestamp'))
+
+    tiles = []
+    for (level, index), tile in built.items():
+        start = tile_start(level, index)
+        if recent['first'] is not None and start <= recent['last'] and recent['first'] < start + tile_span(level):
+            continue
+        tiles.append(ChartPyramidTile(data_type=data_type, level=level, index=index, data=tile.tobytes()))
+    ChartPyramidTile.objects.bulk_create(
+        tiles, update_conflicts=True, unique_fields=['data_type', 'level', 'index'], update_fields=['data', 'updated_at'],
+    )
+    return len(tiles)
+
+
+def build_pyramid(data_type):
+    """Rebuild every tile of a data type's pyramid from its hourly rollups; returns tiles stored"""
+    started = timezone.now()
+    clear_tiles(data_type=data_type)
+    bounds = ClimateDataRollup.objects.filter(resolution='hour', data_type=data_type).aggregate(
+        first=Min('bucket'), last=Max('bucket'),
+    )
+    if bounds['first'] is None:
+        return 0
+
+    tiles = base_tiles(data_type, bounds['first'], bounds['last'] + BASE_BUCKET)
+    stored = 0
+    for level in range(MAX_LEVEL + 1):
+        if level:
+            tiles = {
+                index: merge_children(tiles.get(2 * index, empty_tile()), tiles.get(2 * index + 1, empty_tile()))
+                for index in sorted({index // 2 for index in tiles})
+            }
+        stored += save_tiles(data_type, {(level, index): tile for index, tile in tiles.items()}, started)
+    return stored
+
+
+def tile_levels_filter(start, end):
+    """Q matching tiles of any level that overlap ``[start, end]`` (either may be None)"""
+    overlapping = Q()
+    for level in range(MAX_LEVEL + 1):
+        bounds = Q(level=level)
+        if start is not None:
+            bounds &= Q(index__gte=tile_index(start, level))
+        if end is not None:
+            bounds &= Q(index__lte=tile_index(end, level))
+        overlapping |= bounds
+    return overlapping
+
+
+def clear_tiles(start=None, end=None, data_type=None):
+    """Delete stored tiles overlapping ``[start, end]``, optionally of one data type"""
+    tiles = ChartPyramidTile.objects.all()
+    if data_type is not None:
+        tiles = tiles.filter(data_type=data_type)
+    if start is not None or end is not None:
+        tiles = tiles.filter(tile_levels_filter(start, end))
+    return tiles.delete()[0]
+
+
+def invalidate_tiles(new_readings):
+    """Delete the tiles, on every level, whose span holds one of ``new_readings``"""
+    base = defaultdict(set)
+    for reading in new_readings:
+        base[reading.data_type].add(tile_index(reading.timestamp, 0))
+
+    stale = Q()
+    for data_type, indices in base.items():
+        for level in range(MAX_LEVEL + 1):
+            # Level-k ancestors of a level-0 tile are its index shifted right by k
+            stale |= Q(data_type=data_type, level=level, index__in={index >> level for index in indices})
+    if stale:
+        ChartPyramidTile.objects.filter(stale).delete()
+
+
+def raw_buckets(data_type, start, end, width):
+    """``width`` equal buckets of the raw readings in ``[start, end]``, live, sealed and archived"""
+    rows = list(readings().filter(
+        data_type=data_type, timestamp__range=[start, end],
+    ).values_list('timestamp', 'value'))
+    sealed = sealed_readings(start, end, data_type=data_type)
+    archived = archived_readings(start, end, data_types=[data_type])
+    seconds = np.concatenate([
+        archived['timestamp'], sealed['timestamp'],
+        np.fromiter((timestamp.timestamp() for timestamp, _ in rows), dtype=np.float64, count=len(rows)),
+    ])
+    values = np.concatenate([
+        archived['value'], sealed['value'],
+        np.fromiter((value for _, value in rows), dtype=np.float64, count=len(rows)),
+    ])
+
+    step = (end - start).total_seconds() / width
+    positions = np.minimum(((seconds - start.timestamp()) // step).astype(np.int64), width - 1)
+    data = empty_tile(width)
+    data[COUNT] = np.bincount(positions, minlength=width)
+    data[TOTAL] = np.bincount(positions, weights=values, minlength=width)
+    np.minimum.at(data[LOW], positions, values)
+    np.maximum.at(data[HIGH], positions, values)
+    return start.timestamp() + np.arange(width) * step, step, data
+
+
+def pyramid_series(data_type, start, end, width):
+    """
+    Buckets of the finest level with at most ``width`` of them in ``[start, end]``.
+
+    The window is clamped to the years tiles can represent (roughly 56 to
+    9600). Returns the ``level`` (None for raw readings), ``bucket_seconds``
+    and, for non-empty buckets only, aligned arrays of bucket start seconds
+    (``x``), ``count``, ``min``, ``max`` and ``mean``.
+    """
+    # Nothing is stored that far out, and tile bounds there overflow datetime
+    start, end = max(start, FIRST_TIME), min(end, LAST_TIME)
+    level = choose_level(end - start, width) if start < end else None
+    if start >= end:
+        seconds, step, data = np.empty(0), 0.0, empty_tile(0)
+    elif level is None:
+        seconds, step, data = raw_buckets(data_type, start, end, width)
+    else:
+        started = timezone.now()
+        indices = list(range(tile_index(start, level), tile_index(end, level) + 1))
+        built = {}
+        tiles = load_tiles(data_type, level, indices, built)
+        if built:
+            save_tiles(data_type, built, started)
+        data = np.concatenate([tiles[index] for index in indices], axis=1)
+        step = bucket_width(level).total_seconds()
+        seconds = tile_start(level, indices[0]).timestamp() + np.arange(data.shape[1]) * step
+
+    keep = (data[COUNT] > 0) & (seconds + step > start.timestamp()) & (seconds <= end.timestamp())
+    count, low, high, total = data[:, keep]
+    return {
+        'level': level,
+        'bucket_seconds': step,
+        'x': seconds[keep],
+        'count': count.astype(np.int64),
+        'min': low,
+        'max': high,
+        'mean': total / count,
+    }
@@ -0,0 +1,260 @@
+"""
+Gridded (raster) storage for satellite fields.
+
+A scene is one 2-D field over a regular lat/lon grid. Its pixels are
+written once to a ``.npy`` file under RASTER_DIR, cut into square tiles of
+RASTER_CHUNK_SIZE pixels and laid out as a ``(tile_rows, tile_columns,
+chunk, chunk)`` array, so every tile is contiguous on disk. Edge tiles are
+padded with NaN, which is also the no-data value. A RasterScene row holds
+the metadata and extent, so scenes are found by time, type and bbox
+without touching any file.
+
+Reads open the file with ``mmap_mode='r'`` and copy only the tiles that
+overlap the requested window. Strided windows and point samples touch
+only the pages that hold the wanted pixels. A whole scene is never loaded
+into memory, and neither is the input when it is itself a memory-mapped
+array, since writing also goes tile by tile.
+"""
+import logging
+import math
+import os
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .chunks import sealed_readings
+from .models import DataSource, RasterScene
+from .partitions import readings
+from .retention import source_uuids
+from .spatial import sources_in_bbox
+
+logger = logging.getLogger(__name__)
+
+RASTER_DTYPE = np.float32
+
+
+def get_raster_dir():
+    return Path(settings.CLIMATE_DATA_SETTINGS.get('RASTER_DIR', settings.BASE_DIR / 'rasters'))
+
+
+def get_chunk_size():
+    return settings.CLIMATE_DATA_SETTINGS.get('RASTER_CHUNK_SIZE', 256)
+
+
+def scene_path(scene):
+    return get_raster_dir() / scene.file_path
+
+
+def write_tiles(path, array, chunk):
+    """Write a 2-D array as NaN-padded ``chunk`` x ``chunk`` tiles, atomically"""
+    rows, columns = array.shape
+    shape = (math.ceil(rows / chunk), math.ceil(columns / chunk), chunk, chunk)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp.npy')
+    tiles = np.lib.format.open_memmap(temporary, mode='w+', dtype=RASTER_DTYPE, shape=shape)
+    for tile_row in range(shape[0]):
+        for tile_column in range(shape[1]):
+            block = array[
+                tile_row * chunk:(tile_row + 1) * chunk,
+                tile_column * chunk:(tile_column + 1) * chunk,
+            ]
+            tile = tiles[tile_row, tile_column]
+            tile[:] = np.nan
+            tile[:block.shape[0], :block.shape[1]] = block
+    tiles.flush()
+    del tiles
+    os.replace(temporary, path)
+
+
+def store_scene(data_source, data_type, timestamp, array, bounds, unit=''):
+    """
+    Save a 2-D field covering ``bounds = (south, west, north, east)`` as a
+    new scene; row 0 of ``array`` is the north edge
+    """
+    south, west, north, east = bounds
+    if array.ndim != 2 or 0 in array.shape:
+        raise ValueError("A scene must be a non-empty 2-D array")
+    if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+        raise ValueError(f"Invalid scene bounds: {bounds!r}")
+
+    scene = RasterScene(
+        data_source=data_source, data_type=data_type, unit=unit, timestamp=timestamp,
+        south=south, west=west, north=north, east=east,
+        rows=array.shape[0], columns=array.shape[1], chunk_size=get_chunk_size(),
+    )
+    scene.file_path = f"{data_type}/{timestamp:%Y/%m}/{scene.id}.npy"
+    write_tiles(scene_path(scene), array, scene.chunk_size)
+    try:
+        scene.save()
+    except Exception:
+        scene_path(scene).unlink(missing_ok=True)
+        raise
+    logger.info(f"Stored {scene.rows}x{scene.columns} {data_type} scene {scene.id}")
+    return scene
+
+
+def delete_scene_file(scene):
+    """Remove a scene's file once the deleting transaction commits"""
+    path = scene_path(scene)
+    transaction.on_commit(lambda: path.unlink(missing_ok=True))
+
+
+def open_tiles(scene):
+    return np.load(scene_path(scene), mmap_mode='r')
+
+
+def pixel_size(scene):
+    """``(height, width)`` of one pixel in degrees"""
+    return (scene.north - scene.south) / scene.rows, (scene.east - scene.west) / scene.columns
+
+
+def scenes_in_window(data_type, start, end, bbox=None, data_source=None):
+    """Scenes of one type taken in ``[start, end]``, optionally overlapping ``(south, west, north, east)``"""
+    scenes = RasterScene.objects.filter(data_type=data_type, timestamp__range=[start, end])
+    if bbox is not None:
+        south, west, north, east = bbox
+        scenes = scenes.filter(south__lte=north, north__gte=south, west__lte=east, east__gte=west)
+    if data_source is not None:
+        scenes = scenes.filter(data_source=data_source)
+    return scenes.select_related('data_source')
+
+
+def window_pixels(scene, bbox):
+    """Pixel ``(row_start, row_stop, column_start, column_stop)`` covering a bbox, or None if outside"""
+    south, west, north, east = bbox
+    height, width = pixel_size(scene)
+    row_start = max(0, math.floor((scene.north - north) / height))
+    row_stop = min(scene.rows, math.ceil((scene.north - south) / height))
+    column_start = max(0, math.floor((west - scene.west) / width))
+    column_stop = min(scene.columns, math.ceil((east - scene.west) / width))
+    if row_start >= row_stop or column_start >= column_stop:
+        return None
+    return row_start, row_stop, column_start, column_stop
+
+
+def read_pixels(scene, row_start, row_stop, column_start, column_stop, step=1):
+    """Every ``step``-th pixel of a pixel window, copied only from the tiles it overlaps"""
+    tiles = open_tiles(scene)
+    chunk = scene.chunk_size
+    out = np.full(
+        (len(range(row_start, row_stop, step)), len(range(column_start, column_stop, step))),
+        np.nan, dtype=RASTER_DTYPE,
+    )
+
+    def strided(start, stop, tile):
+        """First wanted pixel inside a tile, its local slice and the matching output slice"""
+        first = max(start, tile * chunk)
+        first += -(first - start) % step
+        last = min(stop, (tile + 1) * chunk)
+        if first >= last:
+            return None
+        local = slice(first - tile * chunk, last - tile * chunk, step)
+        target = slice((first - start) // step, (first - start) // step + len(range(first, last, step)))
+        return local, target
+
+    for tile_row in range(row_start // chunk, (row_stop - 1) // chunk + 1):
+        rows = strided(row_start, row_stop, tile_row)
+        if rows is None:
+            continue
+        for tile_column in range(column_start // chunk, (column_stop - 1) // chunk + 1):
+            columns = strided(column_start, column_stop, tile_column)
+            if columns is None:
+                continue
+            out[rows[1], columns[1]] = tiles[tile_row, tile_column, rows[0], columns[0]]
+    return out
+
+
+def read_window(scene, bbox, step=1):
+    """
+    The pixels of a scene inside ``bbox`` (every ``step``-th row and column).
+
+    Returns ``(values, (south, west, north, east))`` where the bounds are
+    those of the pixels actually returned, or None if the bbox misses the
+    scene.
+    """
+    window = window_pixels(scene, bbox)
+    if window is None:
+        return None
+    row_start, row_stop, column_start, column_stop = window
+    values = read_pixels(scene, row_start, row_stop, column_start, column_stop, step)
+    height, width = pixel_size(scene)
+    # With a step each returned pixel stands for a step x step block
+    bounds = (
+        scene.north - min(row_start + values.shape[0] * step, scene.rows) * height,
+        scene.west + column_start * width,
+        scene.north - row_start * height,
+        scene.west + min(column_start + values.shape[1] * step, scene.columns) * width,
+    )
+    return values, bounds
+
+
+def sample_points(scene, lats, lons):
+    """Values of the pixels containing each point; NaN outside the scene"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    height, width = pixel_size(scene)
+    rows = np.floor((scene.north - lats) / height).astype(np.int64)
+    columns = np.floor((lons - scene.west) / width).astype(np.int64)
+    # Points exactly on the south/east edge belong to the last pixel
+    rows[lats == scene.south] = scene.rows - 1
+    columns[lons == scene.east] = scene.columns - 1
+    inside = (rows >= 0) & (rows < scene.rows) & (columns >= 0) & (columns < scene.columns)
+
+    values = np.full(len(lats), np.nan, dtype=RASTER_DTYPE)
+    if inside.any():
+        chunk = scene.chunk_size
+        rows, columns = rows[inside], columns[inside]
+        tiles = open_tiles(scene)
+        values[inside] = tiles[rows // chunk, columns // chunk, rows % chunk, columns % chunk]
+    return values
+
+
+def station_comparison(scene, tolerance):
+    """
+    Station readings of the scene's data type next to the grid value at
+    each station.
+
+    Every active non-satellite source inside the extent contributes its
+    reading closest to the scene time, sealed ones included, if one lies
+    within ``tolerance``.
+    """
+    stations = list(sources_in_bbox(
+        scene.south, scene.west, scene.north, scene.east,
+        queryset=DataSource.objects.filter(is_active=True).exclude(source_type='satellite'),
+    ))
+    start, end = scene.timestamp - tolerance, scene.timestamp + tolerance
+    station_ids = [station.pk for station in stations]
+    matches = list(readings().filter(
+        data_source__in=station_ids, data_type=scene.data_type, timestamp__range=[start, end],
+    ).values_list('data_source_id', 'timestamp', 'value'))
+    sealed = sealed_readings(
+        start, end, data_source__in=station_ids, data_type=scene.data_type, names=('data_source_id', 'value'),
+    )
+    matches += zip(
+        source_uuids(sealed['data_source_id']),
+        [datetime.fromtimestamp(seconds, tz=dt_timezone.utc) for seconds in sealed['timestamp'].tolist()],
+        sealed['value'].tolist(),
+    )
+
+    closest = {}
+    for source_id, timestamp, value in matches:
+        offset = abs(timestamp - scene.timestamp)
+        if source_id not in closest or offset < closest[source_id][0]:
+            closest[source_id] = (offset, timestamp, value)
+
+    matched = [station for station in stations if station.pk in closest]
+    grid_values = sample_points(
+        scene, [station.location_lat for station in matched], [station.location_lon for station in matched],
+    )
+    return [
+        {
+            'source': station,
+            'timestamp': closest[station.pk][1],
+            'reading': closest[station.pk][2],
+            'grid_value': None if np.isnan(grid_value) else float(grid_value),
+        }
+        for station, grid_value in zip(matched, grid_values)
+    ]
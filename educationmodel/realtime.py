@@ -0,0 +1,226 @@
+"""
+Server-Sent Events fan-out of new readings and alert changes.
+
+A single poller task per process reads ClimateData inserted and
+ClimateAlert rows updated since its last pass, serialises each
+(data_type, data_source) group of readings and each alert once, and hands
+the fragments to every subscribed connection whose filters match. Database
+load is therefore one poll per REALTIME_POLL_INTERVAL regardless of how
+many clients are connected, and it stops when the last client leaves.
+
+Each connection owns a bounded queue; a client that falls behind loses its
+oldest events rather than holding memory. Streams are closed after
+REALTIME_STREAM_MAX_SECONDS and the browser's EventSource reconnects on its
+own, which also reclaims connections from clients that vanished without the
+server noticing.
+
+Streaming needs an ASGI server (e.g. ``uvicorn EduPredict.asgi:application``);
+under WSGI the response would be buffered until the stream ends.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ClimateAlert, ClimateData
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before the oldest are dropped
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+# Readings fetched per poll; anything beyond is picked up by the next one
+POLL_BATCH_SIZE = 5000
+
+# Seconds between keepalive comments on an idle stream
+KEEPALIVE_INTERVAL = 15
+
+# Rows younger than this wait for the next poll so in-flight commits aren't skipped
+COMMIT_GRACE = timedelta(seconds=1)
+
+
+def get_poll_interval():
+    return settings.CLIMATE_DATA_SETTINGS.get('REALTIME_POLL_INTERVAL', 2)
+
+
+def get_stream_max_seconds():
+    return settings.CLIMATE_DATA_SETTINGS.get('REALTIME_STREAM_MAX_SECONDS', 300)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+class Subscription:
+    """Filters and event queue for one open stream"""
+
+    def __init__(self, data_types=None, source_ids=None, severities=None, readings=True, alerts=True):
+        self.data_types = set(data_types) if data_types else None
+        self.source_ids = set(source_ids) if source_ids else None
+        self.severities = set(severities) if severities is not None else None
+        self.readings = readings
+        self.alerts = alerts
+        self.queue = asyncio.Queue(SUBSCRIPTION_QUEUE_SIZE)
+        self.dropped = 0
+
+    def wants_series(self, data_type, source_id):
+        return (
+            self.readings
+            and (self.data_types is None or data_type in self.data_types)
+            and (self.source_ids is None or source_id in self.source_ids)
+        )
+
+    def wants_alert(self, severity, source_id):
+        return (
+            self.alerts
+            and (self.severities is None or severity in self.severities)
+            and (self.source_ids is None or source_id is None or source_id in self.source_ids)
+        )
+
+    def offer(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class Broker:
+    """In-process pub/sub between the poller and open streams"""
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.poller = None
+        self.loop = None
+
+    def subscribe(self, subscription):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # Subscriptions and the poller belong to a single event loop
+            self.subscriptions = set()
+            self.poller = None
+            self.loop = loop
+        self.subscriptions.add(subscription)
+        if self.poller is None or self.poller.done():
+            self.poller = loop.create_task(self.poll())
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    def publish_readings(self, rows):
+        """Fan out (source_id, data_type, timestamp, value) rows, encoding each group once"""
+        groups = defaultdict(list)
+        for source_id, data_type, timestamp, value in rows:
+            groups[(data_type, str(source_id))].append([timestamp.isoformat(), value])
+        fragments = {
+            (data_type, source_id): json.dumps({
+                'data_type': data_type, 'source_id': source_id, 'points': points,
+            })
+            for (data_type, source_id), points in groups.items()
+        }
+
+        for subscription in list(self.subscriptions):
+            matched = [
+                fragment for (data_type, source_id), fragment in fragments.items()
+                if subscription.wants_series(data_type, source_id)
+            ]
+            if matched:
+                subscription.offer(format_event('readings', '[' + ','.join(matched) + ']'))
+
+    def publish_alerts(self, alerts):
+        encoded = [
+            (alert['severity'], alert['data_source_id'], format_event('alert', json.dumps(alert)))
+            for alert in alerts
+        ]
+        for subscription in list(self.subscriptions):
+            for severity, source_id, message in encoded:
+                if subscription.wants_alert(severity, source_id):
+                    subscription.offer(message)
+
+    async def poll(self):
+        started = timezone.now() - COMMIT_GRACE
+        watermarks = {'readings': (started, None), 'alerts': started}
+        try:
+            while self.subscriptions:
+                await asyncio.sleep(get_poll_interval())
+                if not self.subscriptions:
+                    break
+                rows, alerts = await sync_to_async(fetch_changes)(watermarks)
+                if rows:
+                    self.publish_readings(rows)
+                if alerts:
+                    self.publish_alerts(alerts)
+        except Exception:
+            logger.exception("Realtime poller stopped")
+            raise
+
+
+def fetch_changes(watermarks):
+    """Readings inserted and alerts updated since the watermarks, which are advanced in place"""
+    upper = timezone.now() - COMMIT_GRACE
+
+    last_created_at, last_id = watermarks['readings']
+    readings = ClimateData.objects.filter(created_at__lte=upper)
+    if last_id is None:
+        readings = readings.filter(created_at__gt=last_created_at)
+    else:
+        readings = readings.filter(
+            Q(created_at__gt=last_created_at) | Q(created_at=last_created_at, id__gt=last_id)
+        )
+    rows = list(
+        readings.order_by('created_at', 'id').values_list(
+            'created_at', 'id', 'data_source_id', 'data_type', 'timestamp', 'value',
+        )[:POLL_BATCH_SIZE]
+    )
+    if len(rows) == POLL_BATCH_SIZE:
+        watermarks['readings'] = (rows[-1][0], rows[-1][1])
+    else:
+        watermarks['readings'] = (upper, None)
+
+    alerts = list(
+        ClimateAlert.objects.filter(
+            updated_at__gt=watermarks['alerts'], updated_at__lte=upper,
+        ).order_by('updated_at').values(
+            'id', 'alert_type', 'severity', 'title', 'description', 'data_source_id',
+            'actual_value', 'threshold_value', 'peak_value', 'occurrence_count',
+            'is_active', 'acknowledged_at', 'last_seen_at', 'updated_at',
+        )
+    )
+    watermarks['alerts'] = upper
+    for alert in alerts:
+        for field in ('id', 'data_source_id'):
+            if alert[field] is not None:
+                alert[field] = str(alert[field])
+        for field in ('acknowledged_at', 'last_seen_at', 'updated_at'):
+            if alert[field] is not None:
+                alert[field] = alert[field].isoformat()
+
+    return [row[2:] for row in rows], alerts
+
+
+broker = Broker()
+
+
+async def event_stream(subscription):
+    """SSE body for one subscription; unsubscribes when the client goes away"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + get_stream_max_seconds()
+    broker.subscribe(subscription)
+    try:
+        yield 'retry: 3000\n\n'
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.queue.get(), min(KEEPALIVE_INTERVAL, remaining),
+                )
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield message
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,362 @@
+"""
+Retention enforcement with a compressed cold archive.
+
+Readings older than DATA_RETENTION_DAYS and system metrics older than
+METRICS_RETENTION_DAYS are first written to compressed NumPy archives and
+only then deleted. There is one ``.npz`` file per kind and UTC month under
+ARCHIVE_DIR. Every column is a separate compressed member, so a query
+decompresses only the columns it reads. Repeated strings (data types,
+units, source ids) are stored once per file and referenced by integer
+codes.
+
+Deletes run in chunks of RETENTION_DELETE_CHUNK rows, each in its own
+transaction, so the SQLite write lock is only ever held briefly and
+ingestion keeps flowing. A fully expired month that sits in its own
+partition is dropped as a whole table instead. Sealed chunks (see
+chunks.py) are decoded and archived a month at a time, then deleted in
+one transaction per month. Archives are merged by row id, so re-running after an interruption
+never duplicates rows.
+
+Rollups are kept for the whole history. ``archived_readings`` and
+``archived_metrics`` let the chart and metrics APIs serve raw points for
+windows that reach back into the archive.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .chunks import decode_chunk, encode_chunk
+from .http_cache import readings_changed
+from .models import ClimateData, ClimateDataChunk, SystemMetrics
+from .partitions import (
+    add_months, count_changed, drop_partition, month_bounds, month_start, readings,
+)
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Archived fields and their column dtypes; 'U' columns are stored as codes + labels
+ARCHIVE_FIELDS = {
+    'climate_data': {
+        'id': np.int64,
+        'data_source_id': 'U',
+        'data_type': 'U',
+        'value': np.float64,
+        'unit': 'U',
+        'timestamp': 'datetime',
+        'quality_score': np.float32,
+        'is_anomaly': np.bool_,
+        'processed': np.bool_,
+    },
+    'system_metrics': {
+        'id': 'uuid',
+        'timestamp': 'datetime',
+        'cpu_usage': np.float64,
+        'memory_usage': np.float64,
+        'disk_usage': np.float64,
+        'network_io': np.float64,
+        'active_users': np.int32,
+        'data_processing_rate': np.float64,
+    },
+}
+
+
+def get_archive_dir():
+    return Path(settings.CLIMATE_DATA_SETTINGS.get('ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def get_delete_chunk():
+    return settings.CLIMATE_DATA_SETTINGS.get('RETENTION_DELETE_CHUNK', 5000)
+
+
+def retention_cutoff(kind='climate_data'):
+    """Rows with a timestamp before this are expired"""
+    config = settings.CLIMATE_DATA_SETTINGS
+    if kind == 'system_metrics':
+        days = config.get('METRICS_RETENTION_DAYS', 90)
+    else:
+        days = config.get('DATA_RETENTION_DAYS', 3650)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_path(kind, month):
+    return get_archive_dir() / kind / f"{month:%Y-%m}.npz"
+
+
+def to_columns(kind, rows):
+    """Turn ``values_list`` tuples in ARCHIVE_FIELDS order into decoded column arrays"""
+    columns = {}
+    for index, (name, dtype) in enumerate(ARCHIVE_FIELDS[kind].items()):
+        values = [row[index] for row in rows]
+        if dtype == 'uuid':
+            columns[name] = np.frombuffer(b''.join(value.bytes for value in values), dtype=np.uint8).reshape(-1, 16)
+        elif dtype == 'datetime':
+            columns[name] = np.array([(value - EPOCH) // timedelta(microseconds=1) for value in values], dtype=np.int64)
+        elif dtype == 'U':
+            columns[name] = np.array([str(value) for value in values], dtype=str)
+        else:
+            columns[name] = np.array(values, dtype=dtype)
+    return columns
+
+
+def encode_columns(columns):
+    """Replace string columns with integer codes plus a ``<name>__labels`` member"""
+    encoded = {}
+    for name, values in columns.items():
+        if values.dtype.kind == 'U':
+            labels, codes = np.unique(values, return_inverse=True)
+            encoded[name] = codes.astype(np.uint32)
+            encoded[f"{name}__labels"] = labels
+        else:
+            encoded[name] = values
+    return encoded
+
+
+def read_columns(archive, names):
+    """Decode the given columns of an open archive"""
+    columns = {}
+    for name in names:
+        if f"{name}__labels" in archive.files:
+            columns[name] = archive[f"{name}__labels"][archive[name]]
+        else:
+            columns[name] = archive[name]
+    return columns
+
+
+def write_archive(kind, month, columns):
+    """Merge columns into a month's archive file, deduplicated by id and sorted by time"""
+    path = archive_path(kind, month)
+    if path.exists():
+        with np.load(path) as archive:
+            existing = read_columns(archive, ARCHIVE_FIELDS[kind])
+        if existing['id'].shape[1:] != columns['id'].shape[1:]:
+            # Readings archived before the integer key: negative ids never clash with live ones
+            existing['id'] = -1 - np.arange(len(existing['id']), dtype=np.int64)
+        columns = {name: np.concatenate([existing[name], columns[name]]) for name in columns}
+        _, unique = np.unique(columns['id'], axis=0, return_index=True)
+        columns = {name: values[unique] for name, values in columns.items()}
+
+    order = np.argsort(columns['timestamp'], kind='stable')
+    columns = {name: values[order] for name, values in columns.items()}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp.npz')
+    np.savez_compressed(temporary, **encode_columns(columns))
+    os.replace(temporary, path)
+    return len(columns['id'])
+
+
+def archive_queryset(kind, month, queryset):
+    """Write every row of ``queryset`` to the month's archive; returns the ids archived"""
+    rows = list(queryset.values_list(*ARCHIVE_FIELDS[kind]).iterator(chunk_size=get_delete_chunk()))
+    if rows:
+        write_archive(kind, month, to_columns(kind, rows))
+    return [row[0] for row in rows]
+
+
+def delete_in_chunks(queryset, ids, chunk_size):
+    """
+    Delete the rows of ``queryset`` among ``ids``, ``chunk_size`` at a time,
+    one short transaction each. Only archived ids are passed, so rows that
+    arrived after the archive was written survive until the next run.
+    """
+    deleted = 0
+    for offset in range(0, len(ids), chunk_size):
+        with transaction.atomic():
+            removed, _ = queryset.filter(id__in=ids[offset:offset + chunk_size]).delete()
+        deleted += removed
+    return deleted
+
+
+def holds_only(queryset, ids, chunk_size):
+    """Whether every row of ``queryset`` is among ``ids``"""
+    matched = sum(
+        queryset.filter(id__in=ids[offset:offset + chunk_size]).count()
+        for offset in range(0, len(ids), chunk_size)
+    )
+    return matched == queryset.count()
+
+
+def enforce_climate_retention(cutoff=None, chunk_size=None):
+    """Archive and delete readings older than ``cutoff``; returns a summary"""
+    cutoff = cutoff or retention_cutoff('climate_data')
+    chunk_size = chunk_size or get_delete_chunk()
+    summary = {'archived': 0, 'deleted': 0, 'dropped_partitions': 0}
+
+    oldest = readings().filter(timestamp__lt=cutoff).order_by('timestamp')[:1]
+    month = month_start(oldest[0].timestamp) if oldest else None
+    while month is not None and month_bounds(month)[0] < cutoff:
+        start, end = month_bounds(month)
+        whole_month = end <= cutoff
+        expired = readings().filter(timestamp__gte=start, timestamp__lt=min(end, cutoff))
+        archived = archive_queryset('climate_data', month, expired)
+        summary['archived'] += len(archived)
+
+        for partition_start, _, queryset in expired.partitions:
+            if queryset.model is ClimateData:
+                summary['deleted'] += delete_in_chunks(queryset, archived, chunk_size)
+            elif partition_start != start:
+                # A neighbouring month kept by the inclusive range pruning
+                continue
+            elif whole_month and holds_only(queryset, archived, chunk_size):
+                summary['deleted'] += drop_partition(month)
+                summary['dropped_partitions'] += 1
+            else:
+                deleted = delete_in_chunks(queryset, archived, chunk_size)
+                count_changed(month, -deleted)
+                summary['deleted'] += deleted
+        month = add_months(month, 1)
+
+    archived, deleted = expire_chunks(cutoff)
+    summary['archived'] += archived
+    summary['deleted'] += deleted
+    if summary['deleted']:
+        readings_changed()
+
+    logger.info(
+        f"Climate data retention: archived {summary['archived']} and deleted {summary['deleted']} "
+        f"readings older than {cutoff:%Y-%m-%d}"
+    )
+    return summary
+
+
+def chunk_archive_columns(chunk, columns):
+    """Decoded chunk columns in the layout ``to_columns`` gives for climate_data"""
+    count = len(columns['timestamp'])
+    labels = {'data_source_id': str(chunk.data_source_id), 'data_type': chunk.data_type, 'unit': chunk.unit}
+    archive = {}
+    for name, dtype in ARCHIVE_FIELDS['climate_data'].items():
+        if dtype == 'U':
+            archive[name] = np.full(count, labels[name])
+        elif dtype == 'datetime':
+            archive[name] = columns[name]
+        else:
+            archive[name] = columns[name].astype(dtype)
+    return archive
+
+
+def expire_chunks(cutoff):
+    """
+    Archive and delete sealed readings older than ``cutoff``, a month at a
+    time; returns ``(archived, deleted)``. The chunk of the cutoff's day
+    keeps its newer readings.
+    """
+    archived = deleted = 0
+    low = (cutoff - EPOCH) // timedelta(microseconds=1)
+    expired = ClimateDataChunk.objects.filter(start__lt=cutoff)
+    oldest = expired.order_by('day').first()
+    month = oldest.day.replace(day=1) if oldest else None
+    while month is not None and month_bounds(month)[0] < cutoff:
+        parts, kept, emptied = [], [], []
+        for chunk in expired.filter(day__gte=month, day__lt=add_months(month, 1)):
+            columns = decode_chunk(chunk)
+            old = columns['timestamp'] < low
+            parts.append(chunk_archive_columns(chunk, {name: values[old] for name, values in columns.items()}))
+            if old.all():
+                emptied.append(chunk.pk)
+            else:
+                kept.append(encode_chunk(chunk, {name: values[~old] for name, values in columns.items()}))
+
+        if parts:
+            rows = sum(len(part['id']) for part in parts)
+            write_archive('climate_data', month, {
+                name: np.concatenate([part[name] for part in parts]) for name in parts[0]
+            })
+            with transaction.atomic():
+                for chunk in kept:
+                    chunk.save()
+                ClimateDataChunk.objects.filter(pk__in=emptied).delete()
+            archived += rows
+            deleted += rows
+        month = add_months(month, 1)
+    return archived, deleted
+
+
+def enforce_metrics_retention(cutoff=None, chunk_size=None):
+    """Archive and delete system metrics older than ``cutoff``; returns a summary"""
+    cutoff = cutoff or retention_cutoff('system_metrics')
+    chunk_size = chunk_size or get_delete_chunk()
+    summary = {'archived': 0, 'deleted': 0}
+
+    oldest = SystemMetrics.objects.filter(timestamp__lt=cutoff).order_by('timestamp').first()
+    month = month_start(oldest.timestamp) if oldest else None
+    while month is not None and month_bounds(month)[0] < cutoff:
+        start, end = month_bounds(month)
+        expired = SystemMetrics.objects.filter(timestamp__gte=start, timestamp__lt=min(end, cutoff)).order_by()
+        archived = archive_queryset('system_metrics', month, expired)
+        summary['archived'] += len(archived)
+        summary['deleted'] += delete_in_chunks(expired, archived, chunk_size)
+        month = add_months(month, 1)
+
+    logger.info(
+        f"System metrics retention: archived {summary['archived']} and deleted {summary['deleted']} "
+        f"samples older than {cutoff:%Y-%m-%d}"
+    )
+    return summary
+
+
+def load_archived(kind, start, end, names, mask=None):
+    """
+    Decoded ``names`` columns of archived rows with ``start <= timestamp <= end``.
+
+    ``mask(archive)`` may narrow the rows further; timestamps come back as
+    float epoch seconds.
+    """
+    low = (start - EPOCH) // timedelta(microseconds=1)
+    high = (end - EPOCH) // timedelta(microseconds=1)
+    names = list(dict.fromkeys(['timestamp', *names]))
+    parts = {name: [] for name in names}
+
+    month = month_start(start)
+    while month_bounds(month)[0] <= end:
+        path = archive_path(kind, month)
+        if path.exists():
+            with np.load(path) as archive:
+                timestamps = archive['timestamp']
+                # Files are sorted by timestamp, so the window is one slice
+                window = slice(
+                    np.searchsorted(timestamps, low, side='left'),
+                    np.searchsorted(timestamps, high, side='right'),
+                )
+                selected = np.zeros(len(timestamps), dtype=bool)
+                selected[window] = True
+                if mask is not None:
+                    selected &= mask(archive)
+                for name, values in read_columns(archive, names).items():
+                    parts[name].append(values[selected])
+        month = add_months(month, 1)
+
+    columns = {
+        name: np.concatenate(values) if values else np.empty(0)
+        for name, values in parts.items()
+    }
+    columns['timestamp'] = columns['timestamp'].astype(np.float64) / 1e6
+    return columns
+
+
+def archived_readings(start, end, data_types=None, names=('value',)):
+    """Archived readings in a window, optionally for some data types only"""
+    def mask(archive):
+        labels = archive['data_type__labels']
+        return np.isin(labels, list(data_types))[archive['data_type']]
+
+    return load_archived('climate_data', start, end, names, mask if data_types else None)
+
+
+def archived_metrics(start, end):
+    names = [name for name in ARCHIVE_FIELDS['system_metrics'] if name != 'id']
+    return load_archived('system_metrics', start, end, names)
+
+
+def source_uuids(labels):
+    """UUIDs for archived ``data_source_id`` strings, parsed once per distinct value"""
+    parsed = {label: uuid.UUID(label) for label in set(labels.tolist())}
+    return [parsed[label] for label in labels.tolist()]
@@ -0,0 +1,295 @@
+"""
+Hourly and daily ClimateData rollups.
+
+Each rollup row holds count/min/max/mean/sum-of-squares for one
+(data_source, data_type, bucket). New readings are merged in incrementally
+through the ``readings_ingested`` signal; ``rebuild_rollups`` recomputes a
+time range from raw rows and sealed chunks for backfills or after edits
+and deletes.
+"""
+import logging
+from itertools import product
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, BigIntegerField, Count, ExpressionWrapper, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .chunks import CHUNK_BATCH_SIZE, decode_chunk
+from .fields import EpochDateTimeField, from_epoch_micros
+from .models import ClimateDataChunk, ClimateDataRollup
+from .partitions import readings as partitioned_readings
+from .pyramid import clear_tiles
+from .retention import retention_cutoff
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_RESOLUTIONS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+# Rows per bulk write while rebuilding
+REBUILD_BATCH_SIZE = 2000
+
+
+def bucket_start(timestamp, resolution):
+    """Truncate an aware datetime to the start of its UTC hour or day"""
+    timestamp = timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def bucket_expression(resolution):
+    """SQL for the start of a reading's UTC hour or day; timestamps are epoch microseconds"""
+    width = ROLLUP_RESOLUTIONS[resolution] // timedelta(microseconds=1)
+    offset = ExpressionWrapper(F('timestamp') % width, output_field=BigIntegerField())
+    return ExpressionWrapper(F('timestamp') - offset, output_field=EpochDateTimeField())
+
+
+def summarise_readings(readings, resolutions=ROLLUP_RESOLUTIONS):
+    """Group readings into partial aggregates keyed by rollup bucket"""
+    partials = {}
+    for reading in readings:
+        value = reading.value
+        for resolution in resolutions:
+            key = (resolution, reading.data_source_id, reading.data_type,
+                   bucket_start(reading.timestamp, resolution))
+            partial = partials.get(key)
+            if partial is None:
+                partials[key] = [1, value, value, value, value * value]
+            else:
+                partial[0] += 1
+                partial[1] = min(partial[1], value)
+                partial[2] = max(partial[2], value)
+                partial[3] += value
+                partial[4] += value * value
+    return partials
+
+
+def summarise_chunk(chunk, resolutions=ROLLUP_RESOLUTIONS):
+    """Partial aggregates, keyed like ``summarise_readings``, of a sealed chunk"""
+    columns = decode_chunk(chunk, ('timestamp', 'value'))
+    timestamps, values = columns['timestamp'], columns['value']
+    partials = {}
+    for resolution in resolutions:
+        width = ROLLUP_RESOLUTIONS[resolution] // timedelta(microseconds=1)
+        buckets, inverse = np.unique(timestamps - timestamps % width, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(buckets))
+        totals = np.bincount(inverse, weights=values, minlength=len(buckets))
+        squares = np.bincount(inverse, weights=values * values, minlength=len(buckets))
+        lows = np.full(len(buckets), np.inf)
+        highs = np.full(len(buckets), -np.inf)
+        np.minimum.at(lows, inverse, values)
+        np.maximum.at(highs, inverse, values)
+        stats = zip(buckets.tolist(), counts.tolist(), lows.tolist(), highs.tolist(), totals.tolist(), squares.tolist())
+        for bucket, *partial in stats:
+            partials[(resolution, chunk.data_source_id, chunk.data_type, from_epoch_micros(bucket))] = partial
+    return partials
+
+
+def update_rollups(readings):
+    """Merge a batch of newly stored readings into the rollup tables"""
+    merge_partials(summarise_readings(readings))
+
+
+def merge_partials(partials):
+    """
+    Add partial aggregates to their rollup rows, creating missing ones;
+    returns the number of rows written.
+
+    The merge is a single upsert evaluated by the database against the
+    current row, so concurrent ingests cannot overwrite each other's counts.
+    """
+    if not partials:
+        return 0
+
+    meta = ClimateDataRollup._meta
+    quote = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in (
+        'resolution', 'data_source', 'data_type', 'bucket', 'count',
+        'min_value', 'max_value', 'mean_value', 'sum_squares', 'updated_at',
+    )]
+    table = quote(meta.db_table)
+    name = {field.name: quote(field.column) for field in fields}
+    # Current row and incoming partial, as seen inside ON CONFLICT DO UPDATE
+    old = {field: f"{table}.{column}" for field, column in name.items()}
+    new = {field: f"excluded.{column}" for field, column in name.items()}
+    merged_count = f"{old['count']} + {new['count']}"
+    merged_total = f"{old['mean_value']} * {old['count']} + {new['mean_value']} * {new['count']}"
+    merged_low = f"CASE WHEN {new['min_value']} < {old['min_value']} THEN {new['min_value']} ELSE {old['min_value']} END"
+    merged_high = f"CASE WHEN {new['max_value']} > {old['max_value']} THEN {new['max_value']} ELSE {old['max_value']} END"
+    sql = f"""
+        INSERT INTO {table} ({', '.join(name.values())}) VALUES ({', '.join(['%s'] * len(fields))})
+        ON CONFLICT ({name['resolution']}, {name['data_source']}, {name['data_type']}, {name['bucket']})
+        DO UPDATE SET
+            {name['count']} = {merged_count},
+            {name['mean_value']} = ({merged_total}) / ({merged_count}),
+            {name['min_value']} = {merged_low},
+            {name['max_value']} = {merged_high},
+            {name['sum_squares']} = {old['sum_squares']} + {new['sum_squares']},
+            {name['updated_at']} = {new['updated_at']}
+    """
+
+    now = timezone.now()
+    rows = [
+        [
+            field.get_db_prep_save(value, connection)
+            for field, value in zip(fields, (*key, count, low, high, total / count, squares, now))
+        ]
+        for key, (count, low, high, total, squares) in partials.items()
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(rows)
+
+
+def rebuild_rollups(start=None, end=None, resolutions=tuple(ROLLUP_RESOLUTIONS)):
+    """
+    Recompute rollups from raw ClimateData and sealed chunks.
+
+    ``start``/``end`` are widened to whole UTC days so no bucket is left
+    half-counted. Days before the retention cutoff are left alone, since
+    their readings may already be archived. Chart pyramid tiles over the
+    range are cleared along with hourly rollups. Returns the number of
+    rollup rows written.
+    """
+    floor = bucket_start(retention_cutoff(), 'day') + ROLLUP_RESOLUTIONS['day']
+    start = max(bucket_start(start, 'day'), floor) if start is not None else floor
+    if end is not None:
+        end = bucket_start(end, 'day') + ROLLUP_RESOLUTIONS['day']
+
+    readings = partitioned_readings()
+    rollups = ClimateDataRollup.objects.filter(resolution__in=resolutions)
+    chunks = ClimateDataChunk.objects.filter(day__gte=start.date())
+    readings = readings.filter(timestamp__gte=start)
+    rollups = rollups.filter(bucket__gte=start)
+    if end is not None:
+        chunks = chunks.filter(day__lt=end.date())
+        readings = readings.filter(timestamp__lt=end)
+        rollups = rollups.filter(bucket__lt=end)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        # Partitions are whole UTC months, so no bucket spans two of them
+        for resolution, partition in product(resolutions, readings.querysets):
+            rows = partition.annotate(
+                bucket=bucket_expression(resolution),
+            ).values('data_source_id', 'data_type', 'bucket').annotate(
+                count=Count('id'),
+                min_value=Min('value'),
+                max_value=Max('value'),
+                mean_value=Avg('value'),
+                sum_squares=Sum(F('value') * F('value')),
+            ).order_by()
+
+            batch = []
+            for row in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+                batch.append(ClimateDataRollup(resolution=resolution, **row))
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    ClimateDataRollup.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            if batch:
+                ClimateDataRollup.objects.bulk_create(batch)
+                written += len(batch)
+
+        # Sealed days come from their chunks, merged with any late rows above
+        partials = {}
+        for chunk in chunks.iterator(chunk_size=CHUNK_BATCH_SIZE):
+            partials.update(summarise_chunk(chunk, resolutions))
+            if len(partials) >= REBUILD_BATCH_SIZE:
+                written += merge_partials(partials)
+                partials = {}
+        written += merge_partials(partials)
+        if 'hour' in resolutions:
+            clear_tiles(start, end)
+
+    logger.info(f"Rebuilt {written} climate data rollups")
+    return written
+
+
+def choose_resolution(window):
+    """Coarsest rollup resolution that still gives CHART_MIN_POINTS buckets"""
+    min_points = settings.CLIMATE_DATA_SETTINGS.get('CHART_MIN_POINTS', 100)
+    for resolution in ('day', 'hour'):
+        if window / ROLLUP_RESOLUTIONS[resolution] >= min_points:
+            return resolution
+    return None
+
+
+def rollup_series(data_type, start, end, resolution, source_id=None, changed_since=None):
+    """
+    Per-bucket statistics for one data type, merged across sources.
+
+    With ``changed_since`` only buckets written after that moment are
+    returned, each recomputed in full. Returns a list of dicts with bucket,
+    count, mean, min and max.
+    """
+    rollups = ClimateDataRollup.objects.filter(
+        resolution=resolution,
+        data_type=data_type,
+        bucket__gte=bucket_start(start, resolution),
+        bucket__lte=end,
+    )
+    if source_id:
+        rollups = rollups.filter(data_source_id=source_id)
+    if changed_since is not None:
+        changed = rollups.filter(updated_at__gt=changed_since).values('bucket')
+        rollups = rollups.filter(bucket__in=changed)
+
+    rows = rollups.values('bucket').annotate(
+        total=Sum('count'),
+        weighted=Sum(F('mean_value') * F('count')),
+        low=Min('min_value'),
+        high=Max('max_value'),
+    ).order_by('bucket')
+
+    return [
+        {
+            'bucket': row['bucket'],
+            'count': row['total'],
+            'mean': row['weighted'] / row['total'],
+            'min': row['low'],
+            'max': row['high'],
+        }
+        for row in rows if row['total']
+    ]
+
+
+def rollup_summary():
+    """Dashboard totals computed from the daily rollups"""
+    summary = ClimateDataRollup.objects.filter(resolution='day').aggregate(
+        total_records=Sum('count'),
+        temperature_count=Sum('count', filter=Q(data_type='temperature')),
+        temperature_total=Sum(F('mean_value') * F('count'), filter=Q(data_type='temperature')),
+        max_co2=Max('max_value', filter=Q(data_type='co2_level')),
+    )
+    temperature_count = summary.pop('temperature_count')
+    temperature_total = summary.pop('temperature_total')
+    summary['total_records'] = summary['total_records'] or 0
+    summary['avg_temperature'] = temperature_total / temperature_count if temperature_count else None
+    return summary
+
+
+def approximate_count(data_type=None, source_id=None, start=None, end=None):
+    """
+    Estimate the number of raw readings from the daily rollups.
+
+    Day buckets overlapping ``start``/``end`` are counted whole, so the
+    figure can overshoot partial days at either edge.
+    """
+    rollups = ClimateDataRollup.objects.filter(resolution='day')
+    if data_type:
+        rollups = rollups.filter(data_type=data_type)
+    if source_id:
+        rollups = rollups.filter(data_source_id=source_id)
+    if start:
+        rollups = rollups.filter(bucket__gte=bucket_start(start, 'day'))
+    if end:
+        rollups = rollups.filter(bucket__lte=end)
+    return rollups.aggregate(total=Sum('count'))['total'] or 0
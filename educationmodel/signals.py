@@ -0,0 +1,102 @@
+"""
+Signals for keeping derived climate data (rollups, chart pyramid tiles,
+streaming anomaly state) in step with new readings, data source geohashes in step with their
+locations, and for invalidating cached dashboard statistics
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from .clustering import MAP_SOURCE_FIELDS, SOURCES_VERSION_KEY
+from .models import ClimateAlert, ClimateData, ClimateUser, DataSource, RasterScene
+from .partitions import delete_source_readings
+from .pyramid import clear_tiles, invalidate_tiles
+from .rasters import delete_scene_file
+from .rollups import update_rollups
+from .spatial import encode_geohash
+from .stats import (
+    ALERT_STATS_FIELDS, ALERT_STATS_KEY, DATA_SOURCE_STATS_FIELDS, DATA_SOURCE_STATS_KEY,
+    USER_STATS_FIELDS, USER_STATS_KEY, invalidate_stats,
+)
+from .streaming_anomaly import fold_readings, score_readings, scorer
+
+# Sent with ``readings`` (a list of stored ClimateData) whenever new rows are
+# written, whether one at a time or through bulk ingestion
+readings_ingested = Signal()
+
+
+@receiver(pre_save, sender=ClimateData)
+def score_new_climate_data(sender, instance, raw=False, **kwargs):
+    if instance._state.adding and not raw:
+        score_readings([instance])
+
+
+@receiver(post_save, sender=ClimateData)
+def climate_data_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        readings_ingested.send(sender=ClimateData, readings=[instance])
+
+
+@receiver(readings_ingested)
+def update_rollups_on_ingest(sender, readings, **kwargs):
+    update_rollups(readings)
+
+
+@receiver(readings_ingested)
+def fold_streaming_anomaly_state(sender, readings, **kwargs):
+    fold_readings(readings)
+
+
+@receiver(readings_ingested)
+def invalidate_chart_pyramid(sender, readings, **kwargs):
+    invalidate_tiles(readings)
+
+
+@receiver(post_save, sender=ClimateUser)
+@receiver(post_delete, sender=ClimateUser)
+def invalidate_user_stats(sender, update_fields=None, **kwargs):
+    invalidate_stats(USER_STATS_KEY, update_fields, USER_STATS_FIELDS)
+
+
+@receiver(pre_save, sender=DataSource)
+def set_data_source_geohash(sender, instance, **kwargs):
+    instance.geohash = encode_geohash(instance.location_lat, instance.location_lon)
+
+
+@receiver(pre_delete, sender=DataSource)
+def delete_archived_source_readings(sender, instance, **kwargs):
+    delete_source_readings(instance.pk)
+
+
+@receiver(post_delete, sender=DataSource)
+def clear_chart_pyramid(sender, **kwargs):
+    # The source's rollups are gone, so every tile may include them
+    clear_tiles()
+
+
+@receiver(post_delete, sender=DataSource)
+def forget_streaming_anomaly_state(sender, instance, **kwargs):
+    scorer.forget_source(instance.pk)
+
+
+@receiver(post_delete, sender=RasterScene)
+def raster_scene_deleted(sender, instance, **kwargs):
+    delete_scene_file(instance)
+
+
+@receiver(post_save, sender=DataSource)
+@receiver(post_delete, sender=DataSource)
+def invalidate_data_source_stats(sender, update_fields=None, **kwargs):
+    invalidate_stats(DATA_SOURCE_STATS_KEY, update_fields, DATA_SOURCE_STATS_FIELDS)
+
+
+@receiver(post_save, sender=DataSource)
+@receiver(post_delete, sender=DataSource)
+def invalidate_map_tiles(sender, update_fields=None, **kwargs):
+    # A new sources version moves every cached map tile to a fresh key
+    invalidate_stats(SOURCES_VERSION_KEY, update_fields, MAP_SOURCE_FIELDS)
+
+
+@receiver(post_save, sender=ClimateAlert)
+@receiver(post_delete, sender=ClimateAlert)
+def invalidate_alert_stats(sender, update_fields=None, **kwargs):
+    invalidate_stats(ALERT_STATS_KEY, update_fields, ALERT_STATS_FIELDS)
@@ -0,0 +1,199 @@
+"""
+Spatial lookups for DataSource locations.
+
+Every source stores the geohash of its location in an indexed column (set
+by a pre_save signal). A geohash prefix is a lat/lon cell, and every
+location inside a cell has a geohash starting with that prefix, so a cell
+is one range scan on the index. A query region is covered by at most
+MAX_COVER_CELLS cells of the finest precision that still fits. Runs of
+adjacent cells are merged into a single range, and the exact bounds are
+then applied to the few rows those ranges return. Viewport, radius and
+nearest-neighbour lookups therefore read only nearby rows rather than
+every source.
+
+- ``sources_in_bbox``: sources inside a lat/lon box (may cross the antimeridian).
+- ``sources_within``: sources within a great-circle radius, nearest first.
+- ``nearest_sources``: the ``k`` nearest sources, found by widening a radius.
+"""
+import math
+
+from django.db.models import Q
+
+from .models import DataSource
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+
+# Upper bound on index ranges scanned per bounding box
+MAX_COVER_CELLS = 32
+
+EARTH_RADIUS_KM = 6371.0088
+HALF_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM
+
+# First radius tried by nearest_sources; it grows 4x until k sources are found
+NEAREST_START_RADIUS_KM = 25.0
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash of a location, alternating longitude and latitude bits"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, code, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, value = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        code <<= 1
+        if value >= middle:
+            code |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[code])
+            bits, code = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """``(lat_height, lon_width)`` in degrees of a geohash cell"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def cell_span(low, high, size, origin):
+    """Indexes of the first and last cell of width ``size`` touching [low, high]"""
+    first = int((low - origin) // size)
+    last = int((high - origin) // size)
+    limit = int(round(-2 * origin / size)) - 1
+    return max(first, 0), min(last, limit)
+
+
+def grid_spans(south, west, north, east, precision):
+    """Row and column index spans of the cells of ``precision`` touching a box"""
+    height, width = cell_size(precision)
+    return cell_span(south, north, height, -90.0), cell_span(west, east, width, -180.0)
+
+
+def span_count(rows, columns):
+    return (rows[1] - rows[0] + 1) * (columns[1] - columns[0] + 1)
+
+
+def box_cells(south, west, north, east, precision):
+    """Sorted geohash prefixes of length ``precision`` touching a box with ``west <= east``"""
+    height, width = cell_size(precision)
+    rows, columns = grid_spans(south, west, north, east, precision)
+    return sorted(
+        encode_geohash(-90.0 + (row + 0.5) * height, -180.0 + (column + 0.5) * width, precision)
+        for row in range(rows[0], rows[1] + 1)
+        for column in range(columns[0], columns[1] + 1)
+    )
+
+
+def cover_cells(south, west, north, east):
+    """Geohash prefixes whose cells cover a box with ``west <= east``"""
+    chosen = None
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        if span_count(*grid_spans(south, west, north, east, precision)) > MAX_COVER_CELLS:
+            break
+        chosen = precision
+    if chosen is None:
+        # The box spans more than MAX_COVER_CELLS top-level cells
+        return sorted(BASE32)
+    return box_cells(south, west, north, east, chosen)
+
+
+def cell_number(cell):
+    number = 0
+    for char in cell:
+        number = number * 32 + BASE32.index(char)
+    return number
+
+
+def cell_ranges(cells):
+    """Merge sorted same-length prefixes into ``(first, last)`` runs of adjacent cells"""
+    runs = []
+    for cell in cells:
+        if runs and cell_number(cell) == cell_number(runs[-1][1]) + 1:
+            runs[-1][1] = cell
+        else:
+            runs.append([cell, cell])
+    return [tuple(run) for run in runs]
+
+
+def split_antimeridian(west, east):
+    """Longitude intervals of a box, two when it crosses the antimeridian"""
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+def bbox_filter(south, west, north, east):
+    """Q selecting sources inside a box through geohash ranges plus exact bounds"""
+    lookup = Q()
+    for low, high in split_antimeridian(west, east):
+        ranges = Q()
+        for first, last in cell_ranges(cover_cells(south, low, north, high)):
+            # Every geohash with a prefix from first to last sorts below last + '~'
+            ranges |= Q(geohash__gte=first, geohash__lt=last + '~')
+        lookup |= ranges & Q(location_lon__gte=low, location_lon__lte=high)
+    return lookup & Q(location_lat__gte=south, location_lat__lte=north)
+
+
+def sources_in_bbox(south, west, north, east, queryset=None):
+    """Sources inside a box; ``west > east`` means it crosses the antimeridian"""
+    queryset = DataSource.objects.all() if queryset is None else queryset
+    return queryset.filter(bbox_filter(south, west, north, east))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat, lon, radius_km):
+    """``(south, west, north, east)`` enclosing a circle, widened at the poles"""
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = lat - delta_lat, lat + delta_lat
+    if south <= -90.0 or north >= 90.0:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+    if ratio >= 1.0 or radius_km >= HALF_CIRCUMFERENCE_KM / 2:
+        return south, -180.0, north, 180.0
+    delta_lon = math.degrees(math.asin(ratio))
+    west, east = lon - delta_lon, lon + delta_lon
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return south, west, north, east
+
+
+def sources_within(lat, lon, radius_km, queryset=None):
+    """``(source, distance_km)`` pairs within a radius, nearest first"""
+    candidates = sources_in_bbox(*radius_bbox(lat, lon, radius_km), queryset=queryset)
+    matches = [
+        (source, haversine_km(lat, lon, source.location_lat, source.location_lon))
+        for source in candidates
+    ]
+    return sorted(
+        [(source, distance) for source, distance in matches if distance <= radius_km],
+        key=lambda match: match[1],
+    )
+
+
+def nearest_sources(lat, lon, k, queryset=None):
+    """The ``k`` nearest sources as ``(source, distance_km)`` pairs"""
+    radius = NEAREST_START_RADIUS_KM
+    while True:
+        matches = sources_within(lat, lon, radius, queryset=queryset)
+        # Everything within the radius was read, so the first k are exact
+        if len(matches) >= k or radius >= HALF_CIRCUMFERENCE_KM:
+            return matches[:k]
+        radius = min(radius * 4, HALF_CIRCUMFERENCE_KM)
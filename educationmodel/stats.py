@@ -0,0 +1,88 @@
+"""
+Cached dashboard statistics.
+
+Each group of counters is computed with a single conditional-aggregate
+query and kept in Django's cache until a post_save/post_delete signal on
+the underlying model invalidates it (see ``signals.py``). The timeout is
+only a backstop for changes made with ``QuerySet.update()``, which does
+not send signals.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import ClimateAlert, ClimateUser, DataSource, UserRole
+
+USER_STATS_KEY = 'climate:stats:users'
+DATA_SOURCE_STATS_KEY = 'climate:stats:data_sources'
+ALERT_STATS_KEY = 'climate:stats:alerts'
+
+# Fields whose changes can move the cached counters, per model
+USER_STATS_FIELDS = frozenset({'role', 'is_active', 'is_active_session'})
+DATA_SOURCE_STATS_FIELDS = frozenset({'source_type', 'is_active'})
+ALERT_STATS_FIELDS = frozenset({'severity', 'is_active'})
+
+
+def get_stats_timeout():
+    return settings.CLIMATE_DATA_SETTINGS.get('STATS_CACHE_TIMEOUT', 300)
+
+
+def cached_stats(key, compute):
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        cache.set(key, stats, get_stats_timeout())
+    return stats
+
+
+def compute_user_stats():
+    return ClimateUser.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(is_active=True)),
+        inactive_users=Count('id', filter=Q(is_active=False)),
+        active_sessions=Count('id', filter=Q(is_active_session=True)),
+        admin_users=Count('id', filter=Q(role=UserRole.ADMINISTRATOR)),
+        analyst_users=Count('id', filter=Q(role=UserRole.ANALYST)),
+        viewer_users=Count('id', filter=Q(role=UserRole.VIEWER)),
+    )
+
+
+def compute_data_source_stats():
+    return DataSource.objects.aggregate(
+        total_sources=Count('id'),
+        active_sources=Count('id', filter=Q(is_active=True)),
+        satellite_sources=Count('id', filter=Q(source_type='satellite')),
+        weather_stations=Count('id', filter=Q(source_type='weather_station')),
+    )
+
+
+def compute_alert_stats():
+    counts = {
+        f'active_{severity}': Count('id', filter=Q(is_active=True, severity=severity))
+        for severity, _ in ClimateAlert.SEVERITY_LEVELS
+    }
+    return ClimateAlert.objects.aggregate(
+        total_alerts=Count('id'),
+        active_alerts=Count('id', filter=Q(is_active=True)),
+        **counts,
+    )
+
+
+def user_stats():
+    return cached_stats(USER_STATS_KEY, compute_user_stats)
+
+
+def data_source_stats():
+    return cached_stats(DATA_SOURCE_STATS_KEY, compute_data_source_stats)
+
+
+def alert_stats():
+    return cached_stats(ALERT_STATS_KEY, compute_alert_stats)
+
+
+def invalidate_stats(key, update_fields=None, watched_fields=None):
+    """Drop a cached group unless the save only touched unrelated fields"""
+    if update_fields is not None and watched_fields is not None:
+        if not watched_fields.intersection(update_fields):
+            return
+    cache.delete(key)
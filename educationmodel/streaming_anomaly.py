@@ -0,0 +1,232 @@
+"""
+Online anomaly scoring at ingest time.
+
+Each (data_source, data_type) series keeps a running count, mean and sum
+of squared deviations (Welford's algorithm) in memory, so a new reading is
+scored in O(1) before it is written and ``is_anomaly`` is set immediately.
+Scoring only reads the state; the readings are folded into it once their
+transaction has committed, so a failed insert leaves the state untouched.
+Readings created with ``is_anomaly`` or ``processed`` already set keep
+their flags. State is seeded from the daily rollups the first time a
+series is seen, persisted to AnomalySeriesState every
+STREAMING_STATE_FLUSH_INTERVAL seconds and at interpreter exit. Readings
+scored here are stored with ``processed=True`` so the batch detector
+leaves them alone.
+
+Every server process keeps its own copy of the state and writes it with
+an upsert, so two processes starting the same series do not conflict.
+With several processes the persisted row reflects whichever flushed last:
+a new process warm-starts from that copy, and each process scores against
+the readings it has seen itself. A failed flush is logged and retried at
+the next interval, and never fails ingestion; states of deleted sources
+are dropped.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import AnomalySeriesState, ClimateDataRollup, DataSource
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return settings.CLIMATE_DATA_SETTINGS.get('STREAMING_ANOMALY_DETECTION', True)
+
+
+class SeriesState:
+    """Welford accumulator for one series"""
+
+    __slots__ = ('count', 'mean', 'm2', 'pk', 'dirty')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, pk=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.pk = pk
+        self.dirty = False
+
+    def copy(self):
+        return SeriesState(self.count, self.mean, self.m2, pk=self.pk)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count > 1 else 0.0
+
+    def zscore(self, value):
+        std = self.std
+        if std > 1e-12:
+            return abs(value - self.mean) / std
+        return math.inf if abs(value - self.mean) > 1e-9 else 0.0
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.dirty = True
+
+
+class StreamingScorer:
+    """Process-wide registry of series states"""
+
+    def __init__(self):
+        self.states = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def get_state(self, source_id, data_type):
+        key = (source_id, data_type)
+        state = self.states.get(key)
+        if state is None:
+            state = self.load_state(source_id, data_type)
+            self.states[key] = state
+        return state
+
+    def load_state(self, source_id, data_type):
+        stored = AnomalySeriesState.objects.filter(
+            data_source_id=source_id, data_type=data_type,
+        ).first()
+        if stored is not None:
+            return SeriesState(stored.count, stored.mean, stored.m2, pk=stored.pk)
+
+        # First sighting: derive the state from the rollups instead of raw history
+        totals = ClimateDataRollup.objects.filter(
+            resolution='day', data_source_id=source_id, data_type=data_type,
+        ).aggregate(
+            readings=Sum('count'),
+            total=Sum(F('mean_value') * F('count')),
+            squares=Sum('sum_squares'),
+        )
+        count = totals['readings'] or 0
+        if not count:
+            return SeriesState()
+        mean = totals['total'] / count
+        state = SeriesState(count, mean, max(totals['squares'] - count * mean * mean, 0.0))
+        state.dirty = True
+        return state
+
+    def score(self, readings):
+        """Set is_anomaly/processed on unsaved readings without changing the state"""
+        config = settings.CLIMATE_DATA_SETTINGS
+        threshold = float(config.get('ANOMALY_THRESHOLD', 2.5))
+        min_history = int(config.get('ANOMALY_MIN_HISTORY', 10))
+
+        with self.lock:
+            scratch = {}
+            for reading in sorted(readings, key=lambda r: r.timestamp):
+                key = (reading.data_source_id, reading.data_type)
+                state = scratch.get(key)
+                if state is None:
+                    state = scratch[key] = self.get_state(*key).copy()
+                value = float(reading.value)
+                reading.is_anomaly = state.count >= min_history and state.zscore(value) > threshold
+                reading.processed = True
+                # Later readings of the batch are scored against the earlier ones
+                state.update(value)
+
+    def fold(self, readings):
+        """Add stored readings to their series' state"""
+        with self.lock:
+            for reading in sorted(readings, key=lambda r: r.timestamp):
+                self.get_state(reading.data_source_id, reading.data_type).update(float(reading.value))
+
+            interval = settings.CLIMATE_DATA_SETTINGS.get('STREAMING_STATE_FLUSH_INTERVAL', 60)
+            if time.monotonic() - self.last_flush >= interval:
+                self.flush_locked()
+
+    def forget_source(self, source_id):
+        with self.lock:
+            for key in [key for key in self.states if key[0] == source_id]:
+                del self.states[key]
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        dirty = [(key, state) for key, state in self.states.items() if state.dirty]
+        self.last_flush = time.monotonic()
+        if not dirty:
+            return
+
+        # A state whose source was deleted would violate the foreign key
+        existing = set(DataSource.objects.filter(
+            pk__in={source_id for (source_id, _), _ in dirty},
+        ).values_list('pk', flat=True))
+        for key, _ in dirty:
+            if key[0] not in existing:
+                del self.states[key]
+        dirty = [(key, state) for key, state in dirty if key[0] in existing]
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        for (source_id, data_type), state in dirty:
+            row = AnomalySeriesState(
+                pk=state.pk, data_source_id=source_id, data_type=data_type,
+                count=state.count, mean=state.mean, m2=state.m2, updated_at=now,
+            )
+            (to_update if state.pk else to_create).append((row, state))
+
+        try:
+            with transaction.atomic():
+                pks = {}
+                if to_create:
+                    # Another process may have started the same series since we loaded it
+                    AnomalySeriesState.objects.bulk_create(
+                        [row for row, _ in to_create], update_conflicts=True,
+                        unique_fields=['data_source', 'data_type'],
+                        update_fields=['count', 'mean', 'm2', 'updated_at'],
+                    )
+                    pks = {
+                        (source_id, data_type): pk
+                        for pk, source_id, data_type in AnomalySeriesState.objects.filter(
+                            data_source_id__in={row.data_source_id for row, _ in to_create},
+                            data_type__in={row.data_type for row, _ in to_create},
+                        ).values_list('pk', 'data_source_id', 'data_type')
+                    }
+                if to_update:
+                    AnomalySeriesState.objects.bulk_update(
+                        [row for row, _ in to_update], ['count', 'mean', 'm2', 'updated_at'],
+                    )
+        except DatabaseError as e:
+            logger.error(f"Could not persist streaming anomaly state for {len(dirty)} series: {e}")
+            return
+
+        for row, state in to_create:
+            state.pk = pks.get((row.data_source_id, row.data_type))
+        for _, state in dirty:
+            state.dirty = False
+        logger.debug(f"Persisted streaming anomaly state for {len(dirty)} series")
+
+
+scorer = StreamingScorer()
+
+
+def score_readings(readings):
+    """Score unsaved readings whose anomaly flags the caller has not set"""
+    unscored = [reading for reading in readings if not (reading.is_anomaly or reading.processed)]
+    if is_enabled() and unscored:
+        scorer.score(unscored)
+
+
+def fold_readings(readings):
+    """Fold stored readings into the state once the current transaction commits"""
+    if is_enabled() and readings:
+        transaction.on_commit(lambda: scorer.fold(readings), robust=True)
+
+
+@atexit.register
+def flush_on_exit():
+    try:
+        scorer.flush()
+    except Exception as e:
+        logger.warning(f"Could not persist streaming anomaly state: {e}")
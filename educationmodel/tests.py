@@ -1,3 +1,1424 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (
+    AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.utils import timezone
+
+from . import retention
+from .alerting import COMMIT_GRACE, AlertEvaluator
+from .anomaly import detect_anomalies, rolling_zscores
+from .binary_series import BINARY_CONTENT_TYPE, HEADER, MAGIC, encode_series, wants_binary
+from .chunks import (
+    decode_chunk, decode_floats, decode_integers, encode_floats, encode_integers, seal_readings,
+)
+from .climate_views import parse_max_points
+from .clustering import cluster_viewport
+from .downsampling import downsample
+from .fields import UnitField, to_epoch_micros
+from .heatmap import grid_heatmap
+from .ingestion import ReadingValidationError, parse_timestamp, write_batch
+from .management.commands.import_climate_data import parse_chunk
+from .models import (
+    AlertEvaluatorState, AlertRule, AnomalySeriesState, ChartPyramidTile, ClimateAlert, ClimateData, ClimateDataChunk,
+    ClimateDataPartition, ClimateDataRollup, ClimateUser, DataSource, SystemMetrics,
+)
+from .partitions import archive_month, drop_partition, readings, total_readings
+from .pyramid import pyramid_series
+from .rasters import read_window, sample_points, scene_path, station_comparison, store_scene
+from .rollups import merge_partials, rebuild_rollups, summarise_readings
+from .spatial import encode_geohash, haversine_km, nearest_sources, sources_in_bbox, sources_within
+from .stats import alert_stats, data_source_stats
+from .streaming_anomaly import SeriesState, scorer
+
+
+def forget_units():
+    # UnitField caches ids per process, including ones a test rolled back
+    UnitField.ids.clear()
+    UnitField.symbols.clear()
+
+
+class ClimateTestCase(TestCase):
+
+    def tearDown(self):
+        # The test's transaction, and any unit it created, is about to be rolled back
+        forget_units()
+        super().tearDown()
+
+
+class ChunkCodecTests(SimpleTestCase):
+    """Sealing deletes the source rows, so the column codecs must be lossless"""
+
+    def assertIntegersRoundTrip(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        decoded = decode_integers(encode_integers(values), len(values))
+        np.testing.assert_array_equal(decoded, values)
+
+    def assertFloatsRoundTrip(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        decoded = decode_floats(encode_floats(values), len(values))
+        # Compare bit patterns so NaN payloads and the sign of zero count
+        np.testing.assert_array_equal(decoded.view(np.uint64), values.view(np.uint64))
+
+    def test_integers_regular_series(self):
+        start = to_epoch_micros(datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertIntegersRoundTrip(start + np.arange(1440) * 60_000_000)
+
+    def test_integers_negative_deltas(self):
+        self.assertIntegersRoundTrip([100, 50, -20, -20, 7, -1_000_000_000_000, 3, 2, 1, 0])
+
+    def test_integers_extremes(self):
+        info = np.iinfo(np.int64)
+        self.assertIntegersRoundTrip([0, info.max // 4, info.min // 4, 1, -1])
+
+    def test_integers_random(self):
+        rng = np.random.default_rng(0)
+        self.assertIntegersRoundTrip(rng.integers(-2**40, 2**40, size=5000))
+
+    def test_single_value(self):
+        self.assertIntegersRoundTrip([1_700_000_000_000_000])
+        self.assertFloatsRoundTrip([21.5])
+
+    def test_floats_special_values(self):
+        self.assertFloatsRoundTrip([
+            1.0, np.nan, -0.0, 0.0, -0.0, np.inf, -np.inf, np.nan, 5e-324, -1.7976931348623157e308, 1.0,
+        ])
+
+    def test_floats_random(self):
+        rng = np.random.default_rng(1)
+        self.assertFloatsRoundTrip(rng.normal(15, 10, size=5000))
+
+
+class DownsampleTests(SimpleTestCase):
+
+    def test_short_series_is_unchanged(self):
+        series = downsample([1, 2, 3], [5, 6, 7], 10)
+        self.assertEqual(series['y'].tolist(), [5, 6, 7])
+        self.assertIsNone(series['counts'])
+
+    def test_long_series_keeps_ends_spikes_and_envelope(self):
+        x = np.arange(10000, dtype=np.float64)
+        y = np.sin(x / 500)
+        y[4321], y[7000] = 25.0, -30.0
+        series = downsample(x, y, 100)
+
+        self.assertEqual(len(series['x']), 100)
+        self.assertEqual((series['x'][0], series['x'][-1]), (0, 9999))
+        self.assertTrue(np.all(np.diff(series['x']) > 0))
+        self.assertIn(4321, series['x'])
+        self.assertIn(7000, series['x'])
+        self.assertEqual(series['counts'].sum(), 10000)
+        self.assertEqual((series['low'].min(), series['high'].max()), (-30.0, 25.0))
+
+    def test_max_points_is_clamped(self):
+        factory = RequestFactory()
+        cap = settings.CLIMATE_DATA_SETTINGS.get('CHART_MAX_POINTS', 2000)
+        for raw, expected in (('', cap), ('1', 3), ('250.7', 250), ('1e9', cap), ('inf', cap)):
+            self.assertEqual(parse_max_points(factory.get('/', {'max_points': raw})), expected, raw)
+        for raw in ('many', 'nan'):
+            with self.assertRaises(ValueError):
+                parse_max_points(factory.get('/', {'max_points': raw}))
+
+
+class RollingZscoreTests(SimpleTestCase):
+
+    def test_matches_direct_computation(self):
+        values = np.random.default_rng(7).normal(100, 5, 40)
+        history = np.random.default_rng(8).normal(100, 5, 6)
+        scores = rolling_zscores(values, history, window=10, min_history=4)
+
+        series = np.concatenate((history, values))
+        for i, value in enumerate(values):
+            previous = series[max(0, len(history) + i - 10):len(history) + i]
+            expected = abs(value - previous.mean()) / previous.std() if len(previous) >= 4 else 0.0
+            self.assertAlmostEqual(scores[i], expected, places=9)
+
+    def test_flat_window(self):
+        scores = rolling_zscores(np.array([5.0, 5.0, 6.0]), np.array([5.0] * 4), window=4, min_history=2)
+        self.assertEqual(scores.tolist(), [0.0, 0.0, float('inf')])
+
+
+class DetectAnomaliesTests(ClimateTestCase):
+
+    def setUp(self):
+        source = DataSource.objects.create(
+            name='Detection test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        values = np.random.default_rng(3).normal(20, 1, 60)
+        values[45] = 40.0
+        start = timezone.now() - timedelta(days=1)
+        ClimateData.objects.bulk_create(
+            ClimateData(
+                data_source=source, data_type='temperature', value=value, unit='°C',
+                timestamp=start + timedelta(minutes=i),
+            )
+            for i, value in enumerate(values.tolist())
+        )
+        self.spike = ClimateData.objects.get(value=40.0)
+
+    def flagged(self):
+        return list(ClimateData.objects.filter(is_anomaly=True).values_list('id', flat=True))
+
+    def test_chunked_run_flags_the_spike_and_resumes(self):
+        summary = detect_anomalies(chunk_size=7, threshold=6, window=20, min_history=10)
+        self.assertEqual((summary['processed'], summary['anomalies']), (60, 1))
+        self.assertEqual(self.flagged(), [self.spike.pk])
+        self.assertFalse(ClimateData.objects.filter(processed=False).exists())
+        self.assertEqual(detect_anomalies(threshold=6, window=20, min_history=10)['processed'], 0)
+
+    def test_chunk_size_does_not_change_scores(self):
+        scores = {}
+        for chunk_size in (1, 13, 1000):
+            ClimateData.objects.update(processed=False, is_anomaly=False)
+            detect_anomalies(chunk_size=chunk_size, threshold=1.5, window=20, min_history=10)
+            scores[chunk_size] = self.flagged()
+        self.assertEqual(scores[1], scores[1000])
+        self.assertEqual(scores[13], scores[1000])
+        self.assertIn(self.spike.pk, scores[1000])
+
+
+class SpatialTests(ClimateTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        points = np.column_stack((rng.uniform(-89, 89, 300), rng.uniform(-180, 180, 300)))
+        # Pin a few sources to the edges the cell cover has to handle
+        points[:4] = [[0.0, 179.9], [0.5, -179.9], [89.5, 10.0], [-0.01, -0.01]]
+        for i, (lat, lon) in enumerate(points.tolist()):
+            DataSource.objects.create(
+                name=f'Station {i}', source_type='sensor', location_lat=lat, location_lon=lon,
+                installation_date=timezone.now(),
+            )
+        self.sources = list(DataSource.objects.all())
+
+    def names(self, sources):
+        return {source.name for source in sources}
+
+    def test_geohash(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertTrue(all(source.geohash == encode_geohash(source.location_lat, source.location_lon)
+                            for source in self.sources))
+
+    def test_bbox_matches_brute_force(self):
+        for south, west, north, east in ((-10, -20, 35, 40), (-5, 170, 5, -170), (80, -180, 90, 180), (-1, -1, 0, 0)):
+            expected = {
+                source.name for source in self.sources
+                if south <= source.location_lat <= north and (
+                    west <= source.location_lon <= east if west <= east
+                    else source.location_lon >= west or source.location_lon <= east
+                )
+            }
+            self.assertEqual(self.names(sources_in_bbox(south, west, north, east)), expected, (south, west, north, east))
+
+    def test_radius_and_nearest_match_brute_force(self):
+        for lat, lon in ((0.2, 180.0), (45.0, 7.0), (88.0, -120.0)):
+            distances = sorted(
+                (haversine_km(lat, lon, source.location_lat, source.location_lon), source.name)
+                for source in self.sources
+            )
+            within = sources_within(lat, lon, 1500)
+            self.assertEqual(self.names(source for source, _ in within),
+                             {name for distance, name in distances if distance <= 1500})
+            self.assertEqual([distance for _, distance in within], sorted(distance for _, distance in within))
+            nearest = nearest_sources(lat, lon, 5)
+            self.assertEqual([source.name for source, _ in nearest], [name for _, name in distances[:5]])
+
+
+class SourceClusterTests(ClimateTestCase):
+    world = {'south': -90, 'west': -180, 'north': 90, 'east': 180}
+
+    def setUp(self):
+        cache.clear()
+        self.sources = [
+            DataSource.objects.create(
+                name=f'Station {i}', source_type='sensor', location_lat=lat, location_lon=lon,
+                installation_date=timezone.now(),
+            )
+            for i, (lat, lon) in enumerate([(48.85, 2.35), (48.86, 2.34), (-33.9, 151.2), (40.7, -74.0)])
+        ]
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        for source, mean in zip(self.sources[:2], (10.0, 14.0)):
+            ClimateDataRollup.objects.create(
+                resolution='hour', data_source=source, data_type='temperature', bucket=hour,
+                count=1, min_value=mean, max_value=mean, mean_value=mean, sum_squares=mean * mean,
+            )
+        viewer = ClimateUser.objects.create_user('map-viewer', 'm@example.com', 'pw', role='viewer')
+        self.client.force_login(viewer)
+
+    def clusters(self, zoom, **params):
+        response = self.client.get('/api/sources/clusters/', {**self.world, 'zoom': zoom, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_zoom_splits_clusters(self):
+        world = self.clusters(0)
+        self.assertEqual(world['total'], 4)
+        paris = self.clusters(12, south=48.8, west=2.3, north=48.9, east=2.4)
+        self.assertEqual(sorted(cluster['count'] for cluster in paris['clusters']), [1, 1])
+        self.assertEqual(
+            {cluster['source_id'] for cluster in paris['clusters']},
+            {str(source.pk) for source in self.sources[:2]},
+        )
+
+    def test_cluster_values_are_latest_means(self):
+        body = self.clusters(3, south=40, west=-10, north=55, east=10, data_type='temperature')
+        (paris,) = [cluster for cluster in body['clusters'] if cluster['count'] == 2]
+        self.assertEqual((paris['value'], paris['reporting']), (12.0, 2))
+
+    def test_tiles_are_cached_until_a_source_moves(self):
+        sources = DataSource.objects.filter(is_active=True)
+        first = cluster_viewport(sources, -90, -180, 90, 180, 2)
+        again = cluster_viewport(sources, -90, -180, 90, 180, 2)
+        self.assertEqual(again['cached_tiles'], len(again['tiles']))
+        self.assertEqual(again['clusters'], first['clusters'])
+
+        moved = self.sources[3]
+        moved.location_lat, moved.location_lon = -33.8, 151.1
+        moved.save()
+        after = cluster_viewport(sources, -90, -180, 90, 180, 2)
+        self.assertEqual(after['cached_tiles'], 0)
+        self.assertIn(2, [cluster['count'] for cluster in after['clusters']])
+
+
+class DashboardStatsTests(ClimateTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.source = DataSource.objects.create(
+            name='Stats test', source_type='satellite', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+
+    def test_saves_invalidate_and_unrelated_fields_do_not(self):
+        self.assertEqual(data_source_stats()['satellite_sources'], 1)
+        with self.assertNumQueries(0):
+            data_source_stats()
+
+        self.source.name = 'Renamed'
+        self.source.save(update_fields=['name'])
+        with self.assertNumQueries(0):
+            data_source_stats()
+
+        self.source.is_active = False
+        self.source.save(update_fields=['is_active'])
+        self.assertEqual(data_source_stats()['active_sources'], 0)
+
+    def test_alert_changes_invalidate(self):
+        self.assertEqual(alert_stats()['active_alerts'], 0)
+        alert = ClimateAlert.objects.create(
+            alert_type='air_quality', severity='critical', title='Smoke', description='', data_source=self.source,
+        )
+        self.assertEqual((alert_stats()['active_alerts'], alert_stats()['active_critical']), (1, 1))
+        alert.delete()
+        self.assertEqual(alert_stats()['total_alerts'], 0)
+
+
+def decode_series(payload):
+    """Python mirror of static/js/timeseries.js"""
+    magic, count, extras, meta_length, base = HEADER.unpack_from(payload)
+    offset = HEADER.size
+    meta = json.loads(payload[offset:offset + meta_length])
+    offset += meta_length
+    deltas = np.frombuffer(payload, '<i4', count, offset)
+    columns = [np.frombuffer(payload, '<f4', count, offset + 4 * count * (i + 1)) for i in range(1 + extras)]
+    return magic, base + np.cumsum(deltas), columns, meta
+
+
+class BinarySeriesTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        x = [1700000000.2, 1700000060.0, 1700003600.6]
+        payload = encode_series(x, [1.5, -2.25, 3.0], {'unit': '°C'}, [('counts', [1, 2, 3])])
+        magic, seconds, (values, counts), meta = decode_series(payload)
+
+        self.assertEqual(magic, MAGIC)
+        self.assertEqual(seconds.tolist(), [1700000000, 1700000060, 1700003601])
+        self.assertEqual(values.tolist(), [1.5, -2.25, 3.0])
+        self.assertEqual(counts.tolist(), [1, 2, 3])
+        self.assertEqual(meta, {'unit': '°C', 'extras': ['counts']})
+        # Every section stays 4-byte aligned for typed-array views
+        meta_length = HEADER.unpack_from(payload)[3]
+        self.assertEqual((HEADER.size % 4, meta_length % 4), (0, 0))
+        self.assertEqual(len(payload), HEADER.size + meta_length + 3 * 4 * 3)
+
+    def test_empty_series(self):
+        magic, seconds, (values,), meta = decode_series(encode_series([], [], {}))
+        self.assertEqual((len(seconds), len(values), meta), (0, 0, {'extras': []}))
+
+    def test_negotiation(self):
+        factory = RequestFactory()
+        self.assertTrue(wants_binary(factory.get('/', {'format': 'binary'})))
+        self.assertTrue(wants_binary(factory.get('/', HTTP_ACCEPT=f'{BINARY_CONTENT_TYPE}, */*')))
+        self.assertFalse(wants_binary(factory.get('/', HTTP_ACCEPT='application/json')))
+
+
+class SealReadingsTests(ClimateTestCase):
+
+    def setUp(self):
+        self.source = DataSource.objects.create(
+            name='Seal test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        self.day = date(2024, 3, 5)
+        self.day_start = datetime(2024, 3, 5, tzinfo=dt_timezone.utc)
+        self.cutoff = datetime(2024, 3, 10, tzinfo=dt_timezone.utc)
+
+    def add_readings(self, minutes, values, data_type='temperature'):
+        for minute, value in zip(minutes, values):
+            ClimateData.objects.create(
+                data_source=self.source, data_type=data_type, value=value, unit='°C',
+                timestamp=self.day_start + timedelta(minutes=minute),
+                quality_score=0.5 if value < 0 else 1.0, is_anomaly=value > 30,
+            )
+
+    def snapshot(self, data_type='temperature'):
+        """Sealable columns of the series' rows, sorted as a chunk stores them"""
+        rows = ClimateData.objects.filter(data_type=data_type).order_by('timestamp', 'id')
+        return [
+            (row.id, to_epoch_micros(row.timestamp), to_epoch_micros(row.created_at), row.value,
+             row.quality_score, row.is_anomaly, row.processed)
+            for row in rows
+        ]
+
+    def chunk_rows(self, data_type='temperature'):
+        chunk = ClimateDataChunk.objects.get(data_source=self.source, data_type=data_type, day=self.day)
+        columns = decode_chunk(chunk)
+        names = ('id', 'timestamp', 'created_at', 'value', 'quality_score', 'is_anomaly', 'processed')
+        return chunk, list(zip(*(columns[name].tolist() for name in names)))
+
+    def test_seal_round_trips_and_deletes_rows(self):
+        # Out of order, with negative timestamp and value deltas
+        self.add_readings([600, 30, 1439, 0, 720, 45], [12.25, -3.5, 31.0, 0.0, -0.125, 12.25])
+        expected = self.snapshot()
+
+        self.assertEqual(seal_readings(self.cutoff), {self.day: 6})
+        chunk, rows = self.chunk_rows()
+        self.assertEqual(rows, expected)
+        self.assertEqual((chunk.count, chunk.unit), (6, '°C'))
+        self.assertEqual(chunk.start, self.day_start)
+        self.assertEqual(chunk.end, self.day_start + timedelta(minutes=1439))
+        self.assertFalse(ClimateData.objects.exists())
+
+    def test_single_row_chunk(self):
+        self.add_readings([90], [7.75], data_type='humidity')
+        expected = self.snapshot('humidity')
+
+        seal_readings(self.cutoff)
+        chunk, rows = self.chunk_rows('humidity')
+        self.assertEqual(rows, expected)
+        self.assertEqual(chunk.start, chunk.end)
+
+    def test_late_rows_merge_into_chunk(self):
+        self.add_readings([0, 60, 120], [1.0, 2.0, 3.0])
+        first = self.snapshot()
+        seal_readings(self.cutoff)
+
+        # Late readings land between, before and on top of sealed ones
+        self.add_readings([30, 60, 1200, 5], [1.5, 2.5, 40.0, -9.0])
+        late = self.snapshot()
+        self.assertEqual(seal_readings(self.cutoff), {self.day: 4})
+
+        chunk, rows = self.chunk_rows()
+        self.assertEqual(rows, sorted(first + late, key=lambda row: (row[1], row[0])))
+        self.assertEqual(chunk.count, 7)
+        self.assertEqual(ClimateDataChunk.objects.count(), 1)
+        self.assertFalse(ClimateData.objects.exists())
+
+
+class RetentionTests(ClimateTestCase):
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        config = {**settings.CLIMATE_DATA_SETTINGS, 'ARCHIVE_DIR': archive_dir.name}
+        self.enterContext(override_settings(CLIMATE_DATA_SETTINGS=config))
+        self.source = DataSource.objects.create(
+            name='Retention test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        self.cutoff = datetime(2024, 6, 1, tzinfo=dt_timezone.utc)
+        self.old = datetime(2024, 4, 10, tzinfo=dt_timezone.utc)
+
+    def add_reading(self, timestamp, value):
+        return ClimateData.objects.create(
+            data_source=self.source, data_type='temperature', value=value, unit='°C', timestamp=timestamp,
+        )
+
+    def add_metrics(self, timestamp, cpu_usage):
+        sample = SystemMetrics.objects.create(
+            cpu_usage=cpu_usage, memory_usage=50, disk_usage=40, network_io=1, active_users=3,
+            data_processing_rate=10,
+        )
+        SystemMetrics.objects.filter(pk=sample.pk).update(timestamp=timestamp)
+        return sample
+
+    def archive_then(self, action):
+        """Patch archive_queryset to run ``action`` once, right after the first archive is written"""
+        archive_queryset = retention.archive_queryset
+        pending = [action]
+
+        def archive_and_act(*args):
+            ids = archive_queryset(*args)
+            while pending:
+                pending.pop()()
+            return ids
+        return mock.patch.object(retention, 'archive_queryset', archive_and_act)
+
+    def test_archive_delete_round_trip(self):
+        for hour in range(48):
+            self.add_reading(self.old + timedelta(hours=hour), hour / 4)
+        kept = self.add_reading(self.cutoff + timedelta(days=1), 99.0)
+
+        summary = retention.enforce_climate_retention(self.cutoff)
+        self.assertEqual((summary['archived'], summary['deleted']), (48, 48))
+        self.assertEqual(list(ClimateData.objects.values_list('pk', flat=True)), [kept.pk])
+
+        archived = retention.archived_readings(self.old, self.cutoff, data_types=['temperature'])
+        np.testing.assert_array_equal(archived['value'], np.arange(48) / 4)
+        np.testing.assert_array_equal(
+            archived['timestamp'], [(self.old + timedelta(hours=hour)).timestamp() for hour in range(48)],
+        )
+
+    def test_reading_written_during_archive_survives(self):
+        self.add_reading(self.old, 1.0)
+        late = []
+        with self.archive_then(lambda: late.append(self.add_reading(self.old + timedelta(hours=1), 2.0))):
+            summary = retention.enforce_climate_retention(self.cutoff)
+
+        self.assertEqual((summary['archived'], summary['deleted']), (1, 1))
+        self.assertTrue(ClimateData.objects.filter(pk=late[0].pk).exists())
+
+        # The next run archives it before deleting it
+        self.assertEqual(retention.enforce_climate_retention(self.cutoff)['deleted'], 1)
+        archived = retention.archived_readings(self.old, self.cutoff)
+        self.assertEqual(archived['value'].tolist(), [1.0, 2.0])
+
+    def test_metrics_written_during_archive_survive(self):
+        self.add_metrics(self.old, 10.0)
+        late = []
+        with self.archive_then(lambda: late.append(self.add_metrics(self.old + timedelta(hours=1), 20.0))):
+            summary = retention.enforce_metrics_retention(self.cutoff)
+
+        self.assertEqual((summary['archived'], summary['deleted']), (1, 1))
+        self.assertTrue(SystemMetrics.objects.filter(pk=late[0].pk).exists())
+        self.assertEqual(retention.archived_metrics(self.old, self.cutoff)['cpu_usage'].tolist(), [10.0])
+
+
+class ParseTimestampTests(SimpleTestCase):
+
+    def test_valid_forms(self):
+        expected = datetime(2023, 11, 14, 22, 13, 20, tzinfo=dt_timezone.utc)
+        for raw in (1700000000, 1700000000.0, '1700000000', '2023-11-14T22:13:20Z', '2023-11-14 22:13:20'):
+            self.assertEqual(parse_timestamp(raw), expected, raw)
+
+    def test_invalid_values_are_validation_errors(self):
+        for raw in (
+            '2024-13-45T00:00:00', '9999-12-31T23:59:59-05:00', 'garbage', '', None, True,
+            1e20, '1e20', 10**20, float('nan'), 'nan', 'inf', -1e18,
+        ):
+            with self.assertRaises(ReadingValidationError, msg=repr(raw)):
+                parse_timestamp(raw)
+
+
+class ParseChunkTests(SimpleTestCase):
+    header = ['data_source', 'data_type', 'value', 'timestamp']
+
+    def parse(self, fmt, lines):
+        lines = [line.encode() + b'\n' for line in lines]
+        cleaned, errors = parse_chunk(fmt, self.header, 100, lines)
+        offsets = [100 + sum(len(line) for line in lines[:i]) for i in range(len(lines))]
+        return cleaned, [offsets.index(offset) for offset, _ in errors]
+
+    def test_malformed_csv_lines_are_errors(self):
+        cleaned, bad_lines = self.parse('csv', [
+            'src,temperature,12.5,2024-03-01T00:00:00Z',
+            'src,temperature,12.5,1e20',
+            'src,temperature,12.5,99999999999999999999',
+            'src,temperature,1e999,2024-03-01T00:00:00Z',
+            'src,temperature',
+            '',
+            'src,humidity,40,1709251200',
+        ])
+        self.assertEqual([fields['data_type'] for fields in cleaned], ['temperature', 'humidity'])
+        self.assertEqual(bad_lines, [1, 2, 3, 4])
+
+    def test_malformed_ndjson_lines_are_errors(self):
+        good = {'data_source': 'src', 'data_type': 'temperature', 'value': 1, 'timestamp': 1709251200}
+        cleaned, bad_lines = self.parse('ndjson', [
+            json.dumps(good),
+            '{"data_source": "src", "data_type": ',
+            json.dumps({**good, 'timestamp': 10**20}),
+            json.dumps({**good, 'value': 10**400}),
+            json.dumps({**good, 'data_type': ['temperature']}),
+            json.dumps([good]),
+            '[' * 100000,
+            json.dumps({**good, 'value': 2}),
+        ])
+        self.assertEqual([fields['value'] for fields in cleaned], [1.0, 2.0])
+        self.assertEqual(bad_lines, [1, 2, 3, 4, 5, 6])
+
+
+@override_settings(CLIMATE_DATA_SETTINGS={
+    **settings.CLIMATE_DATA_SETTINGS, 'INGEST_API_TOKENS': {'station-7': 's3cret', 'retired': ''},
+})
+class IngestApiTests(ClimateTestCase):
+    url = '/api/climate-data/ingest/'
+
+    def setUp(self):
+        self.source = DataSource.objects.create(
+            name='Ingest test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        self.client = Client(enforce_csrf_checks=True)
+
+    def reading(self, timestamp, value=12.5):
+        return {'data_source': str(self.source.pk), 'data_type': 'temperature', 'value': value, 'timestamp': timestamp}
+
+    def post(self, readings, **headers):
+        return self.client.post(self.url, json.dumps(readings), content_type='application/json', **headers)
+
+    def test_bearer_token_needs_no_session_or_csrf(self):
+        response = self.post([self.reading('2024-03-01T00:00:00Z')], HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual(ClimateData.objects.count(), 1)
+
+    def test_bad_tokens_are_rejected(self):
+        for header in ('Bearer wrong', 'Bearer ', 'Basic s3cret'):
+            with self.assertLogs('educationmodel.climate_views', 'WARNING'):
+                response = self.post([self.reading('2024-03-01T00:00:00Z')], HTTP_AUTHORIZATION=header)
+            self.assertEqual(response.status_code, 401, header)
+        self.assertFalse(ClimateData.objects.exists())
+
+    def test_session_upload_needs_csrf(self):
+        analyst = ClimateUser.objects.create_user('ingest-analyst', 'a@example.com', 'pw', role='analyst')
+        self.client.force_login(analyst)
+        self.assertEqual(self.post([self.reading('2024-03-01T00:00:00Z')]).status_code, 403)
+
+    def test_bad_rows_are_rejected_individually(self):
+        readings = [
+            self.reading('2024-03-01T00:00:00Z'),
+            self.reading('2024-13-45T00:00:00'),
+            self.reading(1e20),
+            self.reading('1e20'),
+            self.reading(10**20),
+            self.reading(1709251200, value='warm'),
+            self.reading('2024-03-01T01:00:00Z'),
+        ]
+        response = self.post(readings, HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual((summary['accepted'], summary['rejected']), (2, 5))
+        self.assertEqual([error['index'] for error in summary['batches'][0]['errors']], [1, 2, 3, 4, 5])
+        self.assertEqual(ClimateData.objects.count(), 2)
+
+
+class StreamingAnomalyTests(ClimateTestCase):
+
+    def setUp(self):
+        scorer.states.clear()
+        self.addCleanup(scorer.states.clear)
+        self.source = DataSource.objects.create(
+            name='Streaming test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        self.start = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+
+    def readings(self, values, offset=0):
+        return [
+            ClimateData(
+                data_source=self.source, data_type='temperature', value=value, unit='°C',
+                timestamp=self.start + timedelta(minutes=offset + minute),
+            )
+            for minute, value in enumerate(values)
+        ]
+
+    def state(self):
+        return scorer.states[(self.source.pk, 'temperature')]
+
+    def test_state_changes_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            write_batch(self.readings([10.0] * 20))
+        self.assertEqual(self.state().count, 20)
+
+        batch = self.readings([10.0, 50.0], offset=20)
+        with mock.patch.object(ClimateData.objects, 'bulk_create', side_effect=RuntimeError('insert failed')):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+                write_batch(batch)
+        self.assertEqual((self.state().count, self.state().mean), (20, 10.0))
+        self.assertTrue(batch[1].is_anomaly)
+
+    def test_caller_flags_are_kept(self):
+        labelled = ClimateData.objects.create(
+            data_source=self.source, data_type='temperature', value=10.0, unit='°C',
+            timestamp=self.start, is_anomaly=True,
+        )
+        labelled.refresh_from_db()
+        self.assertEqual((labelled.is_anomaly, labelled.processed), (True, False))
+
+        scored = ClimateData.objects.create(
+            data_source=self.source, data_type='temperature', value=10.0, unit='°C',
+            timestamp=self.start + timedelta(minutes=1),
+        )
+        scored.refresh_from_db()
+        self.assertEqual((scored.is_anomaly, scored.processed), (False, True))
+
+    def test_flush_drops_states_of_deleted_sources(self):
+        gone = DataSource.objects.create(
+            name='Deleted', source_type='sensor', location_lat=0, location_lon=0, installation_date=timezone.now(),
+        )
+        orphan = SeriesState(5, 1.0, 0.5)
+        orphan.dirty = True
+        scorer.states[(gone.pk, 'temperature')] = orphan
+        DataSource.objects.filter(pk=gone.pk).delete()
+
+        kept = SeriesState(3, 2.0, 1.0)
+        kept.dirty = True
+        scorer.states[(self.source.pk, 'humidity')] = kept
+        scorer.flush()
+
+        self.assertNotIn((gone.pk, 'temperature'), scorer.states)
+        self.assertFalse(kept.dirty)
+        self.assertEqual(AnomalySeriesState.objects.get(data_source=self.source, data_type='humidity').count, 3)
+
+    def test_failed_flush_is_logged_not_raised(self):
+        state = SeriesState(3, 2.0, 1.0)
+        state.dirty = True
+        scorer.states[(self.source.pk, 'humidity')] = state
+        failure = mock.patch.object(AnomalySeriesState.objects, 'bulk_create', side_effect=IntegrityError('boom'))
+        with failure, self.assertLogs('educationmodel.streaming_anomaly', 'ERROR'):
+            scorer.flush()
+        self.assertTrue(state.dirty)
+        self.assertIsNone(state.pk)
+
+
+class LiveStreamTests(ClimateTestCase):
+
+    def setUp(self):
+        self.viewer = ClimateUser.objects.create_user('stream-viewer', 'v@example.com', 'pw', role='viewer')
+
+    def test_stream_refused_under_wsgi(self):
+        self.client.force_login(self.viewer)
+        response = self.client.get('/api/stream/')
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.json()['success'])
+
+    def test_dashboard_only_subscribes_over_asgi(self):
+        self.client.force_login(self.viewer)
+        self.assertNotContains(self.client.get('/dashboard/viewer/'), 'new EventSource')
+
+        async_client = AsyncClient()
+        async_client.cookies = self.client.cookies
+
+        async def fetch():
+            return await async_client.get('/dashboard/viewer/')
+
+        response = async_to_sync(fetch)()
+        self.assertContains(response, 'new EventSource')
+
+
+class ClimateDataFilterTests(ClimateTestCase):
+
+    def setUp(self):
+        source = DataSource.objects.create(
+            name='Filter test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        for day in (1, 2, 3):
+            ClimateData.objects.create(
+                data_source=source, data_type='temperature', value=day, unit='°C',
+                timestamp=datetime(2024, 3, day, 12, tzinfo=dt_timezone.utc), processed=True,
+            )
+        analyst = ClimateUser.objects.create_user('filter-analyst', 'f@example.com', 'pw', role='analyst')
+        self.client.force_login(analyst)
+
+    def test_malformed_dates_are_rejected(self):
+        for url in ('/data/climate/', '/data/climate/export/'):
+            for query in ('start_date=2024-13-45', 'end_date=soon', 'start_date=1e20'):
+                response = self.client.get(f'{url}?{query}')
+                self.assertEqual(response.status_code, 400, f'{url}?{query}')
+                self.assertFalse(response.json()['success'])
+
+    def test_date_filters_match_exact_count(self):
+        response = self.client.get('/data/climate/?start_date=2024-03-02&end_date=2024-03-04&count=exact')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_records'], 2)
+        response = self.client.get('/data/climate/?start_date=2024-03-02&end_date=2024-03-04')
+        self.assertEqual(response.status_code, 200)
+
+
+class DashboardVersionTests(ClimateTestCase):
+
+    def setUp(self):
+        cache.clear()
+        source = DataSource.objects.create(
+            name='Version test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        start = timezone.now() - timedelta(days=2)
+        ClimateData.objects.bulk_create(
+            ClimateData(
+                data_source=source, data_type='temperature', value=20 + (i % 3), unit='°C',
+                timestamp=start + timedelta(minutes=i),
+            )
+            for i in range(40)
+        )
+        # Outside VERSION_GRACE, so the version is stable between requests
+        ClimateData.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        viewer = ClimateUser.objects.create_user('version-viewer', 'w@example.com', 'pw', role='viewer')
+        self.client.force_login(viewer)
+
+    def assertRevalidates(self, url):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def test_anomaly_detection_moves_version(self):
+        etag = self.assertRevalidates('/dashboard/viewer/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(detect_anomalies()['processed'], 40)
+        self.assertEqual(self.client.get('/dashboard/viewer/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sealing_moves_version(self):
+        etag = self.assertRevalidates('/dashboard/viewer/')
+        with self.captureOnCommitCallbacks(execute=True):
+            seal_readings(timezone.now())
+        self.assertFalse(ClimateData.objects.exists())
+        self.assertEqual(self.client.get('/dashboard/viewer/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_no_change_keeps_version(self):
+        etag = self.assertRevalidates('/dashboard/viewer/')
+        with self.captureOnCommitCallbacks(execute=True):
+            detect_anomalies()
+            detect_anomalies()
+        etag = self.assertRevalidates('/dashboard/viewer/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(detect_anomalies()['processed'], 0)
+        self.assertEqual(self.client.get('/dashboard/viewer/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class RollupMergeTests(ClimateTestCase):
+
+    def setUp(self):
+        self.source = DataSource.objects.create(
+            name='Rollup test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        self.start = (timezone.now() - timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+
+    def readings(self, values, offset=0):
+        return [
+            ClimateData(
+                data_source=self.source, data_type='temperature', value=value, unit='°C',
+                timestamp=self.start + timedelta(minutes=offset + 7 * i), processed=True,
+            )
+            for i, value in enumerate(values)
+        ]
+
+    def rollups(self):
+        return {
+            (row.resolution, row.bucket): (row.count, row.min_value, row.max_value,
+                                           round(row.mean_value, 9), round(row.sum_squares, 6))
+            for row in ClimateDataRollup.objects.all()
+        }
+
+    def test_partials_computed_before_either_merge_both_count(self):
+        # Two ingests summarise their batches against the same, still empty, rollups
+        first = summarise_readings(self.readings([1.0, 2.0, 3.0]))
+        second = summarise_readings(self.readings([10.0, -4.0], offset=3))
+        merge_partials(first)
+        merge_partials(second)
+
+        hour = ClimateDataRollup.objects.get(resolution='hour', bucket=self.start)
+        self.assertEqual((hour.count, hour.min_value, hour.max_value), (5, -4.0, 10.0))
+        self.assertAlmostEqual(hour.mean_value, 12.0 / 5)
+        self.assertAlmostEqual(hour.sum_squares, 130.0)
+
+    def test_incremental_rollups_match_rebuild(self):
+        for batch in range(4):
+            write_batch(self.readings([batch + i / 3 for i in range(12)], offset=batch))
+        incremental = self.rollups()
+        rebuild_rollups(self.start)
+        self.assertEqual(incremental, self.rollups())
+        self.assertEqual(sum(count for (resolution, _), (count, *_) in incremental.items() if resolution == 'day'), 48)
+
+
+class CompactSchemaMigrationTests(TransactionTestCase):
+    old = [('educationmodel', '0010_climatedatapartition')]
+    new = [('educationmodel', '0011_compact_climatedata')]
+
+    def setUp(self):
+        forget_units()
+        self.executor = MigrationExecutor(connection)
+        self.latest = self.executor.loader.graph.leaf_nodes()
+        self.executor.migrate(self.old)
+
+    def tearDown(self):
+        forget_units()
+        MigrationExecutor(connection).migrate(self.latest)
+
+    def migrate(self, targets):
+        self.executor.loader.build_graph()
+        self.executor.migrate(targets)
+        forget_units()
+        return self.executor.loader.project_state(targets).apps
+
+    def rows(self, apps):
+        return list(
+            apps.get_model('educationmodel', 'ClimateData').objects.order_by('created_at').values_list(
+                'data_type', 'value', 'unit', 'timestamp', 'quality_score', 'is_anomaly', 'processed', 'created_at',
+            )
+        )
+
+    def test_round_trip_keeps_readings_and_watermark(self):
+        apps = self.executor.loader.project_state(self.old).apps
+        source = apps.get_model('educationmodel', 'DataSource').objects.create(
+            name='Migration test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        OldClimateData = apps.get_model('educationmodel', 'ClimateData')
+        created = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        readings = [
+            ('temperature', 12.5, '°C', False),
+            ('precipitation', 3.25, 'mm', True),
+            ('temperature', -4.0, '°C', False),
+        ]
+        for i, (data_type, value, unit, anomaly) in enumerate(readings):
+            reading = OldClimateData.objects.create(
+                data_source=source, data_type=data_type, value=value, unit=unit,
+                timestamp=created - timedelta(hours=i), is_anomaly=anomaly, processed=True,
+            )
+            OldClimateData.objects.filter(pk=reading.pk).update(created_at=created + timedelta(seconds=i))
+        apps.get_model('educationmodel', 'AlertEvaluatorState').objects.create(
+            last_created_at=created + timedelta(seconds=1), last_id=reading.pk,
+        )
+        before = self.rows(apps)
+
+        apps = self.migrate(self.new)
+        self.assertEqual(self.rows(apps), before)
+        compact = apps.get_model('educationmodel', 'ClimateData').objects.order_by('created_at')
+        watermark = apps.get_model('educationmodel', 'AlertEvaluatorState').objects.get()
+        self.assertEqual(watermark.last_id, compact[1].pk)
+
+        apps = self.migrate(self.old)
+        self.assertEqual(self.rows(apps), before)
+        restored = apps.get_model('educationmodel', 'ClimateData').objects.order_by('created_at')
+        watermark = apps.get_model('educationmodel', 'AlertEvaluatorState').objects.get()
+        self.assertEqual(watermark.last_id, restored[1].pk)
+
+
+class AlertEvaluatorTests(ClimateTestCase):
+    now = datetime(2024, 6, 1, 12, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.source = DataSource.objects.create(
+            name='Alert test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=self.now,
+        )
+        AlertRule.objects.create(
+            name='Hot', data_type='temperature', operator='above', threshold=30,
+            alert_type='temperature_anomaly', severity='high',
+        )
+        AlertEvaluatorState.objects.create(last_created_at=self.now - timedelta(hours=1))
+        self.clock = self.now
+        patcher = mock.patch('django.utils.timezone.now', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def store(self, *values, data_type='temperature', at=None):
+        """Store readings, one minute apart, as if they arrived at ``at``"""
+        arrival = at or self.now - timedelta(minutes=10)
+        with mock.patch('django.utils.timezone.now', lambda: arrival):
+            for i, value in enumerate(values):
+                ClimateData.objects.create(
+                    data_source=self.source, data_type=data_type, value=value, unit='°C',
+                    timestamp=arrival - timedelta(minutes=len(values) - i), processed=True,
+                )
+
+    def run_at(self, moment):
+        self.clock = moment
+        return AlertEvaluator().run()
+
+    def test_watermark_evaluates_each_reading_once(self):
+        self.store(35.0, 20.0)
+        self.store(50.0, data_type='humidity')
+        summary = self.run_at(self.now)
+        # Humidity has no rule and is never fetched
+        self.assertEqual((summary['evaluated'], summary['alerts']), (2, 1))
+        self.assertEqual(self.run_at(self.now)['evaluated'], 0)
+
+    def test_rows_inside_commit_grace_wait_for_the_next_run(self):
+        self.run_at(self.now)
+        self.store(45.0, at=self.now - timedelta(seconds=2))
+        self.assertEqual(self.run_at(self.now + timedelta(seconds=1))['evaluated'], 0)
+        summary = self.run_at(self.now + timedelta(seconds=10))
+        self.assertEqual((summary['evaluated'], summary['alerts']), (1, 1))
+        state = AlertEvaluatorState.objects.get()
+        self.assertEqual(state.last_created_at, self.now + timedelta(seconds=10) - COMMIT_GRACE)
+
+    def test_repeats_coalesce_into_the_open_alert(self):
+        self.store(35.0, 41.0, 33.0)
+        summary = self.run_at(self.now)
+        self.assertEqual((summary['alerts'], summary['coalesced']), (1, 2))
+        alert = ClimateAlert.objects.get()
+        self.assertEqual((alert.occurrence_count, alert.peak_value, alert.actual_value), (3, 41.0, 33.0))
+        self.assertEqual(alert.last_seen_at - alert.first_seen_at, timedelta(minutes=2))
+
+        # A later run folds into the stored alert instead of adding a row
+        self.store(38.0, at=self.now + timedelta(minutes=20))
+        self.assertEqual(self.run_at(self.now + timedelta(minutes=30))['coalesced'], 1)
+        alert.refresh_from_db()
+        self.assertEqual((ClimateAlert.objects.count(), alert.occurrence_count, alert.actual_value), (1, 4, 38.0))
+
+    def test_acknowledged_or_distant_alerts_are_not_reused(self):
+        self.store(35.0)
+        self.run_at(self.now)
+        ClimateAlert.objects.update(acknowledged_by=ClimateUser.objects.create_user('ack', 'ack@example.com', 'pw'))
+        self.store(36.0, at=self.now + timedelta(minutes=5))
+        self.run_at(self.now + timedelta(minutes=10))
+        self.store(37.0, at=self.now + timedelta(hours=3))
+        self.run_at(self.now + timedelta(hours=3, minutes=5))
+        self.assertEqual(ClimateAlert.objects.count(), 3)
+        self.assertEqual(set(ClimateAlert.objects.values_list('occurrence_count', flat=True)), {1})
+
+
+class ChartDeltaTests(ClimateTestCase):
+    url = '/api/climate-data-chart/'
+    now = datetime(2024, 6, 1, 12, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        cache.clear()
+        self.source = DataSource.objects.create(
+            name='Chart test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=self.now,
+        )
+        self.store(self.now - timedelta(minutes=1), 10.0, 11.0, 12.0)
+        self.clock = self.now
+        patcher = mock.patch('django.utils.timezone.now', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        viewer = ClimateUser.objects.create_user('chart-viewer', 'c@example.com', 'pw', role='viewer')
+        self.client.force_login(viewer)
+
+    def store(self, arrival, *values):
+        with mock.patch('django.utils.timezone.now', lambda: arrival):
+            for i, value in enumerate(values):
+                ClimateData.objects.create(
+                    data_source=self.source, data_type='temperature', value=value, unit='°C',
+                    timestamp=arrival - timedelta(hours=i), processed=True,
+                )
+
+    def get(self, moment, etag=None, **params):
+        self.clock = moment
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.url, {'data_type': 'temperature', 'days': 2, **params}, **headers)
+
+    def test_since_cursor_returns_only_new_readings(self):
+        full = self.get(self.now).json()
+        self.assertEqual((full['resolution'], full['delta'], full['values']), ('raw', False, [12.0, 11.0, 10.0]))
+
+        self.store(self.now + timedelta(seconds=10), 13.0)
+        delta = self.get(self.now + timedelta(seconds=20), since=full['cursor']).json()
+        self.assertEqual((delta['delta'], delta['values']), (True, [13.0]))
+        again = self.get(self.now + timedelta(seconds=30), since=delta['cursor']).json()
+        self.assertEqual(again['values'], [])
+
+    def test_binary_format_matches_json(self):
+        json_body = self.get(self.now).json()
+        response = self.get(self.now, format='binary')
+        self.assertEqual(response['Content-Type'], BINARY_CONTENT_TYPE)
+        _, seconds, (values,), meta = decode_series(response.content)
+        self.assertEqual(values.tolist(), json_body['values'])
+        self.assertEqual(meta['cursor'], json_body['cursor'])
+        self.assertEqual(
+            [datetime.fromtimestamp(second, dt_timezone.utc) for second in seconds.tolist()],
+            [datetime.fromisoformat(timestamp.replace('Z', '+00:00')) for timestamp in json_body['timestamps']],
+        )
+
+    def test_malformed_since_is_rejected(self):
+        self.assertEqual(self.get(self.now, since='yesterday').status_code, 400)
+
+    def test_etag_revalidates_until_a_write(self):
+        response = self.get(self.now)
+        etag = response['ETag']
+        self.assertEqual(self.get(self.now + timedelta(seconds=5), etag).status_code, 304)
+
+        self.store(self.now + timedelta(seconds=10), 13.0)
+        response = self.get(self.now + timedelta(seconds=20), etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # The shared cache is keyed on the new version, so the write is visible
+        self.assertEqual(response.json()['values'], [12.0, 11.0, 10.0, 13.0])
+
+
+class ExportTests(ClimateTestCase):
+    url = '/data/climate/export/'
+
+    def setUp(self):
+        self.source = DataSource.objects.create(
+            name='Export, test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        for day in (3, 1, 2):
+            ClimateData.objects.create(
+                data_source=self.source, data_type='temperature', value=day, unit='°C',
+                timestamp=datetime(2024, 3, day, 12, tzinfo=dt_timezone.utc), processed=True,
+            )
+        ClimateData.objects.create(
+            data_source=self.source, data_type='humidity', value=80, unit='%',
+            timestamp=datetime(2024, 3, 2, 6, tzinfo=dt_timezone.utc), processed=True,
+        )
+        analyst = ClimateUser.objects.create_user('export-analyst', 'e@example.com', 'pw', role='analyst')
+        self.client.force_login(analyst)
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_is_filtered_and_oldest_first(self):
+        rows = list(csv.reader(io.StringIO(self.export(data_type='temperature', start_date='2024-03-02').decode())))
+        self.assertEqual(rows[0][:5], ['timestamp', 'source_id', 'source_name', 'data_type', 'value'])
+        self.assertEqual([(row[2], row[4]) for row in rows[1:]], [('Export, test', '2.0'), ('Export, test', '3.0')])
+
+    def test_gzipped_ndjson_merges_sealed_days(self):
+        # Seal 2024-03-01 so the export reads it back from its chunk
+        self.assertEqual(seal_readings(datetime(2024, 3, 2, tzinfo=dt_timezone.utc)), {date(2024, 3, 1): 1})
+        body = gzip.decompress(self.export(format='ndjson', gzip='1'))
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(
+            [(record['data_type'], record['value']) for record in records],
+            [('temperature', 1.0), ('humidity', 80.0), ('temperature', 2.0), ('temperature', 3.0)],
+        )
+        self.assertEqual({record['source_id'] for record in records}, {str(self.source.pk)})
+
+
+class ChartBatchTests(ClimateTestCase):
+    url = '/api/climate-data-chart/batch/'
+
+    def setUp(self):
+        cache.clear()
+        self.north, self.south = (
+            DataSource.objects.create(
+                name=name, source_type='sensor', location_lat=lat, location_lon=20,
+                installation_date=timezone.now(),
+            )
+            for name, lat in (('North', 60), ('South', -60))
+        )
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        self.hours = [hour, hour + timedelta(hours=1)]
+        for source, data_type, values in (
+            (self.north, 'temperature', [10.0, 12.0]),
+            (self.south, 'temperature', [20.0, 30.0]),
+            (self.north, 'humidity', [70.0, None]),
+        ):
+            for at, value in zip(self.hours, values):
+                if value is not None:
+                    ClimateData.objects.create(
+                        data_source=source, data_type=data_type, value=value, unit='x', timestamp=at, processed=True,
+                    )
+        viewer = ClimateUser.objects.create_user('batch-viewer', 'b@example.com', 'pw', role='viewer')
+        self.client.force_login(viewer)
+
+    def get(self, *series, **params):
+        return self.client.get(self.url, {'series': list(series), 'days': 2, **params})
+
+    def test_series_share_one_axis(self):
+        body = self.get('temperature', f'temperature:{self.north.pk}', 'humidity').json()
+        self.assertEqual(body['resolution'], 'raw')
+        self.assertEqual(len(body['timestamps']), 2)
+        everywhere, north, humidity = body['series']
+        self.assertEqual((everywhere['values'], everywhere['counts']), ([15.0, 21.0], [2, 2]))
+        self.assertEqual((everywhere['min_values'], everywhere['max_values']), ([10.0, 12.0], [20.0, 30.0]))
+        self.assertEqual((north['source_id'], north['values']), (str(self.north.pk), [10.0, 12.0]))
+        self.assertEqual((humidity['values'], humidity['counts']), ([70.0, None], [1, 0]))
+
+    def test_bins_when_over_max_points(self):
+        for minutes in (10, 20):
+            ClimateData.objects.create(
+                data_source=self.south, data_type='temperature', value=25.0, unit='x',
+                timestamp=self.hours[0] + timedelta(minutes=minutes), processed=True,
+            )
+        body = self.get('temperature', max_points=3).json()
+        self.assertEqual(len(body['timestamps']), 3)
+        self.assertEqual(sum(body['series'][0]['counts']), 6)
+
+    def test_bad_series_are_rejected(self):
+        for series in (['rainfall'], ['temperature:not-a-uuid'], []):
+            response = self.get(*series)
+            self.assertEqual(response.status_code, 400, series)
+            self.assertFalse(response.json()['success'])
+
+
+class PartitionTests(TransactionTestCase):
+
+    def setUp(self):
+        self.source = DataSource.objects.create(
+            name='Partition test', source_type='sensor', location_lat=10, location_lon=20,
+            installation_date=timezone.now(),
+        )
+        for month, day in ((1, 5), (1, 20), (2, 10), (6, 1)):
+            ClimateData.objects.create(
+                data_source=self.source, data_type='temperature', value=month * 100 + day, unit='°C',
+                timestamp=datetime(2024, month, day, tzinfo=dt_timezone.utc), processed=True,
+            )
+
+    def tearDown(self):
+        # Partition tables are unmanaged, so the test flush would leave them behind
+        for month in ClimateDataPartition.objects.values_list('month', flat=True):
+            drop_partition(month)
+        forget_units()
+
+    def values(self, queryset):
+        return [reading.value for reading in queryset]
+
+    def test_archived_months_stay_readable(self):
+        self.assertEqual(archive_month(date(2024, 1, 1)), 2)
+        self.assertEqual(archive_month(date(2024, 2, 1)), 1)
+        self.assertEqual(ClimateData.objects.count(), 1)
+        self.assertEqual(total_readings(), 4)
+
+        everything = readings()
+        self.assertEqual(everything.count(), 4)
+        self.assertEqual(self.values(everything.order_by('timestamp')), [105, 120, 210, 601])
+        self.assertEqual(self.values(everything.order_by('-timestamp')[1:3]), [210, 120])
+
+        # Only partitions overlapping the window are queried
+        window = everything.filter(timestamp__gte=datetime(2024, 2, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(len(window.partitions), 2)
+        self.assertEqual(self.values(window.order_by('timestamp')), [210, 601])
+
+    def test_late_readings_go_to_their_partition(self):
+        archive_month(date(2024, 1, 1))
+        late = ClimateData(
+            data_source=self.source, data_type='temperature', value=111, unit='°C',
+            timestamp=datetime(2024, 1, 11, tzinfo=dt_timezone.utc), processed=True,
+        )
+        write_batch([late])
+        self.assertFalse(ClimateData.objects.filter(value=111).exists())
+        january = ClimateDataPartition.objects.get(month=date(2024, 1, 1))
+        self.assertEqual(january.row_count, 3)
+        self.assertEqual(self.values(readings().filter(
+            timestamp__lt=datetime(2024, 2, 1, tzinfo=dt_timezone.utc),
+        ).order_by('timestamp')), [105, 111, 120])
+
+    def test_deleting_a_source_clears_its_partitions(self):
+        archive_month(date(2024, 1, 1))
+        self.source.delete()
+        self.assertEqual(readings().count(), 0)
+        self.assertEqual(ClimateDataPartition.objects.get().row_count, 0)
+
+
+class HeatmapTests(ClimateTestCase):
+    url = '/api/climate-data-heatmap/'
+
+    def setUp(self):
+        cache.clear()
+        self.end = datetime(2024, 5, 20, 12, tzinfo=dt_timezone.utc)
+        readings = []
+        for name, lat, lon, values in (
+            ('Fjord east', 59.9, 9.7, [1.0, 3.0]),
+            ('Fjord west', 59.4, 5.3, [8.0]),
+            ('Pole', 90.0, 180.0, [-40.0]),
+        ):
+            source = DataSource.objects.create(
+                name=name, source_type='sensor', location_lat=lat, location_lon=lon, installation_date=self.end,
+            )
+            readings += [
+                ClimateData(
+                    data_source=source, data_type='temperature', value=value, unit='°C',
+                    timestamp=self.end - timedelta(hours=i + 1), processed=True,
+                )
+                for i, value in enumerate(values)
+            ]
+        write_batch(readings)
+        analyst = ClimateUser.objects.create_user('heat-analyst', 'h@example.com', 'pw', role='analyst')
+        self.client.force_login(analyst)
+
+    def cells(self, grid):
+        return {
+            (float(lat), float(lon)): (int(count), float(mean), float(low), float(high), int(sources))
+            for lat, lon, count, mean, low, high, sources in zip(
+                grid['lat'], grid['lon'], grid['count'], grid['mean'], grid['min'], grid['max'], grid['sources'],
+            )
+        }
+
+    def test_sources_are_binned_by_cell(self):
+        grid = grid_heatmap('temperature', self.end - timedelta(hours=6), self.end, 10)
+        self.assertEqual(grid['resolution'], 'hour')
+        self.assertEqual(self.cells(grid), {
+            (50.0, 0.0): (3, 4.0, 1.0, 8.0, 2),
+            # The pole and the antimeridian fall into the last row and column
+            (80.0, 170.0): (1, -40.0, -40.0, -40.0, 1),
+        })
+
+    def test_long_windows_use_daily_rollups(self):
+        hourly = grid_heatmap('temperature', self.end - timedelta(hours=6), self.end, 10)
+        daily = grid_heatmap('temperature', self.end - timedelta(days=10), self.end, 10)
+        self.assertEqual(daily['resolution'], 'day')
+        self.assertEqual(self.cells(daily), self.cells(hourly))
+
+    def test_api(self):
+        body = self.client.get(self.url, {'hours': 6, 'cell': 45, 'end': self.end.isoformat()}).json()
+        self.assertEqual((body['lat'], body['lon'], body['count']), ([45.0, 45.0], [0.0, 135.0], [3, 1]))
+        self.assertEqual(self.client.get(self.url, {'cell': 0}).status_code, 400)
+
+
+class RasterTests(ClimateTestCase):
+
+    def setUp(self):
+        raster_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(raster_dir.cleanup)
+        self.enterContext(override_settings(CLIMATE_DATA_SETTINGS={
+            **settings.CLIMATE_DATA_SETTINGS, 'RASTER_DIR': raster_dir.name, 'RASTER_CHUNK_SIZE': 4,
+        }))
+        self.satellite = DataSource.objects.create(
+            name='Satellite', source_type='satellite', location_lat=0, location_lon=0,
+            installation_date=timezone.now(),
+        )
+        self.taken = datetime(2024, 5, 1, 12, tzinfo=dt_timezone.utc)
+        # 10 x 13 pixels of 1 degree, north-west corner at (10, 0)
+        self.pixels = np.arange(130, dtype=np.float32).reshape(10, 13)
+        self.scene = store_scene(self.satellite, 'temperature', self.taken, self.pixels, (0, 0, 10, 13), '°C')
+
+    def test_windows_match_the_array(self):
+        values, bounds = read_window(self.scene, (-5, -5, 20, 20))
+        np.testing.assert_array_equal(values, self.pixels)
+        self.assertEqual(bounds, (0, 0, 10, 13))
+
+        # Rows 2..8 and columns 3..11 read every third pixel across tile edges
+        values, bounds = read_window(self.scene, (1.5, 3.5, 8, 11), step=3)
+        np.testing.assert_array_equal(values, self.pixels[2:9:3, 3:11:3])
+        self.assertIsNone(read_window(self.scene, (20, 20, 30, 30)))
+
+    def test_point_samples(self):
+        values = sample_points(self.scene, [10, 9.5, 0, 5.2, -1], [0, 12.5, 13, 4.9, 5])
+        np.testing.assert_array_equal(values[:4], [0, 12, 129, 56])
+        self.assertTrue(np.isnan(values[4]))
+
+    def test_station_comparison_uses_the_closest_reading(self):
+        station = DataSource.objects.create(
+            name='Station', source_type='weather_station', location_lat=5.2, location_lon=4.9,
+            installation_date=timezone.now(),
+        )
+        for minutes, value in ((-50, 40.0), (20, 55.5), (90, 70.0)):
+            ClimateData.objects.create(
+                data_source=station, data_type='temperature', value=value, unit='°C',
+                timestamp=self.taken + timedelta(minutes=minutes), processed=True,
+            )
+        (match,) = station_comparison(self.scene, timedelta(hours=1))
+        self.assertEqual((match['source'], match['reading'], match['grid_value']), (station, 55.5, 56.0))
+
+    def test_file_removed_after_delete_commits(self):
+        path = scene_path(self.scene)
+        self.assertTrue(path.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.scene.delete()
+        self.assertFalse(path.exists())
+
+
+class PyramidTests(ClimateTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.start = datetime(2024, 5, 1, tzinfo=dt_timezone.utc)
+        self.end = self.start + timedelta(days=20)
+        self.readings = []
+        for offset, name in enumerate(('North', 'South')):
+            source = DataSource.objects.create(
+                name=name, source_type='sensor', location_lat=60 - offset, location_lon=10,
+                installation_date=self.start,
+            )
+            self.readings += [
+                ClimateData(
+                    data_source=source, data_type='temperature', value=float(hour % 17 + offset), unit='°C',
+                    timestamp=self.start + timedelta(hours=hour, minutes=10), processed=True,
+                )
+                for hour in range(480)
+            ]
+        write_batch(self.readings)
+        # Tiles are only stored once the readings are older than the build grace
+        self.enterContext(mock.patch('django.utils.timezone.now', lambda: datetime.now(dt_timezone.utc) + timedelta(minutes=1)))
+
+    def expected(self, bucket_seconds):
+        buckets = {}
+        for reading in self.readings:
+            key = reading.timestamp.timestamp() // bucket_seconds * bucket_seconds
+            buckets.setdefault(key, []).append(reading.value)
+        return {
+            key: (len(values), min(values), max(values), sum(values) / len(values))
+            for key, values in buckets.items()
+        }
+
+    def buckets(self, series):
+        return {
+            x: (count, low, high, round(mean, 9))
+            for x, count, low, high, mean in zip(
+                series['x'].tolist(), series['count'].tolist(), series['min'].tolist(),
+                series['max'].tolist(), series['mean'].tolist(),
+            )
+        }
+
+    def test_levels_match_brute_force(self):
+        series = pyramid_series('temperature', self.start, self.end, 100)
+        # 480 hours in at most 100 buckets needs 8-hour buckets
+        self.assertEqual((series['level'], series['bucket_seconds']), (3, 8 * 3600))
+        expected = {key: (*stats[:3], round(stats[3], 9)) for key, stats in self.expected(8 * 3600).items()}
+        self.assertEqual(self.buckets(series), expected)
+        self.assertTrue(ChartPyramidTile.objects.filter(level=3).exists())
+
+        # A second read is served from the stored tiles
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buckets(pyramid_series('temperature', self.start, self.end, 100)), expected)
+
+    def test_new_readings_invalidate_their_tiles(self):
+        pyramid_series('temperature', self.start, self.end, 100)
+        late = self.start + timedelta(days=3, hours=2)
+        write_batch([ClimateData(
+            data_source=self.readings[0].data_source, data_type='temperature', value=99.0, unit='°C',
+            timestamp=late, processed=True,
+        )])
+        self.assertFalse(ChartPyramidTile.objects.filter(level=3, index=late.timestamp() // (8 * 3600 * 256)).exists())
+
+        series = pyramid_series('temperature', self.start, self.end, 100)
+        bucket = late.timestamp() // (8 * 3600) * 8 * 3600
+        self.assertEqual(self.buckets(series)[bucket][2], 99.0)
+        self.assertEqual(series['count'].sum(), 961)
+
+    def test_short_windows_bin_raw_readings(self):
+        end = self.start + timedelta(days=2)
+        series = pyramid_series('temperature', self.start, end, 12)
+        self.assertIsNone(series['level'])
+        self.assertEqual(series['bucket_seconds'], 4 * 3600)
+        # Only readings before the window end, bucketed from the window start
+        self.assertEqual(series['count'].tolist(), [8] * 12)
+        self.assertEqual(series['max'].tolist()[:2], [4.0, 8.0])
+
+    def test_api_serves_requested_window(self):
+        analyst = ClimateUser.objects.create_user('pyramid-analyst', 'p@example.com', 'pw', role='analyst')
+        self.client.force_login(analyst)
+        response = self.client.get('/api/climate-data-chart/pyramid/', {
+            'data_type': 'temperature', 'start': self.start.isoformat(), 'end': self.end.isoformat(), 'width': 100,
+        })
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['level'], body['returned_points']), (3, 60))
+        self.assertEqual(sum(body['counts']), 960)
+
+        response = self.client.get('/api/climate-data-chart/pyramid/', {
+            'data_type': 'temperature', 'start': self.end.isoformat(), 'end': self.start.isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
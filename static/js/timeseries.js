@@ -0,0 +1,65 @@
+// Decoder for the binary time-series payload served by the chart API with
+// format=binary (layout documented in educationmodel/binary_series.py).
+// Arrays are views over the response buffer, so nothing is copied apart
+// from rebuilding absolute timestamps out of the deltas.
+(function (global) {
+    "use strict";
+
+    const HEADER_SIZE = 24;
+
+    function decodeTimeSeries(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode.apply(null, new Uint8Array(buffer, 0, 4));
+        if (magic !== 'CTS1') {
+            throw new Error('Unexpected time-series payload');
+        }
+
+        const count = view.getUint32(4, true);
+        const extraCount = view.getUint32(8, true);
+        const metaLength = view.getUint32(12, true);
+        const base = view.getFloat64(16, true);
+
+        let offset = HEADER_SIZE;
+        const meta = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, offset, metaLength)));
+        offset += metaLength;
+
+        // Typed arrays use the platform byte order, which is little-endian on
+        // every browser we target
+        const deltas = new Int32Array(buffer, offset, count);
+        offset += count * 4;
+        const timestamps = new Float64Array(count);
+        let seconds = base;
+        for (let i = 0; i < count; i++) {
+            seconds += deltas[i];
+            timestamps[i] = seconds;
+        }
+
+        const series = Object.assign(meta, {
+            timestamps: timestamps,
+            values: new Float32Array(buffer, offset, count),
+        });
+        offset += count * 4;
+
+        for (let i = 0; i < extraCount; i++) {
+            series[meta.extras[i]] = new Float32Array(buffer, offset, count);
+            offset += count * 4;
+        }
+        return series;
+    }
+
+    // Fetch a chart API URL in binary form; timestamps are epoch seconds
+    function fetchTimeSeries(url) {
+        const separator = url.indexOf('?') === -1 ? '?' : '&';
+        return fetch(url + separator + 'format=binary', { credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Chart request failed: ${response.status}`);
+                }
+                return response.arrayBuffer();
+            })
+            .then(decodeTimeSeries);
+    }
+
+    global.decodeTimeSeries = decodeTimeSeries;
+    global.fetchTimeSeries = fetchTimeSeries;
+})(window);